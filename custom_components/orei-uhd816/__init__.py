@@ -1,21 +1,52 @@
 """The AVPro Matrix switch integration."""
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.const import CONF_HOST
-from homeassistant.core import HomeAssistant
-# REMOVE from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.const import CONF_HOST, CONF_PORT
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryNotReady
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.event import async_track_time_interval
 
-from .pyOreiMatrix import OreiMatrixAPI
-from .const import DOMAIN
+from .calibration import async_load_rate_limits
+from .change_feed import async_get_change_feed
+from .description import (
+    async_get_description,
+    async_load_descriptions,
+    async_remove_description,
+    async_save_description,
+    entities_changed,
+)
+from .predictor import (
+    async_load_predictor_states,
+    async_remove_predictor_state,
+    async_save_predictor_state,
+    async_setup_predictor,
+)
+from .pyOreiMatrix import OreiMatrixAPI, OreiMatrixManager
+from .const import DATA_MANAGER, DOMAIN, HISTORY_FLUSH_INTERVAL, REFRESH_INTERVAL
+from .services import async_setup_services
 
 LOGGER = logging.getLogger(__package__)
 
 # List of platforms to support. There should be a matching .py file for each,
 # eg <cover.py> and <sensor.py>
-PLATFORMS: list[str] = ["media_player"]
+PLATFORMS: list[str] = ["binary_sensor", "media_player", "sensor"]
+
+
+def async_get_manager(hass: HomeAssistant) -> OreiMatrixManager:
+    """Return the domain wide manager that owns every matrix connection."""
+    data = hass.data.setdefault(DOMAIN, {})
+
+    if DATA_MANAGER not in data:
+        # Share Home Assistant's HTTP client rather than opening one per matrix
+        data[DATA_MANAGER] = OreiMatrixManager(session=async_get_clientsession(hass))
+
+    return data[DATA_MANAGER]
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
@@ -24,32 +55,127 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     # with the actual devices.
     LOGGER.info(f"Setting up a Matrix switch {entry.data}")
 
-    # REMOVE session = async_get_clientsession(hass)
-    client = OreiMatrixAPI(entry.data[CONF_HOST])
+    manager = async_get_manager(hass)
+    # The web port is only ever set for a simulator, real matrices serve it on 80
+    client: OreiMatrixAPI = manager.AddMatrix(entry.entry_id, entry.data[CONF_HOST], entry.data.get(CONF_PORT, 80))
+
+    # Routing history survives restarts in a memory mapped file under the config dir,
+    # opened before the first refresh records anything
+    history_path = hass.config.path(DOMAIN, f"{entry.entry_id}.history")
+
+    def open_history() -> None:
+        os.makedirs(os.path.dirname(history_path), exist_ok=True)
+        client.history.Open(history_path)
 
-    # check availability
-    await client.Validate()
-    await client.RefreshAll()
+    # None of these wait on each other. Validate and Preload pick up a calibrated
+    # send rate for the model and firmware, so the rate limits go first.
+    await asyncio.gather(
+        hass.async_add_executor_job(open_history),
+        async_load_rate_limits(hass),
+        async_load_descriptions(hass),
+        async_load_predictor_states(hass),
+    )
 
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = client
+    description = async_get_description(hass, entry.entry_id)
+    if description is not None and client.Preload(description):
+        # Seen before: entities are built from what it was last time and the
+        # matrix is checked in the background, so a slow or absent matrix doesn't
+        # hold up Home Assistant's start. They stay unavailable until TCP connects.
+        entry.async_create_background_task(
+            hass, _async_start_matrix(hass, entry, client, description), f"{DOMAIN} start {entry.title}"
+        )
+    else:
+        # Never started, or no longer what it was: nothing to build entities from
+        # until it answers. The manager limits how many matrices start at once.
+        if not await manager.StartMatrix(entry.entry_id):
+            await manager.RemoveMatrix(entry.entry_id)
+            await hass.async_add_executor_job(client.history.Close)
+            raise ConfigEntryNotReady(f"Matrix not available at {entry.data[CONF_HOST]}")
+        await async_save_description(hass, entry.entry_id, client.Describe())
+
+    hass.data[DOMAIN][entry.entry_id] = client
+    async_get_change_feed(hass).async_add_matrix(entry.entry_id, client)
+
+    @callback
+    def async_flush_history(now) -> None:
+        client.history.Flush()
+
+    entry.async_on_unload(async_track_time_interval(hass, async_flush_history, HISTORY_FLUSH_INTERVAL))
+
+    async_setup_services(hass)
 
     # This creates each HA object for each platform your device requires.
     # It's done by calling the `async_setup_entry` function in each platform module.
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    # Periodic refreshes go over the already open TCP session, not the web server.
+    # As background tasks of the entry, a matrix that's slow to answer holds up
+    # neither Home Assistant's start and stop nor anything else, and unloading
+    # cancels them.
+    @callback
+    def async_refresh(now) -> None:
+        entry.async_create_background_task(hass, client.RefreshAll(), f"{DOMAIN} refresh {entry.title}")
+
+    entry.async_on_unload(async_track_time_interval(hass, async_refresh, REFRESH_INTERVAL))
+
+    async_setup_predictor(hass, entry, client)
+
+    # Output groups and the predictor are options, both are set up again by a reload
+    entry.async_on_unload(entry.add_update_listener(_async_options_updated))
     return True
 
 
+async def _async_options_updated(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Reload the entry so its output groups match the options."""
+    await hass.config_entries.async_reload(entry.entry_id)
+
+
+async def _async_start_matrix(hass: HomeAssistant, entry: ConfigEntry, client: OreiMatrixAPI, description: dict) -> None:
+    """Validate and refresh a preloaded matrix, retrying until it answers."""
+    manager = async_get_manager(hass)
+    while not await manager.StartMatrix(entry.entry_id):
+        delay = manager.NextReconnectDelay()
+        LOGGER.warning(f"Matrix not available at {entry.data[CONF_HOST]}, retrying in {delay:.0f} seconds")
+        await asyncio.sleep(delay)
+        if manager.GetMatrix(entry.entry_id) is not client:
+            return
+
+    if manager.GetMatrix(entry.entry_id) is not client:
+        # Unloaded while it was answering
+        return
+
+    current = client.Describe()
+    await async_save_description(hass, entry.entry_id, current)
+    if entities_changed(description, current):
+        LOGGER.info(f"Matrix at {entry.data[CONF_HOST]} changed since it was last seen, reloading its entities")
+        hass.config_entries.async_schedule_reload(entry.entry_id)
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload a config entry."""
     # This is called when an entry/configured device is to be removed. The class
     # needs to unload itself, and remove callbacks. See the classes for further
     # details
     LOGGER.info(f"Unloading a Matrix switch {entry.data}")
-    client = hass.data[DOMAIN][entry.entry_id]
-    await client.Shutdown()
 
+    # Entities unsubscribe as they're removed, so they go before the client does
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
         hass.data[DOMAIN].pop(entry.entry_id)
+        async_get_change_feed(hass).async_remove_matrix(entry.entry_id)
+
+        manager = async_get_manager(hass)
+        client: OreiMatrixAPI = manager.GetMatrix(entry.entry_id)
+        await manager.RemoveMatrix(entry.entry_id)
+        if client is not None:
+            if client.predictor is not None:
+                await async_save_predictor_state(hass, entry.entry_id, client.predictor.State())
+            await hass.async_add_executor_job(client.history.Close)
 
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Forget a removed matrix's description and predictor counters."""
+    await async_remove_description(hass, entry.entry_id)
+    await async_remove_predictor_state(hass, entry.entry_id)
@@ -0,0 +1,76 @@
+"""Platform for binary_sensor integration."""
+import logging
+
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+)
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .entity import OreiMatrixFieldEntity
+from .pyOreiMatrix import OreiMatrixAPI, MatrixInput, MatrixOutput
+from .const import DOMAIN
+
+LOGGER = logging.getLogger(__package__)
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
+    """Add binary_sensors for passed config_entry in HA."""
+    LOGGER.debug("Adding binary_sensor entities.")
+
+    client: OreiMatrixAPI = hass.data[DOMAIN][entry.entry_id]
+
+    new_devices = []
+
+    for input in await client.Inputs:
+        if input.IsVisible:
+            new_devices.append( HassInputSignalSensor(entry, client, input) )
+
+    for output in await client.Outputs:
+        if output.IsVisible:
+            new_devices.append( HassOutputLinkSensor(entry, client, output) )
+            new_devices.append( HassOutputStreamSensor(entry, client, output) )
+
+    if new_devices:
+        async_add_entities(new_devices)
+
+
+class HassInputSignalSensor(OreiMatrixFieldEntity, BinarySensorEntity):
+    """Whether a source is present on a matrix input."""
+
+    _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, input: MatrixInput):
+        super().__init__(entry, controller, MatrixInput.KIND, input.Id, "active", "signal")
+        self._attr_name = f"{input.Name} Signal"
+
+    @property
+    def is_on(self) -> bool:
+        return self.matrix_object.IsActive
+
+
+class HassOutputLinkSensor(OreiMatrixFieldEntity, BinarySensorEntity):
+    """Whether a display or AVR is linked on a matrix output."""
+
+    _attr_device_class = BinarySensorDeviceClass.CONNECTIVITY
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, output: MatrixOutput):
+        super().__init__(entry, controller, MatrixOutput.KIND, output.Id, "link", "link")
+        self._attr_name = f"{output.Name} Link"
+
+    @property
+    def is_on(self) -> bool:
+        return self.matrix_object.HasLink
+
+
+class HassOutputStreamSensor(OreiMatrixFieldEntity, BinarySensorEntity):
+    """Whether a matrix output's stream is enabled (i.e. not muted)."""
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, output: MatrixOutput):
+        super().__init__(entry, controller, MatrixOutput.KIND, output.Id, "streamEnabled", "stream")
+        self._attr_name = f"{output.Name} Stream"
+
+    @property
+    def is_on(self) -> bool:
+        return self.matrix_object.StreamEnabled
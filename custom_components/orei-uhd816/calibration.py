@@ -0,0 +1,33 @@
+"""Calibrated send rates, kept per matrix model and firmware across restarts."""
+from __future__ import annotations
+
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_RATE_LIMITS, DOMAIN, STORAGE_KEY_RATE_LIMITS, STORAGE_VERSION
+from .pyOreiMatrix import RateCalibration, RegisterRateLimit
+
+
+def _store(hass: HomeAssistant) -> Store:
+    return Store(hass, STORAGE_VERSION, STORAGE_KEY_RATE_LIMITS)
+
+
+async def async_load_rate_limits(hass: HomeAssistant) -> None:
+    """Register every stored calibration, once, before any matrix is validated."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_RATE_LIMITS in data:
+        return
+
+    stored = await _store(hass).async_load() or {}
+    data[DATA_RATE_LIMITS] = {}
+    for key, value in stored.items():
+        calibration = RateCalibration.FromDict(value)
+        data[DATA_RATE_LIMITS][key] = calibration
+        RegisterRateLimit(calibration.model, calibration.firmware, calibration.rate, calibration.burst)
+
+
+async def async_save_calibration(hass: HomeAssistant, calibration: RateCalibration) -> None:
+    """Keep a calibration for its model and firmware, replacing any earlier one."""
+    limits = hass.data[DOMAIN].setdefault(DATA_RATE_LIMITS, {})
+    limits[f"{calibration.model}/{calibration.firmware}"] = calibration
+    await _store(hass).async_save({key: value.ToDict() for key, value in limits.items()})
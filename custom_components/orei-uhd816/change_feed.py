@@ -0,0 +1,171 @@
+"""A compact, sequenced feed of matrix field changes on the event bus and websocket."""
+from __future__ import annotations
+
+from collections import deque
+import enum
+from typing import Any
+
+import voluptuous as vol
+
+from homeassistant.components import websocket_api
+from homeassistant.core import HomeAssistant, callback
+
+from .const import (
+    CHANGE_FEED_SIZE,
+    DATA_CHANGE_FEED,
+    DOMAIN,
+    EVENT_CHANGES,
+    WS_TYPE_CHANGES,
+)
+from .pyOreiMatrix import OreiMatrixAPI
+
+
+def _value(value: Any) -> Any:
+    """Return a field value JSON friendly, enums by name."""
+    return value.name if isinstance(value, enum.Enum) else value
+
+
+def _values(changed_object) -> dict[str, Any]:
+    """Return an object's fields as JSON friendly values."""
+    return {field: _value(value) for field, value in zip(changed_object.FIELDS, changed_object.Fields())}
+
+
+def _objects(client: OreiMatrixAPI) -> list:
+    """Return the matrix itself and every input and output."""
+    return (
+        [client]
+        + [client.GetInput(id) for id in range(1, client.inputCount + 1)]
+        + [client.GetOutput(id) for id in range(1, client.outputCount + 1)]
+    )
+
+
+def _key(client: OreiMatrixAPI, changed_object) -> tuple[str, int]:
+    return changed_object.KIND, 0 if changed_object is client else changed_object.Id
+
+
+class ChangeFeed:
+    """Field level deltas of every matrix, numbered and fired in batches.
+
+    Every change is one delta with its own sequence number. Deltas made during
+    one turn of the event loop go out together as a single EVENT_CHANGES event,
+    and the most recent CHANGE_FEED_SIZE are kept so a consumer that reconnects
+    can ask for what it missed instead of reading the whole state again.
+    """
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        """Initialize the feed."""
+        self._hass = hass
+        self._seq = 0
+        self._log: deque[dict[str, Any]] = deque(maxlen=CHANGE_FEED_SIZE)
+        self._pending: list[dict[str, Any]] = []
+        self._clients: dict[str, OreiMatrixAPI] = {}
+        self._callbacks: dict[str, Any] = {}
+
+    @property
+    def seq(self) -> int:
+        """Return the sequence number of the latest delta, 0 before the first."""
+        return self._seq
+
+    @callback
+    def async_add_matrix(self, entry_id: str, client: OreiMatrixAPI) -> None:
+        """Start feeding a matrix's changes."""
+        self._clients[entry_id] = client
+
+        @callback
+        def changed(deltas) -> None:
+            self._changed(entry_id, client, deltas)
+
+        self._callbacks[entry_id] = changed
+        # The library numbers every change itself, so only what it reports from now on is fed
+        client.SubscribeToDeltas(changed)
+
+    @callback
+    def async_remove_matrix(self, entry_id: str) -> None:
+        """Stop feeding a matrix's changes, before its client shuts down."""
+        client = self._clients.pop(entry_id, None)
+        changed = self._callbacks.pop(entry_id, None)
+        if client is not None:
+            client.UnsubscribeFromDeltas(changed)
+
+    @callback
+    def _changed(self, entry_id: str, client: OreiMatrixAPI, deltas) -> None:
+        if entry_id not in self._clients:
+            return
+
+        if deltas is None:
+            # More was missed than the library keeps, feed every field as it is now
+            for obj in _objects(client):
+                kind, id = _key(client, obj)
+                for field, value in _values(obj).items():
+                    self._append(entry_id, kind, id, field, value)
+            return
+
+        for delta in deltas:
+            self._append(entry_id, delta.kind, delta.id, delta.field, _value(delta.value))
+
+    @callback
+    def _append(self, entry_id: str, kind: str, id: int, field: str, value: Any) -> None:
+        self._seq += 1
+        delta = {"seq": self._seq, "entry_id": entry_id, "kind": kind, "id": id, "field": field, "value": value}
+        self._log.append(delta)
+        if not self._pending:
+            self._hass.loop.call_soon(self._fire)
+        self._pending.append(delta)
+
+    @callback
+    def _fire(self) -> None:
+        changes, self._pending = self._pending, []
+        if changes:
+            self._hass.bus.async_fire(EVENT_CHANGES, {"changes": changes})
+
+    @callback
+    def since(self, seq: int) -> list[dict[str, Any]] | None:
+        """Return the deltas after seq, None if some of them are no longer kept."""
+        if seq > self._seq:
+            # From before a restart, the numbers started over
+            return None
+        first = self._log[0]["seq"] if self._log else self._seq + 1
+        if seq < first - 1:
+            return None
+        return [delta for delta in self._log if delta["seq"] > seq]
+
+    @callback
+    def state(self) -> dict[str, list[dict[str, Any]]]:
+        """Return every field of every matrix, by config entry."""
+        return {
+            entry_id: [
+                {"kind": obj.KIND, "id": _key(client, obj)[1], **_values(obj)}
+                for obj in _objects(client)
+            ]
+            for entry_id, client in self._clients.items()
+        }
+
+
+@callback
+def async_get_change_feed(hass: HomeAssistant) -> ChangeFeed:
+    """Return the domain wide change feed, creating it on first use."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_CHANGE_FEED not in data:
+        data[DATA_CHANGE_FEED] = ChangeFeed(hass)
+        websocket_api.async_register_command(hass, websocket_changes)
+    return data[DATA_CHANGE_FEED]
+
+
+@websocket_api.websocket_command(
+    {
+        vol.Required("type"): WS_TYPE_CHANGES,
+        vol.Optional("since", default=0): vol.All(vol.Coerce(int), vol.Range(min=0)),
+    }
+)
+@callback
+def websocket_changes(hass: HomeAssistant, connection: websocket_api.ActiveConnection, msg: dict) -> None:
+    """Return the changes after a sequence number, or the whole state if they're gone."""
+    feed = async_get_change_feed(hass)
+    changes = feed.since(msg["since"])
+
+    if changes is None:
+        # Too far behind, start again from the full state and the current number
+        connection.send_result(msg["id"], {"seq": feed.seq, "changes": None, "state": feed.state()})
+        return
+
+    connection.send_result(msg["id"], {"seq": feed.seq, "changes": changes})
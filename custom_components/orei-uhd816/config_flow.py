@@ -7,14 +7,32 @@ from typing import Any
 import voluptuous as vol
 
 from homeassistant import config_entries
-from homeassistant.components import zeroconf
-from homeassistant.config_entries import ConfigFlow
-from homeassistant.const import CONF_HOST, CONF_NAME
+from homeassistant.components.network import async_get_source_ip
+from homeassistant.config_entries import ConfigEntry, ConfigFlow, OptionsFlow
+from homeassistant.const import CONF_ENABLED, CONF_HOST, CONF_NAME
+from homeassistant.core import callback
 from homeassistant.data_entry_flow import FlowResult
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
+import homeassistant.helpers.config_validation as cv
+from homeassistant.helpers import selector
 
-from .const import DOMAIN
-from .pyOreiMatrix import OreiMatrixAPI
+from . import async_get_manager
+from .const import (
+    CONF_GROUPS,
+    CONF_KEEP_WARM,
+    CONF_LEAD,
+    CONF_NETWORK,
+    CONF_OUTPUTS,
+    CONF_PREDICTOR,
+    CONF_THRESHOLD,
+    CONF_TRIGGERS,
+    CONF_WATTS,
+    DEFAULT_KEEP_WARM,
+    DEFAULT_LEAD,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WATTS,
+    DOMAIN,
+)
+from .pyOreiMatrix import DiscoveredMatrix, OreiMatrixAPI
 
 LOGGER = logging.getLogger(__package__)
 
@@ -25,17 +43,23 @@ class AVProMxFlowHandler(ConfigFlow, domain=DOMAIN):
     VERSION = 1
     CONNECTION_CLASS = config_entries.CONN_CLASS_LOCAL_PUSH
 
+    @staticmethod
+    @callback
+    def async_get_options_flow(config_entry: ConfigEntry) -> OptionsFlow:
+        """Return the flow that manages output groups."""
+        return OreiMatrixOptionsFlow()
+
     def __init__(self) -> None:
         """Initialize flow."""
         self._host: str | None = None
         self._errors: dict[str, str] = {}
+        self._discovered: dict[str, DiscoveredMatrix] = {}
 
     async def async_validate_input(self) -> FlowResult | None:
         """Validate the input Against the device."""
 
         self._errors.clear()
-        #session = async_get_clientsession(self.hass)
-        client = OreiMatrixAPI(self._host)
+        client = OreiMatrixAPI(self._host, manager=async_get_manager(self.hass))
 
         if not await client.Validate():
             self._errors["base"] = "cannot_connect"
@@ -54,6 +78,60 @@ class AVProMxFlowHandler(ConfigFlow, domain=DOMAIN):
         self, user_input: dict[str, Any] | None = None
     ) -> FlowResult:
         """Handle a flow initialized by the user."""
+        return self.async_show_menu(step_id="user", menu_options=["discover", "manual"])
+
+    async def async_step_manual(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Set up a matrix by its host name or IP address."""
+
+        if user_input is not None:
+            self._host = user_input[CONF_HOST]
+            result = await self.async_validate_input()
+            if result is not None:
+                return result
+
+        return self.async_show_form(
+            step_id="manual",
+            data_schema=vol.Schema({vol.Required(CONF_HOST, default=self._host or vol.UNDEFINED): str}),
+            errors=self._errors,
+        )
+
+    async def async_step_discover(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Scan an address range for matrices."""
+        errors: dict[str, str] = {}
+
+        if user_input is not None:
+            try:
+                found = await async_get_manager(self.hass).Discover(user_input[CONF_NETWORK])
+            except ValueError:
+                errors[CONF_NETWORK] = "invalid_network"
+            else:
+                configured = self._async_current_ids()
+                self._discovered = {
+                    matrix.host: matrix
+                    for matrix in found
+                    if matrix.IsSupported and matrix.macAddress not in configured
+                }
+                if self._discovered:
+                    return await self.async_step_pick()
+                errors["base"] = "no_devices_found"
+
+        # Default to the /24 Home Assistant itself is on
+        network = user_input[CONF_NETWORK] if user_input else f"{await async_get_source_ip(self.hass)}/24"
+
+        return self.async_show_form(
+            step_id="discover",
+            data_schema=vol.Schema({vol.Required(CONF_NETWORK, default=network): str}),
+            errors=errors,
+        )
+
+    async def async_step_pick(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Choose one of the matrices found by discovery."""
 
         if user_input is not None:
             self._host = user_input[CONF_HOST]
@@ -61,9 +139,124 @@ class AVProMxFlowHandler(ConfigFlow, domain=DOMAIN):
             if result is not None:
                 return result
 
+        choices = {
+            host: f"{matrix.model} {host} ({matrix.macAddress}, firmware {matrix.firmware})"
+            for host, matrix in self._discovered.items()
+        }
+
         return self.async_show_form(
-            step_id="user",
-            data_schema=vol.Schema({vol.Required(CONF_HOST): str}),
+            step_id="pick",
+            data_schema=vol.Schema({vol.Required(CONF_HOST): vol.In(choices)}),
             errors=self._errors,
         )
 
+
+
+def _number(minimum: float, maximum: float, step: float, unit: str) -> selector.NumberSelector:
+    return selector.NumberSelector(
+        selector.NumberSelectorConfig(
+            min=minimum, max=maximum, step=step, unit_of_measurement=unit, mode=selector.NumberSelectorMode.BOX
+        )
+    )
+
+
+class OreiMatrixOptionsFlow(OptionsFlow):
+    """Options flow for the output groups and predictive power on of a matrix."""
+
+    @property
+    def _groups(self) -> list[dict[str, Any]]:
+        entry = self.hass.config_entries.async_get_entry(self.handler)
+        return list(entry.options.get(CONF_GROUPS, []))
+
+    def _async_save(self, key: str, value: Any) -> FlowResult:
+        entry = self.hass.config_entries.async_get_entry(self.handler)
+        return self.async_create_entry(title="", data={**entry.options, key: value})
+
+    async def async_step_init(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Choose what to change."""
+        options = ["add_group", "remove_group"] if self._groups else ["add_group"]
+        return self.async_show_menu(step_id="init", menu_options=options + ["predictor"])
+
+    async def async_step_add_group(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Name a group and pick its outputs."""
+        client: OreiMatrixAPI | None = self.hass.data.get(DOMAIN, {}).get(self.handler)
+        if client is None:
+            # Output names come from the matrix, so it has to be set up
+            return self.async_abort(reason="not_loaded")
+
+        errors: dict[str, str] = {}
+        groups = self._groups
+
+        if user_input is not None:
+            name = user_input[CONF_NAME].strip()
+            outputs = sorted(int(id) for id in user_input[CONF_OUTPUTS])
+            if not name:
+                errors[CONF_NAME] = "invalid_name"
+            elif any(group[CONF_NAME].casefold() == name.casefold() for group in groups):
+                errors[CONF_NAME] = "group_exists"
+            elif len(outputs) < 2:
+                errors[CONF_OUTPUTS] = "too_few_outputs"
+            else:
+                return self._async_save(CONF_GROUPS, groups + [{CONF_NAME: name, CONF_OUTPUTS: outputs}])
+
+        choices = {
+            str(id): f"{id}: {client.GetOutput(id).Name}"
+            for id in range(1, client.outputCount+1)
+        }
+
+        return self.async_show_form(
+            step_id="add_group",
+            data_schema=vol.Schema({
+                vol.Required(CONF_NAME, default=user_input[CONF_NAME] if user_input else vol.UNDEFINED): str,
+                vol.Required(CONF_OUTPUTS, default=user_input[CONF_OUTPUTS] if user_input else []): cv.multi_select(choices),
+            }),
+            errors=errors,
+        )
+
+    async def async_step_remove_group(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Pick the groups to remove."""
+        groups = self._groups
+
+        if user_input is not None:
+            removed = set(user_input[CONF_GROUPS])
+            return self._async_save(CONF_GROUPS, [group for group in groups if group[CONF_NAME] not in removed])
+
+        choices = {
+            group[CONF_NAME]: f"{group[CONF_NAME]} (outputs {', '.join(str(id) for id in group[CONF_OUTPUTS])})"
+            for group in groups
+        }
+
+        return self.async_show_form(
+            step_id="remove_group",
+            data_schema=vol.Schema({vol.Required(CONF_GROUPS, default=[]): cv.multi_select(choices)}),
+        )
+
+    async def async_step_predictor(
+        self, user_input: dict[str, Any] | None = None
+    ) -> FlowResult:
+        """Set up powering the matrix on before it's wanted."""
+        if user_input is not None:
+            return self._async_save(CONF_PREDICTOR, user_input)
+
+        entry = self.hass.config_entries.async_get_entry(self.handler)
+        current = entry.options.get(CONF_PREDICTOR, {})
+
+        return self.async_show_form(
+            step_id="predictor",
+            data_schema=vol.Schema({
+                vol.Required(CONF_ENABLED, default=current.get(CONF_ENABLED, False)): bool,
+                vol.Required(CONF_LEAD, default=current.get(CONF_LEAD, DEFAULT_LEAD)): _number(0, 600, 5, "s"),
+                vol.Required(CONF_KEEP_WARM, default=current.get(CONF_KEEP_WARM, DEFAULT_KEEP_WARM)): _number(1, 240, 1, "min"),
+                vol.Required(CONF_THRESHOLD, default=current.get(CONF_THRESHOLD, DEFAULT_THRESHOLD)): _number(10, 100, 5, "%"),
+                vol.Required(CONF_WATTS, default=current.get(CONF_WATTS, DEFAULT_WATTS)): _number(0, 500, 1, "W"),
+                vol.Optional(CONF_TRIGGERS, default=current.get(CONF_TRIGGERS, [])): selector.EntitySelector(
+                    selector.EntitySelectorConfig(multiple=True)
+                ),
+            }),
+        )
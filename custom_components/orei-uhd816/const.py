@@ -1,4 +1,5 @@
 """Constants for the AVPro matrix switch integration."""
+from datetime import timedelta
 from typing import Final
 
 # This is the internal name of the integration, it should also match the directory
@@ -6,3 +7,77 @@ from typing import Final
 DOMAIN: Final           = "orei-uhd816"
 MANUFACTURER: Final     = "OREI"
 
+# Key in hass.data[DOMAIN] holding the shared OreiMatrixManager
+DATA_MANAGER: Final     = "manager"
+# Key in hass.data[DOMAIN] holding saved snapshots, by matrix MAC address then name
+DATA_SNAPSHOTS: Final   = "snapshots"
+
+# Key in hass.data[DOMAIN] holding the ChangeFeed shared by every matrix
+DATA_CHANGE_FEED: Final = "change_feed"
+
+# Fired with a batch of field level deltas, {"changes": [{"seq", "entry_id", "kind", "id", "field", "value"}, ...]}
+EVENT_CHANGES: Final    = "orei_matrix_changes"
+# Websocket command returning the deltas after a sequence number
+WS_TYPE_CHANGES: Final  = f"{DOMAIN}/changes"
+# How many deltas are kept for consumers catching up
+CHANGE_FEED_SIZE: Final = 2048
+
+# Key in hass.data[DOMAIN] holding calibrated send rates, by "model/firmware"
+DATA_RATE_LIMITS: Final = "rate_limits"
+STORAGE_KEY_RATE_LIMITS: Final = f"{DOMAIN}.rate_limits"
+STORAGE_VERSION: Final  = 1
+
+# Key in hass.data[DOMAIN] holding each matrix's last known description, by config entry
+DATA_DESCRIPTIONS: Final = "descriptions"
+STORAGE_KEY_DESCRIPTIONS: Final = f"{DOMAIN}.descriptions"
+
+# How often the full matrix state is re-read, over the open TCP session
+REFRESH_INTERVAL: Final = timedelta(minutes=5)
+
+# How often routing history is copied to its memory mapped file under the config dir
+HISTORY_FLUSH_INTERVAL: Final = timedelta(minutes=1)
+
+# Config flow field holding the CIDR range to scan for matrices
+CONF_NETWORK: Final     = "network"
+
+# Options holding the predictive power on settings, see PowerPredictor
+CONF_PREDICTOR: Final   = "predictor"
+CONF_LEAD: Final        = "lead"
+CONF_KEEP_WARM: Final   = "keep_warm"
+CONF_THRESHOLD: Final   = "threshold"
+CONF_WATTS: Final       = "watts"
+CONF_TRIGGERS: Final    = "triggers"
+DEFAULT_LEAD: Final     = 60    # seconds
+DEFAULT_KEEP_WARM: Final = 15   # minutes
+DEFAULT_THRESHOLD: Final = 50   # percent
+DEFAULT_WATTS: Final    = 30
+
+# Key in hass.data[DOMAIN] holding each matrix's predictor counters, by config entry
+DATA_PREDICTOR_STATES: Final = "predictor_states"
+STORAGE_KEY_PREDICTOR_STATES: Final = f"{DOMAIN}.predictor"
+
+# How often the predictor looks ahead, and how often a kept warm matrix is checked
+PREDICTOR_INTERVAL: Final = timedelta(minutes=1)
+
+# Options holding output groups, [{"name": "Whole house", "outputs": [1, 2, 5]}, ...],
+# each shown as one media player that routes all of its outputs at once
+CONF_GROUPS: Final      = "groups"
+CONF_OUTPUTS: Final     = "outputs"
+
+# Services
+SERVICE_HISTORY: Final  = "history"
+SERVICE_SNAPSHOT: Final = "snapshot"
+SERVICE_RESTORE: Final  = "restore"
+SERVICE_SET_EDID: Final = "set_edid"
+SERVICE_CALIBRATE: Final = "calibrate"
+SERVICE_PREDICTOR_REPORT: Final = "predictor_report"
+ATTR_CONFIG_ENTRY: Final = "config_entry"
+ATTR_START: Final       = "start"
+ATTR_END: Final         = "end"
+ATTR_OUTPUT: Final      = "output"
+ATTR_NAME: Final        = "name"
+ATTR_SNAPSHOT: Final    = "snapshot"
+ATTR_EDID: Final        = "edid"
+ATTR_INPUTS: Final      = "inputs"
+ATTR_RESET: Final       = "reset"
+DEFAULT_SNAPSHOT_NAME: Final = "default"
@@ -0,0 +1,61 @@
+"""Each matrix's model, ports and names, kept so the next start doesn't wait on the device."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DATA_DESCRIPTIONS, DOMAIN, STORAGE_KEY_DESCRIPTIONS, STORAGE_VERSION
+
+
+def _store(hass: HomeAssistant) -> Store:
+    return Store(hass, STORAGE_VERSION, STORAGE_KEY_DESCRIPTIONS)
+
+
+async def async_load_descriptions(hass: HomeAssistant) -> None:
+    """Read every stored description, once."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_DESCRIPTIONS in data:
+        return
+
+    data[DATA_DESCRIPTIONS] = await _store(hass).async_load() or {}
+
+
+@callback
+def async_get_description(hass: HomeAssistant, entry_id: str) -> dict[str, Any] | None:
+    """Return what a matrix looked like when it last started, None if it never has."""
+    return hass.data[DOMAIN].get(DATA_DESCRIPTIONS, {}).get(entry_id)
+
+
+async def async_save_description(hass: HomeAssistant, entry_id: str, description: dict[str, Any]) -> None:
+    """Keep a matrix's description, written only when it changed."""
+    descriptions = hass.data[DOMAIN].setdefault(DATA_DESCRIPTIONS, {})
+    if descriptions.get(entry_id) == description:
+        return
+    descriptions[entry_id] = description
+    await _store(hass).async_save(descriptions)
+
+
+async def async_remove_description(hass: HomeAssistant, entry_id: str) -> None:
+    """Forget a matrix that is no longer configured."""
+    await async_load_descriptions(hass)
+    descriptions = hass.data[DOMAIN][DATA_DESCRIPTIONS]
+    if descriptions.pop(entry_id, None) is not None:
+        await _store(hass).async_save(descriptions)
+
+
+def entities_changed(before: dict[str, Any], after: dict[str, Any]) -> bool:
+    """Return True if entities built from before would differ from ones built from after.
+
+    Entities are made for the visible ports, named after them, so a model,
+    name or visibility change means building them again. Routes don't count.
+    """
+    def ports(description: dict[str, Any]) -> tuple:
+        return (
+            description["model"],
+            [port[:2] for port in description["inputs"]],
+            [port[:2] for port in description["outputs"]],
+        )
+
+    return ports(before) != ports(after)
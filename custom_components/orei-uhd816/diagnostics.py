@@ -0,0 +1,56 @@
+"""Diagnostics support for the OREI matrix switch integration."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_HOST
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+from .pyOreiMatrix import OreiMatrixAPI
+
+TO_REDACT = {CONF_HOST, "unique_id", "macAddress", "ipAddress", "ipGateway"}
+REDACTED = "**REDACTED**"
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict[str, Any]:
+    """Return diagnostics for a config entry."""
+    client: OreiMatrixAPI = hass.data[DOMAIN][entry.entry_id]
+
+    matrix = {
+        "model": client.model,
+        "firmware": client.firmware,
+        "profile": repr(client.profile),
+        "macAddress": client.macAddress,
+        "ipAddress": client.ipAddress,
+        "ipGateway": client.ipGateway,
+        "tcpConnectState": client.tcpConnectState.name,
+        "power": client.power,
+        "refreshMode": client.refreshMode.name,
+    }
+
+    # The trace is the only place raw lines are kept, scrub addresses out of it too
+    secrets = [value for value in (entry.data.get(CONF_HOST), client.macAddress, client.ipAddress, client.ipGateway) if value]
+    trace = []
+    for line in client.trace.Dump():
+        for secret in secrets:
+            line = line.replace(secret, REDACTED)
+        trace.append(line)
+
+    return {
+        "entry": async_redact_data(entry.as_dict(), TO_REDACT),
+        "matrix": async_redact_data(matrix, TO_REDACT),
+        "send_queue": {
+            "length": client.sendQueueLength,
+            "counters": client.sendQueueCounters,
+            "failures": [command for _, command in client.commandFailures],
+        },
+        "version": client.version,
+        "subscribers": client.subscriberStats,
+        "predictor": client.predictor.Report() if client.predictor is not None else None,
+        "trace": trace,
+    }
@@ -0,0 +1,66 @@
+"""Base entity for values served straight from the matrix state model."""
+from __future__ import annotations
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_NAME
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.entity import Entity
+
+from .pyOreiMatrix import OreiMatrixAPI
+from .const import DOMAIN, MANUFACTURER
+
+
+def matrix_device_info(entry: ConfigEntry, controller: OreiMatrixAPI) -> DeviceInfo:
+    """Return the device every entity of a matrix belongs to."""
+    return DeviceInfo(
+        identifiers={(DOMAIN, entry.unique_id)},
+        manufacturer=MANUFACTURER,
+        model=controller.model,
+        name=entry.data[CONF_NAME],
+        sw_version=controller.firmware,
+    )
+
+
+class OreiMatrixFieldEntity(Entity):
+    """An entity that tracks one field of one matrix input or output.
+
+    It subscribes to that field only, so it is written when its own value changes
+    and never polls or queries the device.
+    """
+
+    _attr_should_poll = False
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, kind: str, id: int, field: str, suffix: str) -> None:
+        """Initialize the entity."""
+        self._controller = controller
+        self._kind = kind
+        self._id = id
+        self._field = field
+
+        self._attr_unique_id = f"{entry.unique_id}_{kind}{id:02d}_{suffix}"
+        self._attr_device_info = matrix_device_info(entry, controller)
+
+    @property
+    def matrix_object(self):
+        """Return the current model object, looked up so refreshes are picked up."""
+        if self._kind == "input":
+            return self._controller.GetInput(self._id)
+        return self._controller.GetOutput(self._id)
+
+    @property
+    def available(self) -> bool:
+        """Values are only trustworthy while we're connected to the matrix."""
+        return self._controller.IsConnected
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to our field and to the connection state."""
+        self._controller.SubscribeToField(self._kind, self._id, self._field, self._field_changed)
+        self._controller.SubscribeToField(OreiMatrixAPI.KIND, 0, "tcpConnectState", self._field_changed)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Drop our subscriptions."""
+        self._controller.UnsubscribeFromField(self._kind, self._id, self._field, self._field_changed)
+        self._controller.UnsubscribeFromField(OreiMatrixAPI.KIND, 0, "tcpConnectState", self._field_changed)
+
+    def _field_changed(self, changed_object, field: str) -> None:
+        self.async_write_ha_state()
@@ -11,11 +11,13 @@ from homeassistant.components.media_player import (
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import CONF_NAME
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers import entity_registry as er
+from homeassistant.util import slugify
 
 
+from .entity import matrix_device_info
 from .pyOreiMatrix import OreiMatrixAPI, MatrixOutput, MatrixInput
-from .const import DOMAIN, MANUFACTURER
+from .const import CONF_GROUPS, CONF_OUTPUTS, DOMAIN
 
 LOGGER = logging.getLogger(__package__)
 
@@ -33,34 +35,50 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_e
         if output.IsVisible:
             new_devices.append( HassMatrixOutput(hass, entry, client, output) )
 
+    groups = []
+    for group in entry.options.get(CONF_GROUPS, []):
+        # Outputs the matrix no longer has, e.g. after a model change, are left out
+        outputIds = [id for id in group[CONF_OUTPUTS] if 1 <= id <= client.outputCount]
+        LOGGER.debug(f"Found group {group[CONF_NAME]} Outputs={outputIds}.")
+        if outputIds:
+            groups.append( HassMatrixOutputGroup(hass, entry, client, group[CONF_NAME], outputIds) )
+    new_devices += groups
+
+    # Groups removed in the options go from the registry too, rather than
+    # lingering as unavailable entities
+    registry = er.async_get(hass)
+    kept = {group.unique_id for group in groups}
+    for item in er.async_entries_for_config_entry(registry, entry.entry_id):
+        if item.domain == "media_player" and item.unique_id.startswith(f"{entry.unique_id}_group_") and item.unique_id not in kept:
+            registry.async_remove(item.entity_id)
+
     if new_devices:
         async_add_entities(new_devices)
 
 
 class HassMatrixOutput(MediaPlayerEntity):
     """Our Media Player"""
-    _output: MatrixOutput
 
     def __init__(self, hass: HomeAssistant, entry: ConfigEntry, controller: OreiMatrixAPI, output: MatrixOutput):
         """Initialize our Media Player"""
         self._hass = hass
         self._controller = controller
-        self._output = output
-        self._extra_attributes = {}
+        self._output_id = output.Id
+        self._extra_attributes = self._build_attributes()
+        self._attr_app_name = controller.GetInputName(output.InputId)
 
         self._name = f"{output.Name} HDMI"
 
         self._attr_unique_id = f"{entry.unique_id}_{output.Id:02d}"
-        self._attr_device_info = DeviceInfo(
-            identifiers={(DOMAIN, entry.unique_id)},
-            manufacturer=MANUFACTURER,
-            model=self._controller.model,
-            name=entry.data[CONF_NAME],
-            sw_version=self._controller.firmware,
-        )
+        self._attr_device_info = matrix_device_info(entry, self._controller)
 
         controller.SubscribeToChanges(self.MatrixChangeHandler)
 
+    @property
+    def _output(self) -> MatrixOutput:
+        # Looked up every time, so refreshes are picked up
+        return self._controller.GetOutput(self._output_id)
+
     def MatrixChangeHandler(self, changedObject):
         if (type(changedObject) is OreiMatrixAPI) or \
            (type(changedObject) is MatrixOutput and changedObject.Id==self._output.Id) or \
@@ -70,13 +88,38 @@ class HassMatrixOutput(MediaPlayerEntity):
 
     def update_ha(self):
         try:
-            input: MatrixInput = self._controller.GetInput(self._output.InputId)
-            self._attr_app_name = input.Name
+            # Attributes are rebuilt here, when something we show changed, rather
+            # than on every state write.
+            self._extra_attributes = self._build_attributes()
+            self._attr_app_name = self._controller.GetInputName(self._output.InputId)
 
             self.schedule_update_ha_state()
         except Exception as error:  # pylint: disable=broad-except
             LOGGER.debug(f"State update failed. {error}")
 
+    def _build_attributes(self) -> dict:
+        # Useful for making sensors. A route to an input the matrix doesn't have,
+        # e.g. port 0, shows like a powered off matrix rather than failing.
+        if self._controller.power and self._controller.GetInputName(self._output.InputId) is not None:
+            input: MatrixInput = self._controller.GetInput(self._output.InputId)
+            return {
+                'input_id': input.Id,
+                'input_has_signal': input.IsActive,
+                'output_has_link': self._output.HasLink,
+                'output_cable_type': self._output.Cable,
+                'input_signal_flaps': input.SignalFlaps,
+                'output_link_flaps': self._output.LinkFlaps,
+            }
+
+        return {
+            'input_id': 0,
+            'input_has_signal': False,
+            'output_has_link': False,
+            'output_cable_type': "",
+            'input_signal_flaps': 0,
+            'output_link_flaps': 0,
+        }
+
     @property
     def name(self):
         """Return the name of the entity."""
@@ -106,8 +149,8 @@ class HassMatrixOutput(MediaPlayerEntity):
 
     @property
     def available(self) -> bool:
-        """Return if the media player is available."""
-        return True
+        """A preloaded matrix is only available once it has answered."""
+        return self._controller.IsValidated or self._controller.IsConnected
 
     @property
     def supported_features(self) -> MediaPlayerEntityFeature:
@@ -121,11 +164,11 @@ class HassMatrixOutput(MediaPlayerEntity):
     @property
     def source(self) -> str | None:
         """Return the current input source."""
-        return self._controller.GetInput( self._output.InputId ).Name
+        return self._controller.GetInputName( self._output.InputId )
 
     @property
     def source_list(self):
-        # List of available input sources.
+        # List of available input sources, shared by every output.
         return self._controller.GetInputNames()
 
     @property
@@ -145,16 +188,14 @@ class HassMatrixOutput(MediaPlayerEntity):
             LOGGER.debug(f"Skipped setting identical source ('{self.source}').")
         else:
             # Select input source.
-            names = self._controller.GetInputNames(all=True)
-
-            if source in names:
-                index = names.index(source)
+            inputId = self._controller.GetInputIdByName(source)
 
+            if inputId is not None:
                 # Make sure that we're ON
                 if not self._controller.power:
                     self._controller.CmdPowerOn()
 
-                self._output.CmdSelectInput(index+1)
+                self._output.CmdSelectInput(inputId)
             else:
                 raise ValueError(f"'{source}' is not a valid source.")
 
@@ -167,29 +208,162 @@ class HassMatrixOutput(MediaPlayerEntity):
     @property
     def extra_state_attributes(self):
         """Return extra state attributes."""
-        input: MatrixInput = self._controller.GetInput(self._output.InputId)
+        return self._extra_attributes
+
+    async def async_mute_volume(self, mute: bool) -> None:
+        """Engage AVR mute."""
+        self._output.CmdSetOutputStream(not mute)
+
+    async def async_set_volume_level(self, volume: float) -> None:
+        """Set AVR volume (0 to 1)."""
+        LOGGER.debug("Volume is only here to support Mute.")
+        self._attr_volume_level = 1.0
+
+
+class HassMatrixOutputGroup(MediaPlayerEntity):
+    """Several outputs that switch together, e.g. every display in the house.
+
+    A source change is one batch for the whole group, and the entity is written
+    once the matrix has confirmed every member's route. Its state comes from its
+    members, never from asking the matrix.
+    """
+
+    _attr_should_poll = False
 
-        self._attr_app_name = input.Name
+    # Member fields the group's state is made of
+    MEMBER_FIELDS = ("inputId", "streamEnabled")
+
+    def __init__(self, hass: HomeAssistant, entry: ConfigEntry, controller: OreiMatrixAPI, name: str, outputIds: list[int]):
+        """Initialize our group."""
+        self._hass = hass
+        self._controller = controller
+        self._output_ids = outputIds
+        # While a batch is on its way, member echoes don't each write the state
+        self._switching = False
+
+        self._attr_name = name
+        self._attr_unique_id = f"{entry.unique_id}_group_{slugify(name)}"
+        self._attr_device_info = matrix_device_info(entry, controller)
+
+    @property
+    def _outputs(self) -> list[MatrixOutput]:
+        # Looked up every time, so refreshes are picked up
+        return [self._controller.GetOutput(id) for id in self._output_ids]
+
+    async def async_added_to_hass(self) -> None:
+        """Subscribe to the fields of our members and to the matrix power."""
+        for id in self._output_ids:
+            for field in self.MEMBER_FIELDS:
+                self._controller.SubscribeToField(MatrixOutput.KIND, id, field, self._field_changed)
+        for field in ("power", "tcpConnectState"):
+            self._controller.SubscribeToField(OreiMatrixAPI.KIND, 0, field, self._field_changed)
+
+    async def async_will_remove_from_hass(self) -> None:
+        """Drop our subscriptions."""
+        for id in self._output_ids:
+            for field in self.MEMBER_FIELDS:
+                self._controller.UnsubscribeFromField(MatrixOutput.KIND, id, field, self._field_changed)
+        for field in ("power", "tcpConnectState"):
+            self._controller.UnsubscribeFromField(OreiMatrixAPI.KIND, 0, field, self._field_changed)
+
+    def _field_changed(self, changed_object, field: str) -> None:
+        if not self._switching:
+            self.async_write_ha_state()
+
+    @property
+    def icon(self):
+        if self._controller.IsConnected:
+            return "mdi:video-switch"
+        else:
+            return "mdi:video-switch-outline"
+
+    @property
+    def supported_features(self) -> MediaPlayerEntityFeature:
+        """Flag media player features that are supported."""
+        return MediaPlayerEntityFeature.SELECT_SOURCE \
+                | MediaPlayerEntityFeature.TURN_ON \
+                | MediaPlayerEntityFeature.TURN_OFF \
+                | MediaPlayerEntityFeature.VOLUME_MUTE \
+                | MediaPlayerEntityFeature.VOLUME_SET # Silly but we need this for mute
 
+    @property
+    def state(self) -> MediaPlayerState | None:
+        """Return the state of the device."""
         if self._controller.power:
-            self._extra_attributes['input_id']=input.Id
-            self._extra_attributes['input_has_signal']= input.IsActive
-            self._extra_attributes['output_has_link'] = self._output.HasLink
-            self._extra_attributes['output_cable_type'] = self._output.Cable
+            return MediaPlayerState.ON
         else:
-            self._extra_attributes['input_id']=0
-            self._extra_attributes['input_has_signal']= False
-            self._extra_attributes['output_has_link'] = False
-            self._extra_attributes['output_cable_type']=""
+            return MediaPlayerState.OFF
 
-        # Useful for making sensors
-        return self._extra_attributes
+    @property
+    def available(self) -> bool:
+        """A preloaded matrix is only available once it has answered."""
+        return self._controller.IsValidated or self._controller.IsConnected
+
+    @property
+    def _input_id(self) -> int | None:
+        # The input every member shows, None while they show different ones
+        inputIds = {output.InputId for output in self._outputs}
+        return inputIds.pop() if len(inputIds) == 1 else None
+
+    @property
+    def source(self) -> str | None:
+        """Return the input source all members show, if they agree."""
+        inputId = self._input_id
+        return self._controller.GetInputName(inputId)
+
+    @property
+    def source_list(self):
+        # List of available input sources, shared by every output.
+        return self._controller.GetInputNames()
+
+    @property
+    def volume_level(self) -> float | None:
+        return 1.0
+
+    @property
+    def is_volume_muted(self) -> bool | None:
+        # Muted once no member streams any more
+        return not any(output.StreamEnabled for output in self._outputs)
+
+    @property
+    def extra_state_attributes(self):
+        """Return extra state attributes."""
+        inputId = self._input_id if self._controller.power else None
+        return {
+            'input_id': inputId or 0,
+            'output_ids': list(self._output_ids),
+            'outputs': [output.Name for output in self._outputs],
+        }
+
+    async def async_select_source(self, source):
+        # Select input source on every member at once.
+        inputId = self._controller.GetInputIdByName(source)
+        if inputId is None:
+            raise ValueError(f"'{source}' is not a valid source.")
+
+        # Make sure that we're ON
+        if not self._controller.power:
+            self._controller.CmdPowerOn()
+
+        self._switching = True
+        try:
+            if not await self._controller.Route(self._output_ids, inputId):
+                LOGGER.warning(f"Matrix did not confirm every route of {self.name} to '{source}'.")
+        finally:
+            self._switching = False
+            self.async_write_ha_state()
+
+    async def async_turn_on(self):
+        self._controller.CmdPowerOn()
+
+    async def async_turn_off(self):
+        self._controller.CmdPowerOff()
 
     async def async_mute_volume(self, mute: bool) -> None:
-        """Engage AVR mute."""
-        self._output.CmdSetOutputStream(not mute)
+        """Disable or enable the streams of every member."""
+        for output in self._outputs:
+            output.CmdSetOutputStream(not mute)
 
     async def async_set_volume_level(self, volume: float) -> None:
         """Set AVR volume (0 to 1)."""
         LOGGER.debug("Volume is only here to support Mute.")
-        self._attr_volume_level = 1.0
@@ -0,0 +1,115 @@
+"""Predictive power on: warming a matrix up before it's wanted, set up from the options."""
+from __future__ import annotations
+
+from typing import Any
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.const import CONF_ENABLED, STATE_HOME, STATE_ON, STATE_PLAYING
+from homeassistant.core import Event, HomeAssistant, callback
+from homeassistant.helpers.event import async_track_state_change_event, async_track_time_interval
+from homeassistant.helpers.storage import Store
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    CONF_KEEP_WARM,
+    CONF_LEAD,
+    CONF_PREDICTOR,
+    CONF_THRESHOLD,
+    CONF_TRIGGERS,
+    CONF_WATTS,
+    DATA_PREDICTOR_STATES,
+    DEFAULT_KEEP_WARM,
+    DEFAULT_LEAD,
+    DEFAULT_THRESHOLD,
+    DEFAULT_WATTS,
+    DOMAIN,
+    PREDICTOR_INTERVAL,
+    STORAGE_KEY_PREDICTOR_STATES,
+    STORAGE_VERSION,
+)
+from .pyOreiMatrix import OreiMatrixAPI, PredictorSettings
+
+# A trigger entity fires when it comes into one of these, e.g. a TV turning on
+TRIGGER_STATES = {STATE_ON, STATE_PLAYING, STATE_HOME}
+
+
+def _store(hass: HomeAssistant) -> Store:
+    return Store(hass, STORAGE_VERSION, STORAGE_KEY_PREDICTOR_STATES)
+
+
+def _localtime(when: float):
+    # Slots follow Home Assistant's time zone rather than the process's
+    return dt_util.as_local(dt_util.utc_from_timestamp(when)).timetuple()
+
+
+async def async_load_predictor_states(hass: HomeAssistant) -> None:
+    """Read every stored predictor state, once."""
+    data = hass.data.setdefault(DOMAIN, {})
+    if DATA_PREDICTOR_STATES in data:
+        return
+
+    data[DATA_PREDICTOR_STATES] = await _store(hass).async_load() or {}
+
+
+async def async_save_predictor_state(hass: HomeAssistant, entry_id: str, state: dict[str, Any]) -> None:
+    """Keep a predictor's counters, written only when they changed."""
+    states = hass.data[DOMAIN].setdefault(DATA_PREDICTOR_STATES, {})
+    if states.get(entry_id) == state:
+        return
+    states[entry_id] = state
+    await _store(hass).async_save(states)
+
+
+async def async_remove_predictor_state(hass: HomeAssistant, entry_id: str) -> None:
+    """Forget the counters of a matrix that is no longer configured."""
+    await async_load_predictor_states(hass)
+    states = hass.data[DOMAIN][DATA_PREDICTOR_STATES]
+    if states.pop(entry_id, None) is not None:
+        await _store(hass).async_save(states)
+
+
+def predictor_settings(options: dict[str, Any]) -> PredictorSettings:
+    """Return the library settings for the predictor options of an entry."""
+    return PredictorSettings(
+        lead=options.get(CONF_LEAD, DEFAULT_LEAD),
+        keepWarm=options.get(CONF_KEEP_WARM, DEFAULT_KEEP_WARM) * 60,
+        threshold=options.get(CONF_THRESHOLD, DEFAULT_THRESHOLD) / 100,
+        watts=options.get(CONF_WATTS, DEFAULT_WATTS),
+    )
+
+
+@callback
+def async_setup_predictor(hass: HomeAssistant, entry: ConfigEntry, client: OreiMatrixAPI) -> None:
+    """Start predicting power ons for a matrix, if its options ask for it."""
+    options = entry.options.get(CONF_PREDICTOR, {})
+    if not options.get(CONF_ENABLED):
+        client.ConfigurePredictor(None)
+        return
+
+    predictor = client.ConfigurePredictor(predictor_settings(options), localtime=_localtime)
+    state = hass.data[DOMAIN].get(DATA_PREDICTOR_STATES, {}).get(entry.entry_id)
+    if state is not None:
+        predictor.Restore(state)
+
+    @callback
+    def async_check(now) -> None:
+        predictor.Check()
+        # Counters only move on power ons, demands and triggers, so this rarely writes
+        entry.async_create_background_task(
+            hass, async_save_predictor_state(hass, entry.entry_id, predictor.State()), f"{DOMAIN} predictor {entry.title}"
+        )
+
+    entry.async_on_unload(async_track_time_interval(hass, async_check, PREDICTOR_INTERVAL))
+
+    @callback
+    def async_trigger(event: Event) -> None:
+        old_state = event.data["old_state"]
+        new_state = event.data["new_state"]
+        if new_state is None or new_state.state not in TRIGGER_STATES:
+            return
+        if old_state is not None and old_state.state in TRIGGER_STATES:
+            return
+        predictor.OnTrigger(event.data["entity_id"])
+
+    if options.get(CONF_TRIGGERS):
+        entry.async_on_unload(async_track_state_change_event(hass, options[CONF_TRIGGERS], async_trigger))
@@ -1,5 +1,66 @@
-from .pyOreiMatrix import (
-    MatrixInput,
-    MatrixOutput,
-    OreiMatrixAPI
-)
\ No newline at end of file
+import importlib
+
+# Every public name and the module it lives in. Modules are only imported when
+# one of their names is first used, so loading the package doesn't pay for
+# aiohttp, the simulator or the CLI's dependencies until something needs them.
+_EXPORTS = {
+    "MatrixInput":          ".pyOreiMatrix",
+    "MatrixOutput":         ".pyOreiMatrix",
+    "OreiMatrixAPI":        ".pyOreiMatrix",
+    "Calibrate":            ".pyOreiMatrixCalibrate",
+    "RateCalibration":      ".pyOreiMatrixCalibrate",
+    "ChangeLog":            ".pyOreiMatrixChangeLog",
+    "MatrixDelta":          ".pyOreiMatrixChangeLog",
+    "DebounceSettings":     ".pyOreiMatrixDebounce",
+    "SIGNAL_INPUT_ACTIVE":  ".pyOreiMatrixDebounce",
+    "SIGNAL_OUTPUT_LINK":   ".pyOreiMatrixDebounce",
+    "DiscoveredMatrix":     ".pyOreiMatrixDiscovery",
+    "OreiMatrixDiscovery":  ".pyOreiMatrixDiscovery",
+    "PowerOffPolicy":       ".pyOreiMatrixEnums",
+    "QueueOverflowPolicy":  ".pyOreiMatrixEnums",
+    "RefreshMode":          ".pyOreiMatrixEnums",
+    "OreiMatrixManager":    ".pyOreiMatrixManager",
+    "TimerWheel":           ".pyOreiMatrixManager",
+    "PowerPredictor":       ".pyOreiMatrixPredictor",
+    "PredictorSettings":    ".pyOreiMatrixPredictor",
+    "ReplayPredictor":      ".pyOreiMatrixPredictor",
+    "CommandSpec":          ".pyOreiMatrixProfiles",
+    "MatrixCommand":        ".pyOreiMatrixProfiles",
+    "ModelProfile":         ".pyOreiMatrixProfiles",
+    "OreiProfile":          ".pyOreiMatrixProfiles",
+    "GetProfile":           ".pyOreiMatrixProfiles",
+    "RegisterProfile":      ".pyOreiMatrixProfiles",
+    "SupportedModels":      ".pyOreiMatrixProfiles",
+    "OreiMatrixProxy":      ".pyOreiMatrixProxy",
+    "GetRateLimit":         ".pyOreiMatrixRateLimit",
+    "RegisterRateLimit":    ".pyOreiMatrixRateLimit",
+    "TokenBucket":          ".pyOreiMatrixRateLimit",
+    "MatrixPoweredOffError": ".pyOreiMatrixSendQueue",
+    "SendQueueFullError":   ".pyOreiMatrixSendQueue",
+    "OreiMatrixSimulator":  ".pyOreiMatrixSimulator",
+    "MatrixSnapshot":       ".pyOreiMatrixSnapshot",
+    "MatrixTopology":       ".pyOreiMatrixTopology",
+    "LineFramer":           ".pyOreiMatrixTransport",
+    "MatrixTransport":      ".pyOreiMatrixTransport",
+    "SerialTransport":      ".pyOreiMatrixTransport",
+    "TcpTransport":         ".pyOreiMatrixTransport",
+    "TelnetTransport":      ".pyOreiMatrixTransport",
+    "TransportFactory":     ".pyOreiMatrixTransport",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name: str):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(module, __name__), name)
+    # Cached on the package so the next lookup doesn't come back here
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(_EXPORTS))
@@ -0,0 +1,5 @@
+import sys
+
+from .pyOreiMatrixCli import Main
+
+sys.exit(Main())
@@ -1,9 +1,21 @@
 import asyncio
-import aiohttp
+import collections
 import json
 import logging
-from .pyOreiMatrixEnums import EDID, TcpConnectedState
-import queue
+from .pyOreiMatrixEnums import EDID, PowerOffPolicy, QueueOverflowPolicy, RefreshMode, TcpConnectedState
+from .pyOreiMatrixDispatch import Subscriber, RemoveSubscriber
+from .pyOreiMatrixChangeLog import ChangeLog, DeltaCursor, MatrixDelta
+from .pyOreiMatrixDebounce import DebounceSettings, SignalDebouncer, SIGNAL_INPUT_ACTIVE, SIGNAL_OUTPUT_LINK
+from .pyOreiMatrixManager import OreiMatrixManager, TimerHandle
+from .pyOreiMatrixProfiles import ModelProfile, MatrixCommand, DEFAULT_PROFILE, GetProfile
+from .pyOreiMatrixRateLimit import TokenBucket, GetRateLimit
+from .pyOreiMatrixHistory import RoutingHistory, HISTORY_LINK, HISTORY_POWER, HISTORY_ROUTE, HISTORY_SIGNAL
+from .pyOreiMatrixPredictor import PowerPredictor, PredictorSettings
+from .pyOreiMatrixTrace import TraceBuffer, TRACE_CONNECTION, TRACE_HOLDBACK, TRACE_QUEUE, TRACE_RX, TRACE_STATE, TRACE_TX
+from .pyOreiMatrixSnapshot import MatrixSnapshot
+from .pyOreiMatrixSendQueue import SendQueue, PendingCommand, MatrixPoweredOffError, SendQueueFullError, \
+    DROP_DISCONNECTED, DROP_NOT_CONFIRMED, DROP_POWERED_OFF
+from .pyOreiMatrixTransport import MatrixTransport, TcpTransport
 import time
 
 _LOGGER = logging.getLogger(__name__)
@@ -14,27 +26,40 @@ REQ_GET_INPUTS  = {"comhead":"get input status","language":0}
 REQ_GET_OUTPUTS = {"comhead":"get output status","language":0}
 REQ_GET_SYSTEM  = {"comhead":"get system status","language":0}
 
-SUPPORTED_MODELS = ['HDP-MXB88D70M']
+# Commands, responses, port counts and device timing come from the model's
+# ModelProfile, see pyOreiMatrixProfiles
+# Heartbeats left unanswered for heartbeatIdle before the link counts as dead,
+# i.e. one idle period, a heartbeat, then one more period: 20s at the default 10s
+TCP_HEARTBEAT_MAX_MISSED= 1
+
+TCP_CONFIRM_MAX_RETRIES = 2
+TCP_MAX_IN_FLIGHT       = 8
+TCP_FAILURE_HISTORY     = 20
+TCP_ECHO_HISTORY        = 256
+
+# (KIND, field) -> (history kind, value getter) for the changes RoutingHistory keeps
+HISTORY_FIELDS = {
+    ("output", "inputId"): (HISTORY_ROUTE, lambda output: output.InputId),
+    ("output", "link"):    (HISTORY_LINK, lambda output: output.HasLink),
+    ("input", "active"):   (HISTORY_SIGNAL, lambda input: input.IsActive),
+    ("matrix", "power"):   (HISTORY_POWER, lambda api: api.power),
+}
+
+def ChangedFields(fields: tuple, before: tuple, after: tuple) -> tuple:
+    return tuple(field for field, b, a in zip(fields, before, after) if b != a)
 
-TCP_BEEP_ON_COMMAND     = "s beep 1"
-TCP_BEEP_OFF_COMMAND    = "s beep 0"
-TCP_COMMAND_DELIMITER   = "!\r\n"
-TCP_GETSTATUS_COMMAND   = "r status"
-TCP_GET_CAT_STREAM_COMMAND   = "r cat 0 stream"
-TCP_GET_HDMI_STREAM_COMMAND   = "r hdmi 0 stream"
-TCP_HEARTBEAT_COMMAND   = "r power"
-TCP_LOCK_ON_COMMAND     = "s lock 1"
-TCP_LOCK_OFF_COMMAND    = "s lock 0"
-TCP_POWER_ON_COMMAND    = "s power 1"
-TCP_POWER_OFF_COMMAND   = "s power 0"
 
 class MatrixInput:
+    KIND = "input"
+    FIELDS = ("name", "active", "visible", "edid", "signalFlaps")
+
     __api = None
     __id: int
     __name: str
     __active: bool
     __visible: bool
     __edid: EDID
+    __signalFlaps: int
 
     def __init__(self, api, id: int, name: str, active: bool, visible: bool, edid: EDID):
         self.__api = api
@@ -43,6 +68,7 @@ class MatrixInput:
         self.__active = active
         self.__visible = visible
         self.__edid = edid
+        self.__signalFlaps = 0
 
 
     @property
@@ -61,13 +87,24 @@ class MatrixInput:
     def IsVisible(self) -> bool:
         return self.__visible
 
+    @property
+    def SignalFlaps(self) -> int:
+        return self.__signalFlaps
+
+    def Fields(self) -> tuple:
+        # Values in FIELDS order, used to work out which fields a change touched
+        return (self.__name, self.__active, self.__visible, self.__edid, self.__signalFlaps)
+
     def SetProperty(self, name:str, val) -> bool:
-        if name=="edidString":
-            #self.__edid = val
+        if name=="edid":
+            self.__edid = val
             return True
         elif name == "active":
             self.__active = val
             return True
+        elif name == "signalFlaps":
+            self.__signalFlaps = val
+            return True
 
         return False
 
@@ -75,14 +112,23 @@ class MatrixInput:
     def Edid(self) -> EDID:
         return self.__edid
 
+    # COMMANDS
+    def CmdSetEdid(self, edid: EDID) -> None:
+        self.__api.CmdSend(self.__api.profile.Build("edid", input=self.__id, edid=int(edid)))
+
+    # COMMANDS - END
+
     def __str__(self):
-        return f"MatrixInput(id={self.__id} name='{self.__name}', active={self.__active}, visible={self.__visible}, edid={self.__edid.describe})"
+        return f"MatrixInput(id={self.__id} name='{self.__name}', active={self.__active}, visible={self.__visible}, edid={self.__edid.describe if self.__edid is not None else None})"
 
     def __repr__(self):
-        return f"MatrixInput(id={self.__id} name='{self.__name}', active={self.__active}, visible={self.__visible}, edid={self.__edid.describe})"
+        return f"MatrixInput(id={self.__id} name='{self.__name}', active={self.__active}, visible={self.__visible}, edid={self.__edid.describe if self.__edid is not None else None})"
 
 
 class MatrixOutput:
+    KIND = "output"
+    FIELDS = ("name", "inputId", "visible", "link", "cable", "streamEnabled", "linkFlaps")
+
     __api: 'OreiMatrixAPI' = None
     __id: int
     __name: str
@@ -93,6 +139,7 @@ class MatrixOutput:
     __cable: str
     __streamEnabledHDMI: bool
     __streamEnabledHDBT: bool
+    __linkFlaps: int
 
     def __init__(self, api, id: int, name: str, inputId: int, visible: bool, activeHDMI: bool, activeHDBT: bool, enabledHDMI: bool, enabledHDBT):
         self.__api = api
@@ -102,9 +149,12 @@ class MatrixOutput:
         self.__visible = visible
         self.__hasLinkHDMI = activeHDMI
         self.__hasLinkHDBT = activeHDBT
-        self.__cable = ""
+        # A refresh only says which links are up, not which came last, HDMI
+        # wins when both are until a hot plug says otherwise
+        self.__cable = "HDMI" if activeHDMI else "HDBT" if activeHDBT else ""
         self.__streamEnabledHDMI = enabledHDMI
         self.__streamEnabledHDBT = enabledHDBT
+        self.__linkFlaps = 0
 
     @property
     def Id(self) -> int:
@@ -126,10 +176,34 @@ class MatrixOutput:
     def HasLink(self) -> bool:
         return self.__hasLinkHDMI or self.__hasLinkHDBT
 
+    @property
+    def HasLinkHDMI(self) -> bool:
+        return self.__hasLinkHDMI
+
+    @property
+    def HasLinkHDBT(self) -> bool:
+        return self.__hasLinkHDBT
+
+    @property
+    def LinkFlaps(self) -> int:
+        return self.__linkFlaps
+
+    def Fields(self) -> tuple:
+        # Values in FIELDS order, used to work out which fields a change touched
+        return (self.__name, self.__inputId, self.__visible, self.HasLink, self.Cable, self.StreamEnabled, self.__linkFlaps)
+
     @property
     def StreamEnabled(self) -> bool:
         return self.__streamEnabledHDMI and self.__streamEnabledHDBT
 
+    @property
+    def StreamEnabledHDMI(self) -> bool:
+        return self.__streamEnabledHDMI
+
+    @property
+    def StreamEnabledHDBT(self) -> bool:
+        return self.__streamEnabledHDBT
+
     @property
     def Cable(self) -> str:
         if self.HasLink:
@@ -144,11 +218,15 @@ class MatrixOutput:
             self.__hasLinkHDMI = val
             if val:
                 self.__cable = "HDMI"
+            elif self.__hasLinkHDBT:
+                self.__cable = "HDBT"
             return True
         elif name == "link-cat":
             self.__hasLinkHDBT = val
             if val:
                 self.__cable = "HDBT"
+            elif self.__hasLinkHDMI:
+                self.__cable = "HDMI"
             return True
         elif name == "stream-hdmi":
             self.__streamEnabledHDMI = val
@@ -156,32 +234,40 @@ class MatrixOutput:
         elif name == "stream-cat":
             self.__streamEnabledHDBT = val
             return True
+        elif name == "linkFlaps":
+            self.__linkFlaps = val
+            return True
 
         return False
 
     # COMMANDS
     def CmdSelectInput(self, inputId : int) -> None:
-        self.__api.CmdSend(f"s in {inputId} av out {self.__id}")
+        self.__api.CmdSend(self.__api.profile.Build("route", input=inputId, output=self.__id))
 
     def CmdSetOutputStream(self, on: bool) -> None:
-        self.__api.CmdSend(f"s cat {self.Id} stream {1 if on else 0}")
-        self.__api.CmdSend(f"s hdmi {self.Id} stream {1 if on else 0}")
+        self.__api.CmdSend(self.__api.profile.Build("stream", cable="cat", output=self.__id, on=on))
+        self.__api.CmdSend(self.__api.profile.Build("stream", cable="hdmi", output=self.__id, on=on))
 
     # COMMANDS - END
 
     def __str__(self):
-        return f"MatrixOutput(id={self.__id} name='{self.__name}', inputId={self.__inputId}, visible={self.__visible}, active={self.__active})"
+        return f"MatrixOutput(id={self.__id} name='{self.__name}', inputId={self.__inputId}, visible={self.__visible}, link={self.HasLink})"
 
     def __repr__(self):
-        return f"MatrixOutput(id={self.__id} name='{self.__name}', inputId={self.__inputId}, visible={self.__visible}, active={self.__active})"
+        return f"MatrixOutput(id={self.__id} name='{self.__name}', inputId={self.__inputId}, visible={self.__visible}, link={self.HasLink})"
 
 
 
 class OreiMatrixAPI:
+    KIND = "matrix"
+    FIELDS = ("power", "beep", "panel_lock", "tcpConnectState", "model", "firmware", "macAddress", "ipAddress")
+
     __maxRetries: int
     __model: str
+    __profile: ModelProfile
     __macAddress: str
     __host: str
+    __httpPort: int
     __tcpPort: int
     __power: bool
     __beep: bool
@@ -192,24 +278,56 @@ class OreiMatrixAPI:
     __ipGateway: str
     __firmware: str
     __tcpConnectState: TcpConnectedState
+    __validated: bool
     __tcpSendHoldbackTime: float
 
     __inputs: list[MatrixInput]
     __outputs: list[MatrixOutput]
-
-    __callbacks: list[callable]
-    __tcpSendQueue: queue.Queue
-    __tcpRecvBuffer: str
+    __inputNames: tuple[str, ...]
+    __inputNamesAll: tuple[str, ...]
+    __inputIdsByName: dict[str, int]
+
+    __callbacks: list[Subscriber]
+    __lineCallbacks: list[Subscriber]
+    __fieldCallbacks: dict[tuple, list[Subscriber]]
+    __deltaCallbacks: list[Subscriber]
+    __changes: ChangeLog
+    __tcpSendQueue: SendQueue
+    __powerOffPolicy: PowerOffPolicy
+    __refreshMode: RefreshMode
+    __tcpInFlight: list[PendingCommand]
+    __tcpConfirmTimer: TimerHandle
+    __commandFailures: collections.deque
+    __echoLatencies: collections.deque
     __tcpDisconnect: bool
-
-
-
-
-    def __init__(self, host: str) -> None:
+    __tcpConnectTask: asyncio.Task
+
+    __manager: OreiMatrixManager
+    __ownsManager: bool
+    __tcpTransport: MatrixTransport
+    __transportFactory: callable
+    __tcpLastReceived: float
+    __tcpRateLimit: TokenBucket
+    __tcpHeartbeat: int
+    __tcpHeartbeatTimer: TimerHandle
+    __tcpServiceTimer: TimerHandle
+    __tcpExpiryTimer: TimerHandle
+    __tcpExpiryDue: float
+    __debouncer: SignalDebouncer
+    __trace: TraceBuffer
+    __history: RoutingHistory
+    __predictor: PowerPredictor
+    __responseHandlers: dict[str, callable]
+
+    def __init__(self, host: str, manager: OreiMatrixManager = None, httpPort: int = 80) -> None:
+        self.__trace = TraceBuffer()
+        self.__history = RoutingHistory()
         self.__maxRetries = 3
         self.__model = None
+        self.__profile = DEFAULT_PROFILE # Replaced by the model's own in Validate
         self.__macAddress = None
         self.__host = host
+        self.__httpPort = httpPort
         self.__tcpPort = 8000 # Updated from default to actual in Validate
         self.__power = False
         self.__beep = False
@@ -220,17 +338,106 @@ class OreiMatrixAPI:
         self.__ipGateway = ""
         self.__firmware = ""
         self.__tcpConnectState = TcpConnectedState.Disconnected
+        self.__validated = False
         self.__tcpSendHoldbackTime = 0
 
         self.__inputs = None
         self.__outputs = None
+        self.__inputNames = ()
+        self.__inputNamesAll = ()
+        self.__inputIdsByName = {}
 
         self.__callbacks = []
-        self.__tcpSendQueue = queue.Queue()
-        self.__tcpRecvBuffer = ""
+        self.__lineCallbacks = []
+        self.__fieldCallbacks = {}
+        self.__deltaCallbacks = []
+        self.__changes = ChangeLog()
+        self.__tcpSendQueue = SendQueue()
+        self.__powerOffPolicy = PowerOffPolicy.Defer
+        self.__refreshMode = RefreshMode.Tcp
+        self.__tcpInFlight = []
+        self.__tcpConfirmTimer = None
+        self.__commandFailures = collections.deque(maxlen=TCP_FAILURE_HISTORY)
+        self.__echoLatencies = collections.deque(maxlen=TCP_ECHO_HISTORY)
         self.__tcpDisconnect = True
+        self.__tcpConnectTask = None
         self.__power_on_requested = False
         self.__power_off_requested = False
+        self.__predictor = None
+        self.__predictedPowerOff = False
+
+        # Standalone instances get a private manager; Home Assistant shares one
+        self.__ownsManager = manager is None
+        self.__manager = OreiMatrixManager() if manager is None else manager
+        self.__tcpTransport = None
+        self.__transportFactory = TcpTransport
+        self.__tcpLastReceived = 0
+        self.__tcpRateLimit = TokenBucket(DEFAULT_PROFILE.sendRate, DEFAULT_PROFILE.sendBurst)
+        self.__tcpHeartbeat = 0
+        self.__tcpHeartbeatTimer = None
+        self.__tcpServiceTimer = None
+        self.__tcpExpiryTimer = None
+        self.__tcpExpiryDue = 0
+        self.__debouncer = SignalDebouncer(self.__manager.wheel)
+
+        # Keyed by the event names the profile's response patterns produce
+        self.__responseHandlers = {
+            "power":        self.__OnPower,
+            "beep":         lambda values: self.__set_beep(values["state"] == 1) or True,
+            "panel_lock":   lambda values: self.__set_panel_lock(values["state"] == 1) or True,
+            "route":        lambda values: self.__SetOutputProperty(values["output"], "inputId", values["input"]),
+            "edid":         self.__OnEdid,
+            "input_link":   lambda values: self.__DebounceInputActive(values["input"], values["state"] == 1),
+            "output_link":  lambda values: self.__DebounceOutputLink(values["output"], values["cable"], values["state"] == 1),
+            "stream":       lambda values: self.__SetOutputProperty(values["output"], f"stream-{values['cable']}", values["state"] == 1),
+            "ip_address":   lambda values: self.__set_ipAddress(values["value"]) or True,
+            "ip_mode":      lambda values: self.__set_ipMode(values["value"]) or True,
+            "ip_gateway":   lambda values: self.__set_ipGateway(values["value"]) or True,
+            "subnet_mask":  lambda values: self.__set_subnetMask(values["value"]) or True,
+            "firmware":     lambda values: self.__set_firmware(values["value"]) or True,
+            "initializing": self.__OnInitializing,
+            "initialized":  self.__OnInitialized,
+            "ignore":       lambda values: True,
+        }
+
+    def Fields(self) -> tuple:
+        # Values in FIELDS order, like MatrixInput.Fields and MatrixOutput.Fields
+        return tuple(getattr(self, field) for field in self.FIELDS)
+
+    @property
+    def trace(self) -> TraceBuffer:
+        # Recent protocol activity, see pyOreiMatrixTrace
+        return self.__trace
+
+    @property
+    def version(self) -> int:
+        # Of the latest change to a field in FIELDS of the matrix, an input or an
+        # output, 0 before the first. Numbers start over with every instance.
+        return self.__changes.version
+
+    def ChangesSince(self, version: int) -> list[MatrixDelta] | None:
+        # The changes after version, None once some have aged out of the change
+        # log and the caller has to start again from FullState
+        return self.__changes.Since(version)
+
+    def FullState(self) -> dict:
+        # Every field of the matrix, the inputs and the outputs at the current
+        # version, field names once per kind rather than once per object
+        return {
+            "version": self.__changes.version,
+            self.KIND: dict(zip(self.FIELDS, self.Fields())),
+            MatrixInput.KIND: {"fields": MatrixInput.FIELDS, "values": [input.Fields() for input in self.__inputs or []]},
+            MatrixOutput.KIND: {"fields": MatrixOutput.FIELDS, "values": [output.Fields() for output in self.__outputs or []]},
+        }
+
+    @property
+    def history(self) -> RoutingHistory:
+        # Route, link, signal and power transitions, see pyOreiMatrixHistory
+        return self.__history
+
+    @property
+    def manager(self) -> OreiMatrixManager:
+        return self.__manager
 
     @property
     def model(self) -> str:
@@ -238,9 +445,13 @@ class OreiMatrixAPI:
 
     def __set_model(self, newVal: str) -> None:
         if not self.__model == newVal:
-            _LOGGER.info(f"model changing from {self.__model!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "model", self.__model, newVal)
             self.__model = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "model")
+
+    @property
+    def profile(self) -> ModelProfile:
+        return self.__profile
 
     @property
     def macAddress(self) -> str:
@@ -248,9 +459,9 @@ class OreiMatrixAPI:
 
     def __set_macAddress(self, newVal: str) -> None:
         if not self.__macAddress == newVal:
-            _LOGGER.info(f"macAddress changing from {self.__macAddress!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "macAddress", self.__macAddress, newVal)
             self.__macAddress = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "macAddress")
 
     @property
     def host(self) -> str:
@@ -258,9 +469,13 @@ class OreiMatrixAPI:
 
     def __set_host(self, newVal: str) -> None:
         if not self.__host == newVal:
-            _LOGGER.info(f"host changing from {self.__host!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "host", self.__host, newVal)
             self.__host = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "host")
+
+    @property
+    def httpPort(self) -> int:
+        return self.__httpPort
 
     @property
     def tcpPort(self) -> int:
@@ -268,9 +483,9 @@ class OreiMatrixAPI:
 
     def __set_tcpPort(self, newVal: int) -> None:
         if not self.__tcpPort == newVal:
-            _LOGGER.info(f"tcpPort changing from {self.__tcpPort!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "tcpPort", self.__tcpPort, newVal)
             self.__tcpPort = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "tcpPort")
 
     @property
     def power(self) -> bool:
@@ -278,9 +493,14 @@ class OreiMatrixAPI:
 
     def __set_power(self, newVal: bool) -> None:
         if not self.__power == newVal:
-            _LOGGER.info(f"Power changing from {self.__power} to {newVal}.")
+            self.__trace.Record(TRACE_STATE, "power", self.__power, newVal)
             self.__power = newVal
-            self.__NotifySubscribers(self)
+            if not newVal:
+                self.__predictedPowerOff = False
+                if self.__predictor is not None:
+                    self.__predictor.OnPowerOff()
+            self.__NotifySubscribers(self, "power")
+            self.__TcpScheduleService()
 
     @property
     def beep(self) -> bool:
@@ -288,9 +508,9 @@ class OreiMatrixAPI:
 
     def __set_beep(self, newVal: bool) -> None:
         if not self.__beep == newVal:
-            _LOGGER.info(f"Beep changing from {self.__beep!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "beep", self.__beep, newVal)
             self.__beep = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "beep")
 
     @property
     def panel_lock(self) -> bool:
@@ -298,9 +518,9 @@ class OreiMatrixAPI:
 
     def __set_panel_lock(self, newVal: bool) -> None:
         if not self.__panel_lock == newVal:
-            _LOGGER.info(f"Lock changing from {self.__panel_lock!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "panel_lock", self.__panel_lock, newVal)
             self.__panel_lock = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "panel_lock")
 
     @property
     def ipMode(self) -> str:
@@ -308,9 +528,9 @@ class OreiMatrixAPI:
 
     def __set_ipMode(self, newVal: str) -> None:
         if not self.__ipMode == newVal:
-            _LOGGER.info(f"ipMode changing from {self.__ipMode!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "ipMode", self.__ipMode, newVal)
             self.__ipMode = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "ipMode")
 
     @property
     def ipAddress(self) -> str:
@@ -318,9 +538,9 @@ class OreiMatrixAPI:
 
     def __set_ipAddress(self, newVal: str) -> None:
         if not self.__ipAddress == newVal:
-            _LOGGER.info(f"ipAddress changing from {self.__ipAddress!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "ipAddress", self.__ipAddress, newVal)
             self.__ipAddress = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "ipAddress")
 
     @property
     def subnetMask(self) -> str:
@@ -328,9 +548,9 @@ class OreiMatrixAPI:
 
     def __set_subnetMask(self, newVal: str) -> None:
         if not self.__subnetMask == newVal:
-            _LOGGER.info(f"subnetMask changing from {self.__subnetMask!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "subnetMask", self.__subnetMask, newVal)
             self.__subnetMask = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "subnetMask")
 
     @property
     def ipGateway(self) -> str:
@@ -338,9 +558,9 @@ class OreiMatrixAPI:
 
     def __set_ipGateway(self, newVal: str) -> None:
         if not self.__ipGateway == newVal:
-            _LOGGER.info(f"ipGateway changing from {self.__ipGateway!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "ipGateway", self.__ipGateway, newVal)
             self.__ipGateway = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "ipGateway")
 
     @property
     def firmware(self) -> str:
@@ -348,86 +568,410 @@ class OreiMatrixAPI:
 
     def __set_firmware(self, newVal: str) -> None:
         if not self.__firmware == newVal:
-            _LOGGER.info(f"firmware changing from {self.__firmware!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "firmware", self.__firmware, newVal)
             self.__firmware = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "firmware")
 
     @property
     def IsConnected(self) -> TcpConnectedState:
         return self.__tcpConnectState == TcpConnectedState.Connected
 
+    @property
+    def IsValidated(self) -> bool:
+        # The matrix has answered Validate at least once, unlike one that was
+        # only preloaded from an earlier Describe
+        return self.__validated
+
     @property
     def tcpConnectState(self) -> TcpConnectedState:
         return self.__tcpConnectState
 
     def __set_tcpConnectState(self, newVal: TcpConnectedState) -> None:
         if not self.__tcpConnectState == newVal:
-            _LOGGER.info(f"connected changing from {self.__tcpConnectState!r} to {newVal!r}.")
+            self.__trace.Record(TRACE_STATE, "tcpConnectState", self.__tcpConnectState, newVal)
             self.__tcpConnectState = newVal
-            self.__NotifySubscribers(self)
+            self.__NotifySubscribers(self, "tcpConnectState")
 
     def __set_tcpSendHoldbackTime(self, newVal: float, reason: str) -> None:
         if newVal==0:
             if not self.__tcpSendHoldbackTime == 0:
-                _LOGGER.debug(f"sendHoldBack changing to {newVal} due to '{reason}'.")
+                self.__trace.Record(TRACE_HOLDBACK, reason, newVal)
                 self.__tcpSendHoldbackTime = newVal
         else:
-            _LOGGER.debug(f"sendHoldBack changing to time.time()+{newVal} due to '{reason}'.")
+            self.__trace.Record(TRACE_HOLDBACK, reason, newVal)
             self.__tcpSendHoldbackTime = time.time() + newVal
+            self.__TcpScheduleService(newVal)
 
     # COMMANDS - BEGIN
     def CmdPowerOn(self) -> None:
         self.__TcpVerifyConnectionState()
+        self.__Demand()
         self.__power_off_requested = False
         self.__power_on_requested = True
+        self.__TcpScheduleService()
 
     def CmdPowerOff(self) -> None:
         self.__TcpVerifyConnectionState()
+        self.__predictedPowerOff = False
         self.__power_on_requested = False
         self.__power_off_requested = True
+        self.__TcpScheduleService()
 
     def CmdPanelLockOn(self) -> None:
-        self.__TcpSendEnqueue(TCP_LOCK_ON_COMMAND)
+        self.__TcpSendEnqueue(self.__profile.Build("lock", on=True), applyPowerPolicy=True)
 
     def CmdPanelLockOff(self) -> None:
-        self.__TcpSendEnqueue(TCP_LOCK_OFF_COMMAND)
+        self.__TcpSendEnqueue(self.__profile.Build("lock", on=False), applyPowerPolicy=True)
 
     def CmdBeepOn(self) -> None:
-        self.__TcpSendEnqueue(TCP_BEEP_ON_COMMAND)
+        self.__TcpSendEnqueue(self.__profile.Build("beep", on=True), applyPowerPolicy=True)
 
     def CmdBeepOff(self) -> None:
-        self.__TcpSendEnqueue(TCP_BEEP_OFF_COMMAND)
+        self.__TcpSendEnqueue(self.__profile.Build("beep", on=False), applyPowerPolicy=True)
+
+    def CmdSend(self, msg: str | MatrixCommand) -> None:
+        self.__TcpSendEnqueue(msg, applyPowerPolicy=True)
 
-    def CmdSend(self, msg: str) -> None:
-        self.__TcpSendEnqueue(msg)
+    async def CmdSendBatch(self, msgs: list[str | MatrixCommand], applyPowerPolicy: bool = True) -> bool:
+        # Queue every command now and wait until the matrix has echoed all of them.
+        # False if any of them was dropped or never confirmed. Queries that
+        # mustn't count as somebody wanting the matrix pass applyPowerPolicy=False.
+        loop = asyncio.get_running_loop()
+        futures = []
+
+        try:
+            for msg in msgs:
+                future = loop.create_future()
+                futures.append(future)
+                self.__TcpSendEnqueue(msg, applyPowerPolicy=applyPowerPolicy, future=future)
+        except (BrokenPipeError, MatrixPoweredOffError, SendQueueFullError):
+            # Nobody waits for the part of the batch that was queued already
+            for future in futures:
+                future.cancel()
+            raise
+
+        results = await asyncio.gather(*futures)
+        return all(results)
+
+    def Snapshot(self) -> MatrixSnapshot:
+        return MatrixSnapshot.Take(self)
+
+    def RestoreCommands(self, snapshot: MatrixSnapshot) -> list[MatrixCommand]:
+        # The fewest commands that take the live state back to the snapshot
+        commands = []
+
+        for id in range(1, min(len(snapshot.routes), self.outputCount)+1):
+            output = self.GetOutput(id)
+            if output.InputId != snapshot.routes[id-1]:
+                commands.append(self.__profile.Build("route", input=snapshot.routes[id-1], output=id))
+            if output.StreamEnabledHDMI != snapshot.streamHDMI[id-1]:
+                commands.append(self.__profile.Build("stream", cable="hdmi", output=id, on=snapshot.streamHDMI[id-1]))
+            if output.StreamEnabledHDBT != snapshot.streamHDBT[id-1]:
+                commands.append(self.__profile.Build("stream", cable="cat", output=id, on=snapshot.streamHDBT[id-1]))
+
+        if self.__beep != snapshot.beep:
+            commands.append(self.__profile.Build("beep", on=snapshot.beep))
+        if self.__panel_lock != snapshot.lock:
+            commands.append(self.__profile.Build("lock", on=snapshot.lock))
+
+        return commands
+
+    async def Restore(self, snapshot: MatrixSnapshot) -> bool:
+        # Send only what differs, as one batch, and report whether the matrix
+        # confirmed all of it. Power is restored around the batch: on first so the
+        # commands can land, off only after they have.
+        commands = self.RestoreCommands(snapshot)
+
+        if snapshot.power and not self.__power:
+            self.CmdPowerOn()
+
+        result = await self.CmdSendBatch(commands) if commands else True
+
+        if not snapshot.power and self.__power:
+            self.CmdPowerOff()
+
+        return result
+    def RouteCommands(self, outputIds: list[int], inputId: int) -> list[MatrixCommand]:
+        # The commands that show one input on many outputs, skipping outputs that
+        # already show it. When that's every output, a single command for output 0
+        # routes them all.
+        commands = [
+            self.__profile.Build("route", input=inputId, output=outputId)
+            for outputId in sorted(set(outputIds))
+            if self.GetOutput(outputId).InputId != inputId
+        ]
+
+        if len(commands) > 1 and set(outputIds) == set(range(1, self.outputCount+1)):
+            commands = [self.__profile.Build("route", input=inputId, output=0)]
+
+        return commands
+
+    async def Route(self, outputIds: list[int], inputId: int) -> bool:
+        # Show one input on many outputs as one batch and report whether the matrix
+        # confirmed every route. The queue pipelines the batch rather than waiting
+        # for each echo before sending the next.
+        if not self.__HasInput(inputId):
+            raise ValueError(f"Input {inputId} is not one of the {self.inputCount} this matrix has.")
+        for outputId in outputIds:
+            if not self.__HasOutput(outputId):
+                raise ValueError(f"Output {outputId} is not one of the {self.outputCount} this matrix has.")
+
+        commands = self.RouteCommands(outputIds, inputId)
+        return await self.CmdSendBatch(commands) if commands else True
+
+    def EdidCommands(self, edids: dict[int, EDID]) -> list[MatrixCommand]:
+        # The commands that give each input its EDID, skipping inputs that already
+        # have it. When every input ends up with the same one, a single command for
+        # input 0 sets them all.
+        commands = [
+            self.__profile.Build("edid", input=inputId, edid=int(edid))
+            for inputId, edid in sorted(edids.items())
+            if self.GetInput(inputId).Edid != edid
+        ]
+
+        wanted = set(edids.values())
+        if len(commands) > 1 and len(wanted) == 1 and set(edids) == set(range(1, self.inputCount+1)):
+            commands = [self.__profile.Build("edid", input=0, edid=int(wanted.pop()))]
+
+        return commands
+
+    async def SetEdids(self, edids: dict[int, EDID]) -> bool:
+        # Set the EDIDs of many inputs as one batch and report whether the matrix
+        # confirmed all of them. The sensors follow the echoes, no refresh needed.
+        for inputId in edids:
+            if not self.__HasInput(inputId):
+                raise ValueError(f"Input {inputId} is not one of the {self.inputCount} this matrix has.")
+
+        commands = self.EdidCommands(edids)
+        return await self.CmdSendBatch(commands) if commands else True
     # COMMANDS - END
 
-    def GetInputNames(self, all:bool=False) -> list[str]:
-        return [input.Name for input in self.__inputs if all or input.IsVisible]
+    def ConfigureSendQueue(self, maxSize: int = None, ttl: float = None,
+                           overflowPolicy: QueueOverflowPolicy = None, powerOffPolicy: PowerOffPolicy = None,
+                           supersede: bool = None) -> None:
+        # supersede: a queued command is replaced by a newer one for the same
+        # state, e.g. the same output's route, even while there's room
+        self.__tcpSendQueue.Configure(maxSize, ttl, overflowPolicy, supersede)
+        if powerOffPolicy is not None:
+            self.__powerOffPolicy = powerOffPolicy
+
+    @property
+    def sendQueueLength(self) -> int:
+        return len(self.__tcpSendQueue)
+
+    @property
+    def sendQueueCounters(self) -> dict:
+        # How many commands were enqueued, sent, confirmed, retried and dropped per reason
+        return self.__tcpSendQueue.counters
+
+    @property
+    def commandFailures(self) -> list[tuple[float, str]]:
+        # The most recent commands the matrix never confirmed, as (time, command)
+        return list(self.__commandFailures)
+
+    @property
+    def echoLatencies(self) -> list[tuple[float, str, float]]:
+        # The most recent confirmed commands as (time, command, seconds from
+        # sending to the matrix's echo)
+        return list(self.__echoLatencies)
+
+    def ConfigureRateLimit(self, rate: float, burst: float) -> None:
+        # Commands per second the sender may send, and how many back to back,
+        # until the next Validate applies the calibrated or profile limit again
+        self.__tcpRateLimit.Configure(rate, burst)
+
+    @property
+    def rateLimit(self) -> tuple[float, float]:
+        return self.__tcpRateLimit.rate, self.__tcpRateLimit.burst
+
+    def __ApplyRateLimit(self) -> None:
+        # Calibrated for this model and firmware if we can, else the profile's guess
+        limit = GetRateLimit(self.__model, self.__firmware)
+        if limit is None:
+            limit = (self.__profile.sendRate, self.__profile.sendBurst)
+        self.__tcpRateLimit.Configure(*limit)
+
+    def ConfigureTransport(self, factory) -> None:
+        # How the command port is reached from the next connection on: factory is
+        # called with the host and the TCP port Validate found and returns a
+        # MatrixTransport, e.g. TcpTransport (the default) or one made by
+        # TransportFactory("telnet") or TransportFactory("serial:/dev/ttyUSB0")
+        self.__transportFactory = factory
+
+    @property
+    def transport(self) -> MatrixTransport:
+        # The current connection's, None while not connected
+        return self.__tcpTransport
+
+    def ConfigurePredictor(self, settings: PredictorSettings | None, localtime=time.localtime) -> PowerPredictor | None:
+        # Power on ahead of the times the matrix is usually wanted, learned from the
+        # demands kept in the routing history. None turns prediction off again.
+        # The owner calls predictor.Check about once a minute.
+        if settings is None:
+            self.__predictor = None
+        else:
+            self.__predictor = PowerPredictor(
+                self.__history, settings,
+                isPowered=lambda: self.__power or self.__power_on_requested,
+                powerOn=self.__PredictedPowerOn,
+                powerOff=self.__PredictedPowerOff,
+                initTime=self.__profile.initHoldback,
+                localtime=localtime,
+            )
+        return self.__predictor
+
+    @property
+    def predictor(self) -> PowerPredictor | None:
+        return self.__predictor
+
+    def __Demand(self) -> None:
+        # A user command, the predictor learns from the first of each session
+        if self.__predictor is not None:
+            self.__predictor.OnDemand()
+        # Somebody wants it after all, a warm matrix stays on
+        if self.__predictedPowerOff:
+            self.__predictedPowerOff = False
+            self.__power_off_requested = False
+
+    def __PredictedPowerOn(self) -> bool:
+        # Like CmdPowerOn, but not a demand. Only while connected, there is
+        # nothing to warm up otherwise.
+        if not self.IsConnected:
+            return False
+        self.__power_off_requested = False
+        self.__power_on_requested = True
+        self.__TcpScheduleService()
+        return True
+
+    def __PredictedPowerOff(self) -> None:
+        if self.IsConnected:
+            self.__predictedPowerOff = True
+            self.__power_on_requested = False
+            self.__power_off_requested = True
+            self.__TcpScheduleService()
+
+    def ConfigureDebounce(self, signal: str, settings: DebounceSettings) -> None:
+        # signal is SIGNAL_INPUT_ACTIVE or SIGNAL_OUTPUT_LINK
+        self.__debouncer.Configure(signal, settings)
+
+    # The name lookups below are read on every entity state write so they are built
+    # once, as immutable tuples shared by every caller, and only rebuilt when an
+    # input's name or visibility changes.
+    def GetInputNames(self, all:bool=False) -> tuple[str, ...]:
+        return self.__inputNamesAll if all else self.__inputNames
+
+    @property
+    def InputNames(self) -> tuple[str, ...]:
+        return self.__inputNames
+
+    def GetInputName(self, inputId: int) -> str | None:
+        # None for an id the matrix reported that has no input, e.g. port 0
+        if inputId is None or not 0 < inputId <= len(self.__inputNamesAll):
+            return None
+        return self.__inputNamesAll[inputId-1]
+
+    def GetInputIdByName(self, name: str) -> int | None:
+        return self.__inputIdsByName.get(name)
+
+    def __RebuildInputNameCache(self) -> None:
+        inputs = self.__inputs or []
+        self.__inputNamesAll = tuple(input.Name for input in inputs)
+        self.__inputNames = tuple(input.Name for input in inputs if input.IsVisible)
+
+        # First one wins if two inputs share a name
+        idsByName = {}
+        for input in inputs:
+            idsByName.setdefault(input.Name, input.Id)
+        self.__inputIdsByName = idsByName
+
+    @property
+    def inputCount(self) -> int:
+        return len(self.__inputs) if self.__inputs is not None else 0
+
+    @property
+    def outputCount(self) -> int:
+        return len(self.__outputs) if self.__outputs is not None else 0
 
     def GetInput(self, inputId: int) -> MatrixInput:
         return self.__inputs[inputId-1]
 
-    def __SetInputProperty(self, inputId: int, name: str, val) -> bool:
+    def GetOutput(self, outputId: int) -> MatrixOutput:
+        return self.__outputs[outputId-1]
+
+    def __HasInput(self, inputId: int) -> bool:
+        # Lines can arrive before the model has been built, or name a port we don't have
+        return self.__inputs is not None and 0 < inputId <= len(self.__inputs)
+
+    def __HasOutput(self, outputId: int) -> bool:
+        return self.__outputs is not None and 0 < outputId <= len(self.__outputs)
+
+    def __SetInputProperty(self, inputId: int, name: str, val, also: dict = None) -> bool:
+        # also: further properties set as part of the same change, so they are
+        # compared and notified together with name
+        if not self.__HasInput(inputId):
+            return False
+
         input: MatrixInput = self.__inputs[inputId-1]
+        before = input.Fields()
 
+        for other, otherVal in (also or {}).items():
+            input.SetProperty(other, otherVal)
         if input.SetProperty(name, val):
-            self.__NotifySubscribers(input)
+            changed = ChangedFields(MatrixInput.FIELDS, before, input.Fields())
+            if "name" in changed or "visible" in changed:
+                self.__RebuildInputNameCache()
+            if changed:
+                self.__NotifySubscribers(input, *changed)
             return True
 
         _LOGGER.warning(f"Did not Set Input[{inputId}] {name}={val}")
         return False
 
-    def __SetOutputProperty(self, outputId: int, name: str, val) -> bool:
+    def __SetOutputProperty(self, outputId: int, name: str, val, also: dict = None) -> bool:
+        # also: as for __SetInputProperty
+        if not self.__HasOutput(outputId):
+            return False
+
         output: MatrixOutput = self.__outputs[outputId-1]
+        before = output.Fields()
 
+        for other, otherVal in (also or {}).items():
+            output.SetProperty(other, otherVal)
         if output.SetProperty(name, val):
-            self.__NotifySubscribers(output)
+            changed = ChangedFields(MatrixOutput.FIELDS, before, output.Fields())
+            if changed:
+                self.__NotifySubscribers(output, *changed)
             return True
 
         _LOGGER.warning(f"Did not Set Output[{outputId}] {name}={val}")
         return False
 
+    def __DebounceInputActive(self, inputId: int, active: bool) -> bool:
+        if not self.__HasInput(inputId):
+            return False
+
+        def apply(val: bool, flaps: int) -> None:
+            self.__SetInputProperty(inputId, "active", val, also={"signalFlaps": flaps})
+
+        # Looked up when asked, a refresh may have replaced the input since
+        self.__debouncer.Submit(SIGNAL_INPUT_ACTIVE, inputId, active, lambda: self.__inputs[inputId-1].IsActive, apply)
+        return True
+
+    def __DebounceOutputLink(self, outputId: int, cable: str, connected: bool) -> bool:
+        if not self.__HasOutput(outputId):
+            return False
+
+        def current() -> bool:
+            # Looked up when asked, a refresh may have replaced the output since
+            output: MatrixOutput = self.__outputs[outputId-1]
+            return output.HasLinkHDMI if cable == "hdmi" else output.HasLinkHDBT
+
+        def apply(val: bool, flaps: int) -> None:
+            self.__SetOutputProperty(outputId, f"link-{cable}", val, also={"linkFlaps": flaps})
+
+        self.__debouncer.Submit(SIGNAL_OUTPUT_LINK, (outputId, cable), connected, current, apply)
+        return True
+
     async def Validate(self) -> bool:
         data = await self.__web_cmd(REQ_GET_STATUS)
         if data is None:
@@ -459,10 +1003,14 @@ class OreiMatrixAPI:
         if "model" in data:
             self.__set_model(data["model"])
 
-        if self.__model not in SUPPORTED_MODELS:
+        profile = GetProfile(self.__model)
+        if profile is None:
             _LOGGER.error(f"Unsupported matrix model='{self.model}'.")
             return False
 
+        self.__profile = profile
+        self.__ApplyRateLimit()
+        self.__validated = True
         return True
 
     async def RefreshInputs(self) -> None:
@@ -484,15 +1032,17 @@ class OreiMatrixAPI:
             hasDefaultName =  name == f"Input{idx+1}"
             active = data["inactive"][idx]==1
             visible = (allDefaultNames or not hasDefaultName)
-            edid = EDID(data["edid"][idx])
+            edid = self.__profile.edid(data["edid"][idx])
 
             rVal.append(MatrixInput(self, idx+1, name, active, visible, edid ))
             idx+=1
 
+        previous = self.__inputs
         self.__inputs = rVal
+        self.__RebuildInputNameCache()
 
         for input in self.__inputs:
-            self.__NotifySubscribers(input)
+            self.__NotifySubscribers(input, *self.__RefreshedFields(previous, input))
 
     async def RefreshOutputs(self) -> None:
         data = await self.__web_cmd(REQ_GET_OUTPUTS)
@@ -534,12 +1084,26 @@ class OreiMatrixAPI:
             rVal.append(MatrixOutput(self, idx+1, name, inputId, visible, activeHDMI, activeHDBT, enabledHDMI, enabledHDBT ))
             idx+=1
 
+        previous = self.__outputs
         self.__outputs = rVal
 
         for output in self.__outputs:
-            self.__NotifySubscribers(output)
+            self.__NotifySubscribers(output, *self.__RefreshedFields(previous, output))
 
 
+    def __RefreshedFields(self, previous: list, obj) -> tuple:
+        # Fields that differ from the object this refresh replaced, flap counts carry over
+        if previous is None or obj.Id > len(previous):
+            return obj.FIELDS
+
+        old = previous[obj.Id-1]
+        if isinstance(obj, MatrixInput):
+            obj.SetProperty("signalFlaps", old.SignalFlaps)
+        else:
+            obj.SetProperty("linkFlaps", old.LinkFlaps)
+
+        return ChangedFields(obj.FIELDS, old.Fields(), obj.Fields())
+
     async def RefreshConfig(self) -> None:
         data = await self.__web_cmd(REQ_GET_SYSTEM)
 
@@ -553,9 +1117,101 @@ class OreiMatrixAPI:
             self.__set_beep( data["beep"]==1)
 
 
+    @property
+    def refreshMode(self) -> RefreshMode:
+        return self.__refreshMode
+
+    def SetRefreshMode(self, mode: RefreshMode) -> None:
+        self.__refreshMode = mode
+
     async def RefreshAll(self) -> None:
+        # Once we're connected the TCP session already carries everything but the
+        # names, so only fall back to the (slow) web server when we have to.
+        if self.__refreshMode == RefreshMode.Tcp and self.IsConnected and self.__inputs is not None:
+            if await self.RefreshTcp():
+                return
+            _LOGGER.warning("TCP refresh incomplete, falling back to HTTP.")
+
+        await self.RefreshHttp()
+
+    async def RefreshHttp(self) -> None:
+        # Everything the web server knows, names and visibility included
         await asyncio.gather(self.RefreshInputs(), self.RefreshOutputs(), self.RefreshConfig())
 
+    async def RefreshTcp(self) -> bool:
+        # Rebuild routes, links, streams, EDIDs, lock, beep and network info from TCP
+        # queries over the already open socket. Names and visibility only come from
+        # HTTP so a model that was never refreshed over HTTP gets default names.
+        if not self.IsConnected:
+            return False
+
+        self.__EnsureModel()
+
+        # Only asks, so an off matrix answers as it is rather than being powered
+        # on or refused by the power off policy
+        return await self.CmdSendBatch([
+            self.__profile.Build("status"),
+            self.__profile.Build("read_streams", cable="cat"),
+            self.__profile.Build("read_streams", cable="hdmi"),
+            self.__profile.Build("read_edids"),
+        ], applyPowerPolicy=False)
+
+    def __EnsureModel(self) -> None:
+        if self.__inputs is None:
+            self.__inputs = [MatrixInput(self, id, f"Input{id}", False, True, None) for id in range(1, self.__profile.inputCount+1)]
+            self.__RebuildInputNameCache()
+            for input in self.__inputs:
+                self.__NotifySubscribers(input, *MatrixInput.FIELDS)
+
+        if self.__outputs is None:
+            self.__outputs = [MatrixOutput(self, id, f"hdmioutput{id}", 1, True, False, False, True, True) for id in range(1, self.__profile.outputCount+1)]
+            for output in self.__outputs:
+                self.__NotifySubscribers(output, *MatrixOutput.FIELDS)
+
+    def Describe(self) -> dict:
+        # What Preload needs to stand the matrix up again without asking it,
+        # kept by the caller from one start to the next
+        return {
+            "model": self.__model,
+            "firmware": self.__firmware,
+            "macAddress": self.__macAddress,
+            "tcpPort": self.__tcpPort,
+            "inputs": [[input.Name, input.IsVisible] for input in self.__inputs or []],
+            "outputs": [[output.Name, output.IsVisible, output.InputId] for output in self.__outputs or []],
+        }
+
+    def Preload(self, description: dict) -> bool:
+        # Model, ports and names from an earlier Describe, so subscribers can be
+        # set up before the matrix has answered. Signals, links and routes are
+        # only what they last were until TCP connects, which is what it does
+        # once there's a subscriber. Validate and RefreshHttp still have to run
+        # to pick up anything that changed since. False if the description
+        # doesn't fit a supported model, nothing is changed then.
+        profile = GetProfile(description.get("model"))
+        inputs = description.get("inputs", [])
+        outputs = description.get("outputs", [])
+        if profile is None or len(inputs) != profile.inputCount or len(outputs) != profile.outputCount:
+            return False
+
+        self.__profile = profile
+        self.__set_model(description["model"])
+        self.__set_firmware(description.get("firmware") or "")
+        self.__set_macAddress(description.get("macAddress"))
+        self.__set_tcpPort(description.get("tcpPort", self.__tcpPort))
+        self.__ApplyRateLimit()
+
+        self.__inputs = [MatrixInput(self, id, name, False, visible, None)
+                         for id, (name, visible) in enumerate(inputs, 1)]
+        self.__RebuildInputNameCache()
+        self.__outputs = [MatrixOutput(self, id, name, inputId, visible, False, False, True, True)
+                          for id, (name, visible, inputId) in enumerate(outputs, 1)]
+
+        for input in self.__inputs:
+            self.__NotifySubscribers(input, *MatrixInput.FIELDS)
+        for output in self.__outputs:
+            self.__NotifySubscribers(output, *MatrixOutput.FIELDS)
+        return True
+
     @property
     async def Inputs(self) -> list[MatrixInput]:
         if self.__inputs is None:
@@ -570,44 +1226,144 @@ class OreiMatrixAPI:
 
         return self.__outputs
 
-    def SubscribeToChanges(self, callback) -> None:
-        self.__callbacks.append(callback)
+    # since, a version the caller saw before, also delivers every object that
+    # changed after it, or every object if those changes have aged out
+    def SubscribeToChanges(self, callback, since: int = None) -> None:
+        subscriber = Subscriber(callback)
+        self.__callbacks.append(subscriber)
+        self.__SubscriberAdded()
 
-        if len(self.__callbacks) == 1:
-            self.__set_tcpConnectState(TcpConnectedState.ConnectRequested)
-            asyncio.create_task( self.__Connect_tcp() )
+        if since is not None:
+            for changed_object in self.__ObjectsChangedSince(since):
+                subscriber.Deliver(changed_object)
 
     def UnsubscribeFromChanges(self, callback) -> None:
-        self.__callbacks.remove(callback)
+        RemoveSubscriber(self.__callbacks, callback)
+        self.__SubscriberRemoved()
+
+    # Only called when the given field of one input, output or the matrix itself
+    # changes, e.g. SubscribeToField("output", 3, "link", cb) -> cb(output, "link")
+    def SubscribeToField(self, kind: str, id: int, field: str, callback) -> None:
+        self.__fieldCallbacks.setdefault((kind, id, field), []).append(Subscriber(callback))
+        self.__SubscriberAdded()
+
+    def UnsubscribeFromField(self, kind: str, id: int, field: str, callback) -> None:
+        callbacks = self.__fieldCallbacks[(kind, id, field)]
+        RemoveSubscriber(callbacks, callback)
+        if not callbacks:
+            del self.__fieldCallbacks[(kind, id, field)]
+        self.__SubscriberRemoved()
+
+    # The changes themselves rather than the objects they were made to, as lists
+    # of MatrixDelta in version order, e.g. SubscribeToDeltas(cb, since=12) ->
+    # cb([MatrixDelta(version=13 ...), ...]). A burst is one call however long,
+    # without since only changes from now on. cb(None) when more has been missed
+    # than the change log holds, FullState has to be read again then.
+    def SubscribeToDeltas(self, callback, since: int = None) -> None:
+        if asyncio.iscoroutinefunction(callback):
+            raise TypeError(f"{callback!r} must not be a coroutine function")
+
+        cursor = DeltaCursor(self.__changes, callback, self.__changes.version if since is None else since)
+        subscriber = Subscriber(cursor)
+        self.__deltaCallbacks.append(subscriber)
+        self.__SubscriberAdded()
+
+        if since is not None and since != self.__changes.version:
+            subscriber.Deliver()
+
+    def UnsubscribeFromDeltas(self, callback) -> None:
+        for subscriber in self.__deltaCallbacks:
+            if subscriber.callback.callback == callback:
+                RemoveSubscriber(self.__deltaCallbacks, subscriber.callback)
+                break
+        else:
+            raise ValueError(f"{callback!r} is not subscribed")
+        self.__SubscriberRemoved()
+
+    # Raw lines as received from the matrix, e.g. for fanning out to proxy clients
+    def SubscribeToLines(self, callback) -> None:
+        self.__lineCallbacks.append(Subscriber(callback, coalesce=False))
+        self.__SubscriberAdded()
+
+    def UnsubscribeFromLines(self, callback) -> None:
+        RemoveSubscriber(self.__lineCallbacks, callback)
+        self.__SubscriberRemoved()
+
+    def __AllSubscribers(self) -> list[Subscriber]:
+        subscribers = self.__callbacks + self.__lineCallbacks + self.__deltaCallbacks
+        for callbacks in self.__fieldCallbacks.values():
+            subscribers += callbacks
+        return subscribers
+
+    @property
+    def subscriberStats(self) -> list[dict]:
+        # Delivered, coalesced, dropped, failed and slow notifications per subscriber
+        return [subscriber.Stats() for subscriber in self.__AllSubscribers()]
+
+    def __SubscriberCount(self) -> int:
+        return len(self.__callbacks) + len(self.__lineCallbacks) + len(self.__deltaCallbacks) + \
+               sum(len(callbacks) for callbacks in self.__fieldCallbacks.values())
+
+    def __SubscriberAdded(self) -> None:
+        if self.__SubscriberCount() == 1:
+            self.__set_tcpConnectState(TcpConnectedState.ConnectRequested)
+            self.__tcpConnectTask = asyncio.create_task( self.__Connect_tcp() )
 
-        if len(self.__callbacks) == 0:
+    def __SubscriberRemoved(self) -> None:
+        if self.__SubscriberCount() == 0:
             asyncio.create_task( self.__Disconnect_tcp() )
 
     async def Shutdown(self) ->None:
+        for subscriber in self.__AllSubscribers():
+            subscriber.Close()
         self.__callbacks.clear()
+        self.__lineCallbacks.clear()
+        self.__fieldCallbacks.clear()
+        self.__deltaCallbacks.clear()
         await self.__Disconnect_tcp()
+        if self.__tcpExpiryTimer is not None:
+            self.__tcpExpiryTimer.Cancel()
+            self.__tcpExpiryTimer = None
+
+        # A connect still under way, or waiting to retry, would otherwise carry on
+        # after we've gone
+        task, self.__tcpConnectTask = self.__tcpConnectTask, None
+        if task is not None and not task.done():
+            task.cancel()
+            await asyncio.gather(task, return_exceptions=True)
+            self.__set_tcpConnectState(TcpConnectedState.Disconnected)
+
+        if self.__ownsManager:
+            await self.__manager.Shutdown()
 
     async def __Connect_tcp(self) -> None:
 
         if self.__tcpConnectState in [TcpConnectedState.Connected, TcpConnectedState.Connecting]:
             return
 
-        retry_delay = 5
         self.__tcpDisconnect = False
 
         while not self.__tcpDisconnect:
             try:
                 self.__set_tcpConnectState( TcpConnectedState.Connecting )
                 _LOGGER.debug(f"TCP:Connecting to {self.__host}:{self.__tcpPort}")
-                reader, writer = await asyncio.open_connection(self.__host, self.__tcpPort)
-            except (ConnectionRefusedError, OSError) as e:
-                _LOGGER.info(f"TCP:Connection failed: {e}. Retrying in {retry_delay} seconds...")
+                transport = self.__transportFactory(self.__host, self.__tcpPort)
+                await transport.Open(self.__profile.lineDelimiter, self.__TcpReceive)
+            except (ConnectionRefusedError, OSError, ValueError) as e:
+                # Staggered by the manager so many matrices don't retry in lock step.
+                # ValueError is a transport that can't work as configured, e.g. a
+                # baud rate the port doesn't have, and is retried in case
+                # ConfigureTransport puts it right.
+                retry_delay = self.__manager.NextReconnectDelay()
+                log = _LOGGER.error if isinstance(e, ValueError) else _LOGGER.info
+                log(f"TCP:Connection failed: {e}. Retrying in {retry_delay:.1f} seconds...")
                 await asyncio.sleep(retry_delay)
             else:
-                await self.__Handle_tcp_connection(reader, writer)
+                await self.__Handle_tcp_connection(transport)
 
                 if not self.__tcpDisconnect:
-                    _LOGGER.info(f"TCP:Connection broken: Retrying in {retry_delay} seconds...")
+                    retry_delay = self.__manager.NextReconnectDelay()
+                    _LOGGER.info(f"TCP:Connection broken: Retrying in {retry_delay:.1f} seconds...")
                     await asyncio.sleep(retry_delay)
 
 
@@ -616,286 +1372,414 @@ class OreiMatrixAPI:
             _LOGGER.error("You MUST SubscribeToChanges() prior to issuing commands.")
             raise BrokenPipeError()
 
-    def __TcpSendEnqueue(self, m: str, verifyConnection: bool = True) -> None:
+    def __TcpSendEnqueue(self, m: str | MatrixCommand, verifyConnection: bool = True, applyPowerPolicy: bool = False,
+                         future: asyncio.Future = None) -> None:
         if verifyConnection:
-            self.__TcpVerifyConnectionState()
-
-        self.__tcpSendQueue.put(m)
-
-    async def __TcpSendDirect(self, writer, m: str, drain: bool = True) -> None:
-        data = f"{m}{TCP_COMMAND_DELIMITER}"
-        _LOGGER.debug(f"TCP:-->{data!r}")
-        writer.write( data.encode() )
-
-        if drain:
-            await writer.drain()
+            try:
+                self.__TcpVerifyConnectionState()
+            except BrokenPipeError:
+                if future is not None:
+                    future.set_result(False)
+                raise
+
+        if isinstance(m, str):
+            m = self.__profile.ParseCommand(m)
+
+        if applyPowerPolicy and not m.isRead:
+            self.__Demand()
+
+        # The queue is only serviced while powered on, decide what to do with
+        # commands issued while the unit is off rather than letting them pile up.
+        # Reads are answered while off, so they neither fail nor power it on.
+        wait = None
+        if applyPowerPolicy and not m.isRead and not self.__power:
+            if self.__powerOffPolicy == PowerOffPolicy.FailFast:
+                self.__tcpSendQueue.Count(DROP_POWERED_OFF)
+                if future is not None:
+                    future.set_result(False)
+                raise MatrixPoweredOffError(f"Matrix is off, not sending {m.text!r}")
+            elif self.__powerOffPolicy == PowerOffPolicy.AutoPowerOn and not self.__power_on_requested:
+                self.CmdPowerOn()
+            # Its time to live starts once the matrix is up, powering on and
+            # initialising would otherwise use most of it
+            wait = self.__profile.initHoldback + self.__profile.powerOnHoldback
+
+        self.__tcpSendQueue.Put(m, future=future, wait=wait)
+        self.__TcpScheduleService()
+        self.__TcpScheduleExpiry()
+
+    def __TcpSendDirect(self, transport: MatrixTransport, m: str) -> None:
+        self.__trace.Record(TRACE_TX, m)
+        transport.Write( (m + self.__profile.commandDelimiter).encode() )
+
+
+    def __TcpReceive(self, line: str) -> None:
+        # Called by the transport for every complete line, see LineFramer
+        self.__tcpHeartbeat = 0
+        self.__tcpLastReceived = time.time()
+
+        for subscriber in self.__lineCallbacks:
+            subscriber.Deliver(line)
+        self.__TcpProcessMessage(line)
+
+    def __TcpConfirm(self, event: str, values: dict) -> None:
+        # Responses arrive in order so the oldest matching command is the one confirmed
+        for index, command in enumerate(self.__tcpInFlight):
+            if command.confirm.Matches(event, values):
+                del self.__tcpInFlight[index]
+                now = time.time()
+                self.__echoLatencies.append((now, command.text, now - command.sent))
+                self.__tcpSendQueue.Count("confirmed")
+                command.Resolve(True)
+                # Room in flight again
+                self.__TcpScheduleService()
+                return
+
+    def __TcpTrackInFlight(self, command: PendingCommand) -> None:
+        if command.confirm is None:
+            command.Resolve(True)
+            return
 
+        command.attempts += 1
+        command.sent = time.time()
+        command.deadline = command.sent + self.__profile.confirmTimeout
+        self.__tcpInFlight.append(command)
 
-    def __TcpReceive(self, m: str)-> None:
-        delim = '\r\n'
-        delimLen = len(delim)
+        if self.__tcpConfirmTimer is None:
+            self.__tcpConfirmTimer = self.__manager.wheel.CallLater(self.__profile.confirmTimeout, self.__TcpConfirmCheck)
 
-        if len(self.__tcpRecvBuffer)>0:
-            m = self.__tcpRecvBuffer + m
-            self.__tcpRecvBuffer = ""
+    def __TcpConfirmCheck(self) -> None:
+        self.__tcpConfirmTimer = None
+        now = time.time()
 
-        index = m.rfind(delim)
+        expired = [command for command in self.__tcpInFlight if command.deadline <= now]
+        self.__tcpInFlight = [command for command in self.__tcpInFlight if command.deadline > now]
 
-        if index < len(m)-delimLen:
-            self.__tcpRecvBuffer = m[index+delimLen:]
-            m = m[:index]
+        # Retries go back to the head of the queue, in their original order
+        for command in reversed(expired):
+            if command.attempts <= TCP_CONFIRM_MAX_RETRIES:
+                self.__trace.Record(TRACE_QUEUE, "retry", command.text, command.attempts)
+                self.__tcpSendQueue.Count("retried")
+                self.__tcpSendQueue.PushFront(command)
+            else:
+                self.__trace.Record(TRACE_QUEUE, "failed", command.text, command.attempts)
+                _LOGGER.error(f"TCP:Matrix never confirmed {command.text!r} after {command.attempts} attempts")
+                self.__tcpSendQueue.Count(DROP_NOT_CONFIRMED)
+                self.__commandFailures.append((now, command.text))
+                command.Resolve(False)
 
-        lines = m.split(delim)
+        if expired:
+            self.__TcpScheduleService()
+            self.__TcpScheduleExpiry()
 
-        for line in lines:
-            if len(line) > 0:
-                self.__TcpProcessMessage(line)
+        if self.__tcpInFlight:
+            nextDeadline = min(command.deadline for command in self.__tcpInFlight)
+            self.__tcpConfirmTimer = self.__manager.wheel.CallLater(nextDeadline - now, self.__TcpConfirmCheck)
 
     def __TcpProcessMessage(self, line:str) ->None:
-        didSetProperty = False
-        ignored = False
-
-        splits = line.split()
-
-        # Get the Weirdo out of the way
-        # input 1 edid: 4K2K60_444,HD Audio 7.1 HDR
-        if len(splits) >= 4 and splits[0] == "input" and splits[2] == "edid:":
-            inputId = int(splits[1])
-            didSetProperty = self.__SetInputProperty( inputId, "edidString", line[14:])
-
-        elif len(splits) == 1:
-            # IP:192.168.20.19
-            if splits[0].startswith("IP:"):
-                didSetProperty = True
-                self.__set_ipAddress( splits[0][3:])
-            # Gateway:192.168.20.1
-            elif splits[0].startswith("Gateway:"):
-                didSetProperty = True
-                self.__set_ipGateway(splits[0][8:])
-            elif line == "E00":
-                ignored = True
-
-        elif len(splits) == 2:
-            # power on
-            if splits[0].lower() == "power" and splits[1] == "on":
-                if not self.__power:
-                    self.__set_tcpSendHoldbackTime(5, line)
-                    self.__set_power(True)
-
-                didSetProperty = True
-            # power off
-            elif splits[0].lower() == "power" and splits[1] == "off":
-                didSetProperty = True
-                self.__set_power(False)
-            # beep off
-            elif splits[0] == "beep":
-                didSetProperty = True
-                self.__set_beep( splits[1]=="on" )
-            # Panel Lock
-            elif splits[0] == "Panel":
-                didSetProperty = True
-                self.__set_panel_lock(splits[1]=="Lock")
-            # Subnet Mask:255.255.255.0
-            elif splits[0] == "Subnet":
-                didSetProperty = True
-                self.__set_subnetMask(splits[1][5:])
-            # Safe to ignore
-            #   TCP/IP port=8000
-            #   Telnet port=23
-            elif splits[0] in ['TCP/IP', 'Telnet'] and splits[1].startswith('port'):
-                ignored = True
-            # Safe to ignore
-            #   Mac address:6C:DF:FB:04:79:9E
-            elif line.startswith('Mac address'):
-                ignored = True
-            # System Initializing...
-            elif line == "System Initializing...":
-                self.__set_tcpSendHoldbackTime(20, line)
-                didSetProperty = True
-            # Initialization Finished!
-            elif line == "Initialization Finished!":
-                self.__set_tcpSendHoldbackTime(5, line)
-                self.__set_power( True )
-                didSetProperty = True
-
-        elif len(splits) == 3:
-            # IP Mode: DHCP
-            if splits[0] == "IP" and splits[1] == "Mode:":
-                didSetProperty = True
-                self.__set_ipMode(splits[2])
-            # FW version 1.08.16
-            elif line.startswith("FW version"):
-                didSetProperty = True
-                self.__set_firmware(line[11:])
-
-        elif len(splits) == 4:
-            # panel button lock on
-            if line.startswith("panel button lock "):
-                didSetProperty = True
-                self.__set_panel_lock( splits[3]=="on")
-            # hdmi input 1: connect
-            elif splits[0] == "hdmi" and splits[1] == "input" and \
-               splits[3] in ['connect', 'disconnect']:
-                inputId = int(splits[2][0:1])
-                didSetProperty = self.__SetInputProperty( inputId, "active", splits[3]=="connect")
-            # hdmi output 1: disconnect
-            # cat  output 1: disconnect
-            elif splits[0] in ["hdmi", "cat"] and splits[1] == "output" and \
-                 splits[3] in ['connect', 'disconnect']:
-                outputId = int(splits[2][0:1])
-                didSetProperty = self.__SetOutputProperty( outputId, f"link-{splits[0]}", splits[3]=="connect")
-
-        elif len(splits) == 5:
-            # input 4 -> output 1
-            if splits[0] == "input" and splits[2] == "->" and splits[3] == "output":
-                inputId = int(splits[1])
-                outputId = int(splits[4])
-                didSetProperty = self.__SetOutputProperty( outputId, "inputId", inputId)
-            # Get the unit all status:
-            elif line == "Get the unit all status:":
-                ignored = True
-            # Enable cat output 2 stream
-            # Disable cat output 2 stream
-            # Disable cat output 2 stream
-            elif splits[0].lower() in ['enable', 'disable'] and \
-                 splits[1].lower() in ['hdmi', 'cat'] and \
-                 splits[2] == 'output' and \
-                 splits[4] == 'stream':
-                outputId = int(splits[3])
-                didSetProperty = self.__SetOutputProperty( outputId, f"stream-{splits[1]}", splits[0].lower()=="enable")
-
-        # Output Stuff
-        if not ignored and not didSetProperty:
-            _LOGGER.info(f"TCP:<--{line!r}")
-
-    async def __Handle_tcp_connection(self, reader, writer):
-        self.__tcpRecvBuffer = ""
-
-        lastReceived = time.time()
-        heartbeat = 0
-
-        await self.__TcpSendDirect(writer, TCP_GETSTATUS_COMMAND )
-        self.__TcpSendEnqueue( TCP_GET_CAT_STREAM_COMMAND )
-        self.__TcpSendEnqueue( TCP_GET_HDMI_STREAM_COMMAND )
-
-        addr = writer.get_extra_info('peername')
-        _LOGGER.info(f"TCP:Connected to {addr!r}")
-        self.__set_tcpConnectState(TcpConnectedState.Connected)
+        event, values = self.__profile.ParseResponse(line)
 
-        self.__set_tcpSendHoldbackTime(2, "Newly connected" )
+        if event is not None and self.__tcpInFlight:
+            self.__TcpConfirm(event, values)
 
-        try:
-            foundData = False
+        handler = self.__responseHandlers.get(event)
+        if handler is None or not handler(values):
+            self.__trace.Record(TRACE_RX, "unhandled", line)
+        else:
+            self.__trace.Record(TRACE_RX, event, line)
 
-            while not self.__tcpDisconnect:
+    def __OnPower(self, values: dict) -> bool:
+        if values["state"] == 1:
+            if not self.__power:
+                self.__set_tcpSendHoldbackTime(self.__profile.powerOnHoldback, "power on")
+                self.__set_power(True)
+        else:
+            self.__set_power(False)
+        return True
 
-                try:
-                    foundData = False
-                    data = await asyncio.wait_for(reader.read(1024), timeout=0.1)
+    def __OnEdid(self, values: dict) -> bool:
+        edid = self.__profile.EdidFromDescription(values["value"])
+        if edid is None:
+            return False
+        return self.__SetInputProperty(values["input"], "edid", edid)
 
-                    if not data:
-                        break
+    def __OnInitializing(self, values: dict) -> bool:
+        self.__set_tcpSendHoldbackTime(self.__profile.initHoldback, "System Initializing")
+        return True
 
-                    heartbeat = 0
-                    lastReceived = time.time()
-                    foundData = True
+    def __OnInitialized(self, values: dict) -> bool:
+        self.__set_tcpSendHoldbackTime(self.__profile.powerOnHoldback, "Initialization Finished")
+        self.__set_power(True)
+        return True
 
-                    message = data.decode()
-                    self.__TcpReceive(message)
+    async def __Handle_tcp_connection(self, transport: MatrixTransport):
+        self.__tcpTransport = transport
+        self.__tcpLastReceived = time.time()
+        self.__tcpHeartbeat = 0
 
-                except TimeoutError:
-                    pass
+        self.__TcpSendDirect(transport, self.__profile.Build("status").text )
+        self.__TcpSendEnqueue( self.__profile.Build("read_streams", cable="cat") )
+        self.__TcpSendEnqueue( self.__profile.Build("read_streams", cable="hdmi") )
 
-                now = time.time()
+        addr = transport.peer
+        _LOGGER.info(f"TCP:Connected to {addr!r}")
+        self.__trace.Record(TRACE_CONNECTION, "connected", addr)
+        self.__set_tcpConnectState(TcpConnectedState.Connected)
+
+        self.__set_tcpSendHoldbackTime(self.__profile.connectHoldback, "Newly connected" )
+        self.__tcpHeartbeatTimer = self.__manager.wheel.CallLater(self.__profile.heartbeatIdle, self.__TcpHeartbeatCheck)
 
-                if heartbeat > 2:
-                    _LOGGER.warning("TCP:Missed HEARTBEAT")
-                    self.__set_tcpConnectState(TcpConnectedState.Disconnected)
-                    break
-                elif now - lastReceived > 10:
-                    if heartbeat == 0:
-                        # This is sent directly not enqueued since we may not be servicing the queue
-                        await self.__TcpSendDirect(writer, TCP_HEARTBEAT_COMMAND)
-                        lastReceived = now
-                    heartbeat += 1
-
-                # We only send requests if we didn't recv data this loop AND we're not holding back.
-                if not foundData and (self.__tcpSendHoldbackTime==0 or time.time() > self.__tcpSendHoldbackTime):
-                    self.__set_tcpSendHoldbackTime( 0, "Expired" )
-                    # Service the command queue only when Powered ON
-                    if self.__power:
-                        if self.__tcpSendQueue.qsize() > 0:
-                            # Not the whole queue so we don't overwhelm the device
-                            await self.__TcpSendDirect(writer, self.__tcpSendQueue.get())
-                        elif self.__power_off_requested:
-                            self.__power_on_requested = False
-                            self.__power_off_requested = False
-                            await self.__TcpSendDirect(writer, TCP_POWER_OFF_COMMAND)
-
-                    else: # We must be powered off
-                        self.__power_off_requested = False
-
-                        if self.__power_on_requested:
-                            self.__power_on_requested = False
-                            self.__power_off_requested = False
-                            await self.__TcpSendDirect(writer, TCP_POWER_ON_COMMAND)
-                            # We don't want to send when we are polling all data
-                            # This will be pulled in when we see the last polled item
-                            self.__set_tcpSendHoldbackTime(20, "Power on request" )
+        try:
+            # Heartbeats, holdbacks and sending are all driven by the manager's timer
+            # wheel, and the transport hands over lines as they arrive, so there's
+            # nothing to do here but wait for the connection to end.
+            await transport.WaitClosed()
 
         except Exception as e:
             _LOGGER.info(e, exc_info=True)
+            self.__trace.LogRecent(_LOGGER, logging.INFO)
 
         finally:
-            writer.close()
-            await writer.wait_closed()
+            self.__tcpTransport = None
+            for timer in (self.__tcpHeartbeatTimer, self.__tcpServiceTimer, self.__tcpConfirmTimer):
+                if timer is not None:
+                    timer.Cancel()
+            self.__tcpHeartbeatTimer = None
+            self.__tcpServiceTimer = None
+            self.__tcpConfirmTimer = None
+
+            # Unconfirmed commands were probably lost with the connection
+            for command in reversed(self.__tcpInFlight):
+                if self.__tcpDisconnect:
+                    self.__tcpSendQueue.Count(DROP_DISCONNECTED)
+                    command.Resolve(False)
+                else:
+                    self.__tcpSendQueue.PushFront(command)
+            self.__tcpInFlight = []
+            self.__TcpScheduleExpiry()
+
+            transport.Close()
             _LOGGER.info(f"TCP:Disconnected from {addr!r}")
+            self.__trace.Record(TRACE_CONNECTION, "disconnected", addr)
+            self.__set_tcpConnectState(TcpConnectedState.Disconnected)
+            # Anything still queued survives a reconnect unless it expires first
+
+    def __TcpHeartbeatCheck(self) -> None:
+        self.__tcpHeartbeatTimer = None
+        transport = self.__tcpTransport
+        if transport is None:
+            return
+
+        now = time.time()
+        idle = now - self.__tcpLastReceived
+
+        if idle < self.__profile.heartbeatIdle:
+            self.__tcpHeartbeatTimer = self.__manager.wheel.CallLater(self.__profile.heartbeatIdle - idle, self.__TcpHeartbeatCheck)
+            return
+
+        if self.__tcpHeartbeat >= TCP_HEARTBEAT_MAX_MISSED:
+            _LOGGER.warning("TCP:Missed HEARTBEAT")
+            self.__trace.Record(TRACE_CONNECTION, "heartbeat missed", self.__tcpHeartbeat)
+            self.__trace.LogRecent(_LOGGER, logging.WARNING)
             self.__set_tcpConnectState(TcpConnectedState.Disconnected)
-            while self.__tcpSendQueue.qsize() > 0:
-                self.__tcpSendQueue.get()
+            # Closing the transport ends __Handle_tcp_connection which then cleans up
+            transport.Close()
+            return
+
+        if self.__tcpHeartbeat == 0:
+            # This is sent directly not enqueued since we may not be servicing the queue
+            self.__TcpSendDirect(transport, self.__profile.Build("heartbeat").text)
+        self.__tcpLastReceived = now
+        self.__tcpHeartbeat += 1
+        self.__tcpHeartbeatTimer = self.__manager.wheel.CallLater(self.__profile.heartbeatIdle, self.__TcpHeartbeatCheck)
+
+    def __TcpScheduleService(self, delay: float = 0) -> None:
+        if self.__tcpTransport is None:
+            return
+
+        if self.__tcpServiceTimer is not None:
+            if delay <= 0:
+                return
+            self.__tcpServiceTimer.Cancel()
+
+        self.__tcpServiceTimer = self.__manager.wheel.CallLater(delay, self.__TcpService)
+
+    def __TcpScheduleExpiry(self) -> None:
+        # The queue is only serviced while connected and powered on, time to live
+        # is enforced by this timer whatever the state, for the earliest expiry
+        due = self.__tcpSendQueue.nextExpiry
+        if due is None:
+            return
+        if self.__tcpExpiryTimer is not None:
+            if self.__tcpExpiryDue <= due:
+                return
+            self.__tcpExpiryTimer.Cancel()
+        self.__tcpExpiryDue = due
+        self.__tcpExpiryTimer = self.__manager.wheel.CallLater(max(due - time.time(), 0), self.__TcpExpire)
+
+    def __TcpExpire(self) -> None:
+        self.__tcpExpiryTimer = None
+        self.__tcpSendQueue.Expire()
+        self.__TcpScheduleExpiry()
+
+    def __TcpService(self) -> None:
+        self.__tcpServiceTimer = None
+        transport = self.__tcpTransport
+        if transport is None or self.__tcpDisconnect:
+            return
+
+        if not self.__tcpSendHoldbackTime==0:
+            remaining = self.__tcpSendHoldbackTime - time.time()
+            if remaining > 0:
+                self.__TcpScheduleService(remaining)
+                return
+            self.__set_tcpSendHoldbackTime( 0, "Expired" )
+
+        # Service the command queue only when Powered ON
+        if self.__power:
+            self.__tcpSendQueue.Ready()
+            # As many as the rate limit allows, without running too far ahead of
+            # what the matrix has confirmed. A confirmation wakes us again.
+            while len(self.__tcpSendQueue) > 0:
+                if len(self.__tcpInFlight) >= TCP_MAX_IN_FLIGHT:
+                    return
+                if not self.__tcpRateLimit.TryTake():
+                    self.__TcpScheduleService(self.__tcpRateLimit.TimeUntilAvailable())
+                    return
+
+                command = self.__tcpSendQueue.Get()
+                if command is not None:
+                    self.__TcpSendDirect(transport, command.text)
+                    self.__TcpTrackInFlight(command)
+
+            if self.__power_off_requested:
+                self.__power_on_requested = False
+                self.__power_off_requested = False
+                self.__TcpSendDirect(transport, self.__profile.Build("power_off").text)
+
+        else: # We must be powered off
+            self.__power_off_requested = False
+
+            if self.__power_on_requested:
+                self.__power_on_requested = False
+                self.__power_off_requested = False
+                self.__TcpSendDirect(transport, self.__profile.Build("power_on").text)
+                # We don't want to send when we are polling all data
+                # This will be pulled in when we see the last polled item
+                self.__set_tcpSendHoldbackTime(self.__profile.initHoldback, "Power on request" )
+                return
+
+            # Reads are still answered while off, everything else waits for power
+            if len(self.__tcpInFlight) < TCP_MAX_IN_FLIGHT and len(self.__tcpSendQueue) > 0:
+                if not self.__tcpRateLimit.TryTake():
+                    self.__TcpScheduleService(self.__tcpRateLimit.TimeUntilAvailable())
+                    return
+                command = self.__tcpSendQueue.Get(readsOnly=True)
+                if command is not None:
+                    self.__TcpSendDirect(transport, command.text)
+                    self.__TcpTrackInFlight(command)
+                    self.__TcpScheduleService()
+                    return
+
+        # While off, queued writes wait for __set_power to wake us rather than polling
+        if (self.__power and len(self.__tcpSendQueue) > 0) or self.__power_off_requested:
+            self.__TcpScheduleService()
 
     async def __Disconnect_tcp(self) -> None:
         _LOGGER.debug(f"TCP:Disconnecting from {self.__host}:{self.__tcpPort}")
-        while self.__tcpSendQueue.qsize() > 0:
-            self.__tcpSendQueue.get()
+        self.__tcpSendQueue.Clear(DROP_DISCONNECTED)
 
         self.__set_tcpConnectState( TcpConnectedState.Disconnecting)
-        self.__tcpRecvBuffer = ""
         self.__tcpDisconnect = True
+        self.__debouncer.Clear()
+
+        # Closing the transport ends __Handle_tcp_connection
+        if self.__tcpTransport is not None:
+            self.__tcpTransport.Close()
 
 
-    def __NotifySubscribers(self, changed_object) -> None:
-        for s in self.__callbacks:
-            s(changed_object)
+    def __ObjectsChangedSince(self, version: int) -> list:
+        deltas = self.__changes.Since(version)
+        if deltas is None:
+            return [self] + list(self.__inputs or []) + list(self.__outputs or [])
+
+        objects = {}
+        for delta in deltas:
+            if delta.kind == MatrixInput.KIND:
+                objects.setdefault((delta.kind, delta.id), self.__inputs[delta.id-1])
+            elif delta.kind == MatrixOutput.KIND:
+                objects.setdefault((delta.kind, delta.id), self.__outputs[delta.id-1])
+            else:
+                objects.setdefault((delta.kind, delta.id), self)
+        return list(objects.values())
+
+    def __NotifySubscribers(self, changed_object, *fields: str) -> None:
+        # A refresh that found nothing different tells nobody
+        if not fields:
+            return
+
+        id = 0 if changed_object is self else changed_object.Id
+        values = None
+
+        for field in fields:
+            entry = HISTORY_FIELDS.get((changed_object.KIND, field))
+            if entry is not None:
+                self.__history.Record(entry[0], id, entry[1](changed_object))
+
+            # Every change to the state model gets the next version, network
+            # settings outside FIELDS are configuration rather than state
+            if field in changed_object.FIELDS:
+                if values is None:
+                    values = dict(zip(changed_object.FIELDS, changed_object.Fields()))
+                self.__changes.Append(changed_object.KIND, id, field, values[field])
+
+        if values is not None:
+            for subscriber in self.__deltaCallbacks:
+                subscriber.Deliver()
+
+        # Only queues the notification, every subscriber drains its own queue on a
+        # later turn of the loop so the reader never waits for a consumer
+        for subscriber in self.__callbacks:
+            subscriber.Deliver(changed_object)
+
+        if self.__fieldCallbacks:
+            for field in fields:
+                for subscriber in self.__fieldCallbacks.get((changed_object.KIND, id, field), ()):
+                    subscriber.Deliver(changed_object, field)
 
     async def __web_cmd(self, cmd):
-        url =  f"http://{self.__host}/cgi-bin/instr"
+        if self.__httpPort == 80:
+            url =  f"http://{self.__host}/cgi-bin/instr"
+        else:
+            url =  f"http://{self.__host}:{self.__httpPort}/cgi-bin/instr"
+
+        # One client session is shared by every matrix owned by the manager
+        session = self.__manager.GetSession()
 
         for i in range(self.__maxRetries):
 
             try:
-                async with aiohttp.ClientSession() as session:
-                    async with session.post(url, json=cmd, headers={"Accept": "application/json"}) as response:
+                async with session.post(url, json=cmd, headers={"Accept": "application/json"}) as response:
 
-                        status = response.status
+                    status = response.status
 
-                        if status == 200:
-                            # I know this is weird but our server responds
-                            # ContentType = 'text/plain' so we can't use await response.json()
-                            textVal = await response.text(encoding="utf-8")
-                            jsonObj = json.loads(textVal)
+                    if status == 200:
+                        # I know this is weird but our server responds
+                        # ContentType = 'text/plain' so we can't use await response.json()
+                        textVal = await response.text(encoding="utf-8")
+                        jsonObj = json.loads(textVal)
 
-                            if "power" in jsonObj:
-                                self.__set_power( jsonObj["power"]==1 )
+                        if "power" in jsonObj:
+                            self.__set_power( jsonObj["power"]==1 )
 
-                            return jsonObj
-                        else:
-                            _LOGGER.warning(f"HTTP:Received STATUS={status} while POSTING {cmd} to {url}")
+                        return jsonObj
+                    else:
+                        _LOGGER.warning(f"HTTP:Received STATUS={status} while POSTING {cmd} to {url}")
 
-                            if i < self.__maxRetries - 1:
-                                asyncio.sleep(0.5)
-                            else:
-                                _LOGGER.error(f"HTTP:Failed to connect to the Matrix after {self.__maxRetries} attempts")
+                        if i < self.__maxRetries - 1:
+                            await asyncio.sleep(0.5)
+                        else:
+                            _LOGGER.error(f"HTTP:Failed to connect to the Matrix after {self.__maxRetries} attempts")
 
             except Exception as e:
                 _LOGGER.warning(f"HTTP:Error connecting to the Matrix: try={i} req={cmd} err={e!r}")
@@ -0,0 +1,156 @@
+import math
+import statistics
+import time
+from typing import NamedTuple
+
+from .pyOreiMatrixProfiles import MatrixCommand
+from .pyOreiMatrixRateLimit import RegisterRateLimit
+
+CALIBRATION_SAMPLES     = 8       # sequential round trips per command class
+CALIBRATION_START_RATE  = 2.0     # commands per second
+CALIBRATION_MAX_RATE    = 64.0
+CALIBRATION_STEP        = 1.5     # each rate tried is this much faster than the last
+CALIBRATION_STEP_TIME   = 2.0     # seconds worth of commands sent at each rate
+CALIBRATION_MARGIN      = 0.8     # of the fastest clean rate, for headroom
+
+# Commands that leave the matrix as it is but are still echoed, so calibrating
+# a matrix in use doesn't change what anybody is watching
+CALIBRATION_CLASSES     = ("route", "stream", "read")
+
+
+class RateCalibration(NamedTuple):
+    # What Calibrate measured for one model and firmware. latency holds the
+    # p50 and p95 seconds from sending to the echo for each command class,
+    # steps every rate tried as (rate, commands per second achieved, clean).
+    model: str
+    firmware: str
+    rate: float
+    burst: float
+    latency: dict[str, dict[str, float]]
+    steps: tuple[tuple[float, float, bool], ...]
+
+    def ToDict(self) -> dict:
+        return {**self._asdict(), "steps": [list(step) for step in self.steps]}
+
+    @classmethod
+    def FromDict(cls, data: dict) -> 'RateCalibration':
+        return cls(**{**data, "steps": tuple(tuple(step) for step in data["steps"])})
+
+
+def ProbeCommands(api, commandClass: str) -> list[MatrixCommand]:
+    # One no-op command per port, each collapsing under its own key so a whole
+    # round can wait in the queue at once
+    build = api.profile.Build
+    outputs = [api.GetOutput(id) for id in range(1, api.outputCount+1)]
+
+    if commandClass == "route":
+        # Only outputs whose route is known, anything else wouldn't be a no-op
+        return [build("route", input=output.InputId, output=output.Id) for output in outputs
+                if output.InputId is not None and 0 < output.InputId <= api.inputCount]
+    if commandClass == "stream":
+        return [build("stream", cable="hdmi", output=output.Id, on=output.StreamEnabledHDMI) for output in outputs] + \
+               [build("stream", cable="cat", output=output.Id, on=output.StreamEnabledHDBT) for output in outputs]
+    if commandClass == "read":
+        return [build("read_edid", input=id) for id in range(1, api.inputCount+1)]
+
+    raise ValueError(f"Unknown command class {commandClass!r}")
+
+
+def BurstFor(rate: float, tick: float) -> float:
+    # The sender wakes once per timer wheel tick, so a bucket smaller than a
+    # tick's worth of tokens would cap the rate below what was asked for
+    return max(1, math.ceil(rate * tick))
+
+
+def _CheckConnected(api) -> None:
+    # Commands that went unconfirmed because the link dropped say nothing about
+    # the rate, so a sweep that loses the matrix stops rather than finishing
+    if not api.IsConnected:
+        raise BrokenPipeError("Lost the matrix during calibration")
+
+
+async def _Latency(api, commands: list[MatrixCommand], samples: int) -> dict[str, float]:
+    start = time.time()
+    for index in range(samples):
+        await api.CmdSendBatch([commands[index % len(commands)]])
+        _CheckConnected(api)
+
+    texts = {command.text for command in commands}
+    seconds = sorted(latency for when, text, latency in api.echoLatencies if when >= start and text in texts)
+    if not seconds:
+        return {"p50": None, "p95": None}
+    return {
+        "p50": round(statistics.median(seconds), 4),
+        "p95": round(seconds[min(len(seconds)-1, int(len(seconds) * 0.95))], 4),
+    }
+
+
+async def _Step(api, commands: list[MatrixCommand], rate: float, stepTime: float) -> tuple[float, bool]:
+    # Send stepTime seconds worth of commands at rate, a round at a time. Clean
+    # if the matrix confirmed every one first time, no retries.
+    api.ConfigureRateLimit(rate, BurstFor(rate, api.manager.wheel.tick))
+    count = max(len(commands), math.ceil(rate * stepTime))
+    retried = api.sendQueueCounters.get("retried", 0)
+
+    start = time.monotonic()
+    confirmed = True
+    sent = 0
+    while sent < count:
+        batch = commands[:count-sent]
+        confirmed = await api.CmdSendBatch(batch) and confirmed
+        _CheckConnected(api)
+        sent += len(batch)
+    elapsed = time.monotonic() - start
+
+    clean = confirmed and api.sendQueueCounters.get("retried", 0) == retried
+    return sent / elapsed, clean
+
+
+async def Calibrate(api, samples: int = CALIBRATION_SAMPLES, startRate: float = CALIBRATION_START_RATE,
+                    maxRate: float = CALIBRATION_MAX_RATE, stepTime: float = CALIBRATION_STEP_TIME,
+                    margin: float = CALIBRATION_MARGIN) -> RateCalibration:
+    # Measure a connected, powered on matrix: echo latency per command class,
+    # then ever faster rounds of no-op routes until the matrix starts missing
+    # commands. The recommended rate is a margin below the fastest clean one.
+    # The matrix's own rate limit is put back afterwards, see ApplyCalibration.
+    commands = ProbeCommands(api, "route")
+    if not commands:
+        raise ValueError("No output has a known route to probe with")
+
+    previous = api.rateLimit
+    try:
+        # Wide open, so latencies are the matrix's and not the limiter's
+        api.ConfigureRateLimit(maxRate, BurstFor(maxRate, api.manager.wheel.tick))
+        latency = {commandClass: await _Latency(api, ProbeCommands(api, commandClass), samples)
+                   for commandClass in CALIBRATION_CLASSES}
+
+        steps = []
+        best = None
+        rate = startRate
+        while rate <= maxRate:
+            achieved, clean = await _Step(api, commands, rate, stepTime)
+            steps.append((round(rate, 2), round(achieved, 2), clean))
+            if not clean:
+                break
+            best = rate
+            rate *= CALIBRATION_STEP
+    finally:
+        api.ConfigureRateLimit(*previous)
+
+    # When not even the slowest rate was clean, go below that
+    recommended = (best if best is not None else startRate) * margin
+    return RateCalibration(
+        model=api.model,
+        firmware=api.firmware,
+        rate=round(recommended, 2),
+        burst=BurstFor(recommended, api.manager.wheel.tick),
+        latency=latency,
+        steps=tuple(steps),
+    )
+
+
+def ApplyCalibration(api, calibration: RateCalibration) -> None:
+    # Use a calibration for this matrix now and for every matrix of the same
+    # model and firmware validated from here on
+    RegisterRateLimit(calibration.model, calibration.firmware, calibration.rate, calibration.burst)
+    api.ConfigureRateLimit(calibration.rate, calibration.burst)
@@ -0,0 +1,106 @@
+import collections
+
+CHANGE_LOG_SIZE = 4096  # deltas kept for subscribers catching up
+
+
+class MatrixDelta:
+    # One field of the matrix, an input or an output taking a new value. version
+    # numbers every delta of one API, without gaps, in the order they happened.
+    __slots__ = ("version", "kind", "id", "field", "value")
+
+    def __init__(self, version: int, kind: str, id: int, field: str, value) -> None:
+        self.version = version
+        self.kind = kind
+        self.id = id
+        self.field = field
+        self.value = value
+
+    def __repr__(self):
+        return f"MatrixDelta(version={self.version} kind={self.kind} id={self.id} field={self.field} value={self.value!r})"
+
+
+class ChangeLog:
+    # A bounded log of the most recent deltas. A consumer that remembers the last
+    # version it saw asks for everything after it, and is told to read the whole
+    # state instead once some of that has been dropped.
+    __size: int
+    __deltas: collections.deque
+    __version: int
+
+    def __init__(self, size: int = CHANGE_LOG_SIZE) -> None:
+        self.__size = size
+        self.__deltas = collections.deque(maxlen=size)
+        self.__version = 0
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def version(self) -> int:
+        # Of the latest delta, 0 before the first
+        return self.__version
+
+    @property
+    def oldest(self) -> int:
+        # The oldest version still held, version+1 while the log is empty
+        return self.__deltas[0].version if self.__deltas else self.__version + 1
+
+    def __len__(self) -> int:
+        return len(self.__deltas)
+
+    def Append(self, kind: str, id: int, field: str, value) -> MatrixDelta:
+        self.__version += 1
+        delta = MatrixDelta(self.__version, kind, id, field, value)
+        self.__deltas.append(delta)
+        return delta
+
+    def Since(self, version: int) -> list[MatrixDelta] | None:
+        # The deltas after version, oldest first, None if some are no longer held
+        # or version is one this log never reached, e.g. from before a restart
+        if version > self.__version or version < self.oldest - 1:
+            return None
+
+        # Versions have no gaps, so the wanted deltas are the last count held and
+        # a subscriber a few behind doesn't pay for walking the whole log
+        count = self.__version - version
+        deltas = []
+        for delta in reversed(self.__deltas):
+            if len(deltas) == count:
+                break
+            deltas.append(delta)
+        deltas.reverse()
+        return deltas
+
+
+class DeltaCursor:
+    # What a SubscribeToDeltas subscriber is handed through: it remembers the last
+    # version delivered and pulls everything after it from the log, so a burst of
+    # changes is one call with a list rather than a queue that could overflow.
+    # callback(deltas) gets None when it fell further behind than the log reaches
+    # and should read the full state again.
+    __log: ChangeLog
+    __callback: callable
+    __version: int
+
+    def __init__(self, log: ChangeLog, callback, version: int) -> None:
+        self.__log = log
+        self.__callback = callback
+        self.__version = version
+
+    @property
+    def callback(self):
+        return self.__callback
+
+    @property
+    def version(self) -> int:
+        return self.__version
+
+    def __call__(self) -> None:
+        deltas = self.__log.Since(self.__version)
+        self.__version = self.__log.version
+        if deltas is None or deltas:
+            self.__callback(deltas)
+
+    def __repr__(self):
+        return f"DeltaCursor({self.__callback!r} version={self.__version})"
@@ -0,0 +1,383 @@
+import argparse
+import asyncio
+import enum
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+
+from .pyOreiMatrix import MatrixInput, MatrixOutput, OreiMatrixAPI
+from .pyOreiMatrixCalibrate import Calibrate, CALIBRATION_MAX_RATE, CALIBRATION_SAMPLES, CALIBRATION_STEP_TIME
+from .pyOreiMatrixEnums import PowerOffPolicy
+from .pyOreiMatrixManager import OreiMatrixManager
+from .pyOreiMatrixProfiles import MatrixCommand
+from .pyOreiMatrixSendQueue import MatrixPoweredOffError, SendQueueFullError
+from .pyOreiMatrixSimulator import OreiMatrixSimulator
+from .pyOreiMatrixSnapshot import MatrixSnapshot
+from .pyOreiMatrixTransport import TransportFactory
+
+CLI_KEY             = "cli"
+CLI_CONNECT_TIMEOUT = 10.0
+CLI_DRAIN_TIMEOUT   = 10.0
+
+
+class OutputClosed(Exception):
+    # Whatever reads our output, e.g. head, has gone away
+    pass
+
+
+def Emit(record: dict) -> None:
+    # One JSON object per line, flushed so a pipe sees it straight away
+    try:
+        sys.stdout.write(json.dumps(record) + "\n")
+        sys.stdout.flush()
+    except BrokenPipeError as error:
+        raise OutputClosed() from error
+
+
+def ObjectValues(obj) -> dict:
+    # Enums by name, EDID_4K2K60_444_HD_AUDIO_7_1_HDR says more than 20
+    values = dict(zip(obj.FIELDS, obj.Fields()))
+    return {field: value.name if isinstance(value, enum.Enum) else value for field, value in values.items()}
+
+
+def StatusRecords(api: OreiMatrixAPI) -> list[dict]:
+    records = [{"kind": OreiMatrixAPI.KIND, "id": 0, **ObjectValues(api)}]
+    records += [{"kind": MatrixInput.KIND, "id": id, **ObjectValues(api.GetInput(id))} for id in range(1, api.inputCount+1)]
+    records += [{"kind": MatrixOutput.KIND, "id": id, **ObjectValues(api.GetOutput(id))} for id in range(1, api.outputCount+1)]
+    return records
+
+
+def ParseBatchLine(api: OreiMatrixAPI, line: str) -> MatrixCommand:
+    # Either raw protocol text, "s in 3 av out 2", or a profile command with named
+    # parameters, "route input=3 output=2"
+    name, *params = line.split()
+    if name not in ("s", "r") and all("=" in param for param in params):
+        values = {}
+        for param in params:
+            key, value = param.split("=", 1)
+            values[key] = int(value) if value.isdigit() else value
+        return api.profile.Build(name, **values)
+
+    return api.profile.ParseCommand(line)
+
+
+def ParseRoute(text: str) -> tuple[int, int]:
+    # "3:2" or "3 2", input then output, output 0 for every output
+    input, output = text.replace(":", " ").split()
+    return int(input), int(output)
+
+
+def ParseTransport(value: str) -> str:
+    # Only the kind is checked here, plain "serial" is fine for the simulator's own pty
+    if value.partition(":")[0] not in ("tcp", "telnet", "serial"):
+        raise argparse.ArgumentTypeError(f"unknown transport {value!r}, expected tcp, telnet or serial")
+    if value != "serial":
+        try:
+            TransportFactory(value)
+        except ValueError as error:
+            raise argparse.ArgumentTypeError(str(error)) from error
+    return value
+
+
+def ReadLines(path: str) -> list[str]:
+    if path == "-":
+        text = sys.stdin.read()
+    else:
+        with open(path) as file:
+            text = file.read()
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+def Percentiles(samples: list[float]) -> dict:
+    # Milliseconds
+    if len(samples) < 2:
+        value = round(samples[0] * 1000, 2) if samples else 0.0
+        return {"p50": value, "p95": value, "p99": value, "max": value}
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": round(cuts[49] * 1000, 2), "p95": round(cuts[94] * 1000, 2),
+            "p99": round(cuts[98] * 1000, 2), "max": round(max(samples) * 1000, 2)}
+
+
+class OreiMatrixCli:
+    # One manager, so one HTTP client and one TCP session, for everything a
+    # single invocation does, however many commands a batch holds
+    __args: argparse.Namespace
+    __manager: OreiMatrixManager
+    __simulator: OreiMatrixSimulator
+    __api: OreiMatrixAPI
+    __commands: dict
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.__args = args
+        self.__manager = None
+        self.__simulator = None
+        self.__api = None
+        self.__commands = {
+            "status": self.__Status,
+            "snapshot": self.__Snapshot,
+            "watch": self.__Watch,
+            "route": self.__Route,
+            "apply": self.__Apply,
+            "bench": self.__Bench,
+            "calibrate": self.__Calibrate,
+        }
+
+    async def Run(self) -> int:
+        try:
+            if not await self.__Open():
+                Emit({"event": "error", "error": f"No matrix at {self.__args.host}"})
+                return 2
+            return await self.__commands[self.__args.command]()
+        except OutputClosed:
+            # Nobody to report to, and Python would complain flushing at exit
+            sys.stdout = open(os.devnull, "w")
+            return 0
+        except (BrokenPipeError, MatrixPoweredOffError, SendQueueFullError) as error:
+            Emit({"event": "error", "error": str(error)})
+            return 1
+        except (KeyError, ValueError) as error:
+            # A batch line naming an unknown command or parameter
+            Emit({"event": "error", "error": f"Bad command: {error}"})
+            return 2
+        finally:
+            await self.__Close()
+
+    async def __Open(self) -> bool:
+        args = self.__args
+        httpPort = args.http_port
+
+        transport = args.transport
+        if args.simulator:
+            kind = transport.partition(":")[0]
+            self.__simulator = OreiMatrixSimulator(inputs=args.inputs, outputs=args.outputs, httpPort=0, initTime=args.init_time,
+                                                   commandRate=args.command_rate, telnetPort=0 if kind == "telnet" else None)
+            await self.__simulator.Start()
+            args.host, httpPort = self.__simulator.host, self.__simulator.httpPort
+            # The simulator's own Telnet port or serial port, wherever they ended up
+            if kind == "telnet":
+                transport = f"telnet:{self.__simulator.telnetPort}"
+            elif kind == "serial":
+                transport = f"serial:{await self.__simulator.OpenPty()}"
+
+        self.__manager = OreiMatrixManager()
+        self.__api = self.__manager.AddMatrix(CLI_KEY, args.host, httpPort)
+        self.__api.ConfigureTransport(TransportFactory(transport))
+        if args.auto_power_on:
+            self.__api.ConfigureSendQueue(powerOffPolicy=PowerOffPolicy.AutoPowerOn)
+
+        if not await self.__manager.StartMatrix(CLI_KEY):
+            return False
+
+        # Subscribing is what opens the TCP session and holds it open
+        self.__api.SubscribeToChanges(self.__OnChange)
+
+        deadline = time.monotonic() + CLI_CONNECT_TIMEOUT
+        while not self.__api.IsConnected:
+            if time.monotonic() > deadline:
+                return False
+            await asyncio.sleep(0.05)
+        return True
+
+    async def __Close(self) -> None:
+        if self.__manager is not None:
+            await self.__manager.Shutdown()
+        if self.__simulator is not None:
+            await self.__simulator.Stop()
+
+    def __OnChange(self, changedObject) -> None:
+        pass
+
+    async def __Drain(self) -> None:
+        # Let anything queued behind a batch, e.g. a restore's power off, go out
+        deadline = time.monotonic() + CLI_DRAIN_TIMEOUT
+        while self.__api.sendQueueLength and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+
+    async def __Batch(self, commands: list[MatrixCommand]) -> int:
+        api = self.__api
+        started = time.time()
+        confirmed = await api.CmdSendBatch(commands)
+        elapsed = time.time() - started
+        await self.__Drain()
+
+        Emit({
+            "event": "batch",
+            "commands": len(commands),
+            "confirmed": confirmed,
+            "failed": [command for when, command in api.commandFailures if when >= started],
+            "seconds": round(elapsed, 3),
+        })
+        return 0 if confirmed else 1
+
+    async def __Status(self) -> int:
+        for record in StatusRecords(self.__api):
+            Emit(record)
+        return 0
+
+    async def __Snapshot(self) -> int:
+        Emit(self.__api.Snapshot().ToDict())
+        return 0
+
+    async def __Watch(self) -> int:
+        api = self.__api
+        args = self.__args
+
+        if not args.changes_only:
+            for record in StatusRecords(api):
+                Emit(record)
+
+        done = asyncio.Event()
+        count = 0
+
+        def OnDeltas(deltas) -> None:
+            nonlocal count
+            if deltas is None:
+                # Fell further behind than the change log reaches, start again from the whole state
+                for record in StatusRecords(api):
+                    Emit({"time": round(time.time(), 3), "version": api.version, **record})
+                return
+
+            for delta in deltas:
+                value = delta.value.name if isinstance(delta.value, enum.Enum) else delta.value
+                Emit({"time": round(time.time(), 3), "version": delta.version, "kind": delta.kind, "id": delta.id,
+                      "field": delta.field, "value": value})
+                count += 1
+
+            if args.count and count >= args.count:
+                done.set()
+
+        api.SubscribeToDeltas(OnDeltas)
+        try:
+            await asyncio.wait_for(done.wait(), args.duration)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            api.UnsubscribeFromDeltas(OnDeltas)
+        return 0
+
+    async def __Route(self) -> int:
+        args = self.__args
+        routes = list(args.routes)
+        if args.file:
+            routes += [ParseRoute(line) for line in ReadLines(args.file)]
+        if not routes:
+            Emit({"event": "error", "error": "No routes given"})
+            return 2
+
+        build = self.__api.profile.Build
+        return await self.__Batch([build("route", input=input, output=output) for input, output in routes])
+
+    async def __Apply(self) -> int:
+        api = self.__api
+        lines = ReadLines(self.__args.file)
+
+        # A snapshot, as printed by the snapshot command, is restored as a whole
+        if lines and lines[0].startswith("{"):
+            snapshot = MatrixSnapshot.FromDict(json.loads("\n".join(lines)))
+            commands = api.RestoreCommands(snapshot)
+            started = time.time()
+            confirmed = await api.Restore(snapshot)
+            await self.__Drain()
+            Emit({"event": "restore", "commands": len(commands), "confirmed": confirmed,
+                  "seconds": round(time.time() - started, 3)})
+            return 0 if confirmed else 1
+
+        return await self.__Batch([ParseBatchLine(api, line) for line in lines])
+
+    async def __Bench(self) -> int:
+        api = self.__api
+        args = self.__args
+        build = api.profile.Build
+        output = api.GetOutput(args.output)
+        original = output.InputId
+        inputs = [id for id in range(1, api.inputCount+1) if id != original][:2] or [original]
+
+        # One command at a time, so each sample is a full send to echo round trip
+        latencies = []
+        confirmed = True
+        for index in range(args.count):
+            started = time.perf_counter()
+            confirmed &= await api.CmdSendBatch([build("route", input=inputs[index % len(inputs)], output=args.output)])
+            latencies.append(time.perf_counter() - started)
+
+        # Then all of them at once, for how many the session moves per second
+        batch = [build("route", input=inputs[index % len(inputs)], output=args.output) for index in range(args.count)]
+        started = time.perf_counter()
+        confirmed &= await api.CmdSendBatch(batch)
+        elapsed = time.perf_counter() - started
+
+        await api.CmdSendBatch([build("route", input=original, output=args.output)])
+
+        Emit({
+            "event": "bench",
+            "output": args.output,
+            "confirmed": confirmed,
+            "sequential": {"count": len(latencies), **Percentiles(latencies)},
+            "pipelined": {"count": len(batch), "seconds": round(elapsed, 3),
+                          "per_second": round(len(batch) / elapsed, 1) if elapsed else None},
+            "sendQueue": api.sendQueueCounters,
+        })
+        return 0 if confirmed else 1
+
+    async def __Calibrate(self) -> int:
+        args = self.__args
+        calibration = await Calibrate(self.__api, samples=args.samples, maxRate=args.max_rate, stepTime=args.step_time)
+        Emit({"event": "calibration", **calibration.ToDict()})
+        return 0
+
+
+def ParseArgs(argv: list[str] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(prog="python -m pyOreiMatrix", description="Control an OREI matrix over one session, printing NDJSON.")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--host", help="matrix host name or IP address")
+    target.add_argument("--simulator", action="store_true", help="start a local simulated matrix and use that")
+    parser.add_argument("--http-port", type=int, default=80)
+    parser.add_argument("--transport", type=ParseTransport, default="tcp",
+                        help="tcp, tcp:PORT, telnet, telnet:PORT or serial:PATH[@BAUD]; plain serial with --simulator")
+    parser.add_argument("--inputs", type=int, default=8, help="simulator inputs")
+    parser.add_argument("--outputs", type=int, default=8, help="simulator outputs")
+    parser.add_argument("--init-time", type=float, default=2.0, help="simulator power on time")
+    parser.add_argument("--command-rate", type=float, default=None, help="simulator drops commands beyond this many per second")
+    parser.add_argument("--auto-power-on", action="store_true", help="power the matrix on for commands sent while it is off")
+    parser.add_argument("-v", "--verbose", action="count", default=0)
+
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("status", help="print every matrix, input and output value")
+    commands.add_parser("snapshot", help="print a snapshot that apply can restore")
+
+    watch = commands.add_parser("watch", help="print changes as they happen")
+    watch.add_argument("--duration", type=float, default=None, help="stop after this many seconds")
+    watch.add_argument("--count", type=int, default=0, help="stop after this many changes")
+    watch.add_argument("--changes-only", action="store_true", help="don't print the current state first")
+
+    route = commands.add_parser("route", help="route inputs to outputs, e.g. 3:2 1:0")
+    route.add_argument("routes", nargs="*", type=ParseRoute, help="input:output, output 0 for all")
+    route.add_argument("-f", "--file", help="more routes, one per line, - for stdin")
+
+    apply = commands.add_parser("apply", help="send a batch of commands, or restore a snapshot")
+    apply.add_argument("file", nargs="?", default="-", help="one command per line or a snapshot, - for stdin")
+
+    bench = commands.add_parser("bench", help="measure confirmed round trips and throughput")
+    bench.add_argument("--count", type=int, default=50)
+    bench.add_argument("--output", type=int, default=1)
+
+    calibrate = commands.add_parser("calibrate", help="measure how fast the matrix takes commands, without changing it")
+    calibrate.add_argument("--samples", type=int, default=CALIBRATION_SAMPLES, help="round trips per command class")
+    calibrate.add_argument("--max-rate", type=float, default=CALIBRATION_MAX_RATE, help="commands per second to stop at")
+    calibrate.add_argument("--step-time", type=float, default=CALIBRATION_STEP_TIME, help="seconds at each rate")
+
+    return parser.parse_args(argv)
+
+
+def Main(argv: list[str] = None) -> int:
+    args = ParseArgs(argv)
+    level = logging.WARNING if args.verbose == 0 else logging.INFO if args.verbose == 1 else logging.DEBUG
+    logging.basicConfig(level=level, stream=sys.stderr, format="%(asctime)s %(levelname)-8s %(name)s %(message)s")
+
+    try:
+        return asyncio.run(OreiMatrixCli(args).Run())
+    except KeyboardInterrupt:
+        return 130
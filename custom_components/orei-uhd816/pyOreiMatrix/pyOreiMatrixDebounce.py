@@ -0,0 +1,141 @@
+import collections
+import time
+
+from .pyOreiMatrixManager import TimerWheel
+
+SIGNAL_INPUT_ACTIVE = "input-active"
+SIGNAL_OUTPUT_LINK  = "output-link"
+
+
+class DebounceSettings:
+    # holdoff:    nothing is published until this long after the first raw transition
+    # minStable:  the raw value must have been unchanged for this long
+    # flapWindow: raw transitions inside this rolling window are counted as flaps
+    __slots__ = ("holdoff", "minStable", "flapWindow")
+
+    def __init__(self, holdoff: float, minStable: float, flapWindow: float = 60) -> None:
+        self.holdoff = holdoff
+        self.minStable = minStable
+        self.flapWindow = flapWindow
+
+    @property
+    def IsPassThrough(self) -> bool:
+        return self.holdoff <= 0 and self.minStable <= 0
+
+    def __repr__(self):
+        return f"DebounceSettings(holdoff={self.holdoff}, minStable={self.minStable}, flapWindow={self.flapWindow})"
+
+
+DEFAULT_DEBOUNCE_SETTINGS = {
+    SIGNAL_INPUT_ACTIVE: DebounceSettings(holdoff=0.5, minStable=1.0),
+    SIGNAL_OUTPUT_LINK:  DebounceSettings(holdoff=0.5, minStable=1.5),
+}
+
+
+class _DebounceState:
+    __slots__ = ("raw", "firstChange", "lastChange", "transitions", "timer", "getCurrent", "apply")
+
+    def __init__(self, raw) -> None:
+        self.raw = raw
+        self.firstChange = 0
+        self.lastChange = 0
+        self.transitions = collections.deque()
+        self.timer = None
+        self.getCurrent = None
+        self.apply = None
+
+
+class SignalDebouncer:
+    # Sits between the TCP parser and the state model. Raw hot-plug transitions are
+    # held until they settle so a source or display waking up produces one state
+    # change instead of a burst of connect/disconnect flaps.
+    __wheel: TimerWheel
+    __settings: dict
+    __states: dict
+
+    def __init__(self, wheel: TimerWheel, settings: dict = None) -> None:
+        self.__wheel = wheel
+        self.__settings = dict(DEFAULT_DEBOUNCE_SETTINGS)
+        if settings:
+            self.__settings.update(settings)
+        self.__states = {}
+
+    def Configure(self, signal: str, settings: DebounceSettings) -> None:
+        self.__settings[signal] = settings
+
+    def GetSettings(self, signal: str) -> DebounceSettings:
+        return self.__settings[signal]
+
+    def FlapCount(self, signal: str, key) -> int:
+        state = self.__states.get((signal, key))
+        if state is None:
+            return 0
+        self.__Prune(signal, state, time.time())
+        return self.__Flaps(state)
+
+    def Submit(self, signal: str, key, value, getCurrent, apply) -> None:
+        # getCurrent() returns the published value, apply(value, flaps) publishes one
+        settings = self.__settings[signal]
+        state = self.__states.get((signal, key))
+
+        if state is None:
+            state = _DebounceState(getCurrent())
+            self.__states[(signal, key)] = state
+
+        state.getCurrent = getCurrent
+        state.apply = apply
+
+        # Refreshes and Preload write the model directly, so unless a change is
+        # still settling the published value is the one to compare against
+        if state.timer is None:
+            state.raw = getCurrent()
+
+        if value == state.raw:
+            return
+
+        now = time.time()
+        if state.timer is None:
+            state.firstChange = now
+        state.raw = value
+        state.lastChange = now
+        state.transitions.append(now)
+        self.__Prune(signal, state, now)
+
+        if settings.IsPassThrough:
+            self.__Publish(signal, state)
+        elif state.timer is None:
+            state.timer = self.__wheel.CallLater(max(settings.holdoff, settings.minStable), self.__Settle, signal, key)
+
+    def __Prune(self, signal: str, state: _DebounceState, now: float) -> None:
+        horizon = now - self.__settings[signal].flapWindow
+        while state.transitions and state.transitions[0] < horizon:
+            state.transitions.popleft()
+
+    @staticmethod
+    def __Flaps(state: _DebounceState) -> int:
+        # Reversals, a single plug in or unplug inside the window isn't a flap
+        return max(len(state.transitions) - 1, 0)
+
+    def __Settle(self, signal: str, key) -> None:
+        state = self.__states[(signal, key)]
+        settings = self.__settings[signal]
+        state.timer = None
+
+        now = time.time()
+        wait = max(state.firstChange + settings.holdoff, state.lastChange + settings.minStable) - now
+        if wait > 0:
+            state.timer = self.__wheel.CallLater(wait, self.__Settle, signal, key)
+            return
+
+        self.__Publish(signal, state)
+
+    def __Publish(self, signal: str, state: _DebounceState) -> None:
+        # A flap that ends where it started still publishes, once, so that the
+        # flap count stays visible even though the value didn't change
+        state.apply(state.raw, self.__Flaps(state))
+
+    def Clear(self) -> None:
+        for state in self.__states.values():
+            if state.timer is not None:
+                state.timer.Cancel()
+        self.__states.clear()
@@ -0,0 +1,120 @@
+import asyncio
+import aiohttp
+import ipaddress
+import json
+import logging
+
+from .pyOreiMatrixProfiles import GetProfile
+
+_LOGGER = logging.getLogger(__name__)
+
+DISCOVERY_CONCURRENCY   = 64
+DISCOVERY_HTTP_TIMEOUT  = 1.5
+DISCOVERY_TCP_TIMEOUT   = 1.0
+DISCOVERY_MAX_HOSTS     = 4096  # a /20, anything bigger is almost certainly a typo
+DISCOVERY_HTTP_PORT     = 80
+DISCOVERY_TCP_PORT      = 8000
+
+REQ_GET_STATUS  = {"comhead":"get status","language":0}
+REQ_GET_NETWORK = {"comhead":"get network","language":0}
+
+
+class DiscoveredMatrix:
+    __slots__ = ("host", "model", "macAddress", "firmware", "tcpPort", "tcpReachable")
+
+    def __init__(self, host: str, model: str, macAddress: str, firmware: str, tcpPort: int, tcpReachable: bool) -> None:
+        self.host = host
+        self.model = model
+        self.macAddress = macAddress
+        self.firmware = firmware
+        self.tcpPort = tcpPort
+        self.tcpReachable = tcpReachable
+
+    @property
+    def IsSupported(self) -> bool:
+        return GetProfile(self.model) is not None
+
+    def __repr__(self):
+        return f"DiscoveredMatrix(host={self.host} model={self.model} MAC={self.macAddress} firmware={self.firmware} tcpPort={self.tcpPort} tcp={self.tcpReachable})"
+
+
+class OreiMatrixDiscovery:
+    # Sweeps an address range for matrices by asking each host's web server for its
+    # status. A fixed pool of workers with short timeouts bounds both the number of
+    # sockets open at once and how long a range full of silent addresses takes.
+    __session: aiohttp.ClientSession
+    __concurrency: int
+    __httpTimeout: float
+    __tcpTimeout: float
+    __httpPort: int
+
+    def __init__(self, session: aiohttp.ClientSession, concurrency: int = DISCOVERY_CONCURRENCY,
+                 httpTimeout: float = DISCOVERY_HTTP_TIMEOUT, tcpTimeout: float = DISCOVERY_TCP_TIMEOUT,
+                 httpPort: int = DISCOVERY_HTTP_PORT) -> None:
+        self.__session = session
+        self.__concurrency = concurrency
+        self.__httpTimeout = httpTimeout
+        self.__tcpTimeout = tcpTimeout
+        self.__httpPort = httpPort
+
+    async def Scan(self, network: str) -> list[DiscoveredMatrix]:
+        # network is CIDR, e.g. "192.168.1.0/24", or a single address
+        net = ipaddress.ip_network(network, strict=False)
+        if net.num_addresses > DISCOVERY_MAX_HOSTS:
+            raise ValueError(f"{network} has {net.num_addresses} addresses, the most we scan is {DISCOVERY_MAX_HOSTS}.")
+
+        hosts = iter(net.hosts() if net.num_addresses > 1 else [net.network_address])
+        found = []
+
+        async def worker() -> None:
+            # Every worker pulls from the same iterator so no host is probed twice
+            for host in hosts:
+                matrix = await self.Probe(str(host))
+                if matrix is not None:
+                    found.append(matrix)
+
+        await asyncio.gather(*(worker() for _ in range(min(self.__concurrency, net.num_addresses))))
+
+        found.sort(key=lambda matrix: ipaddress.ip_address(matrix.host))
+        _LOGGER.info(f"DISCOVERY:Found {len(found)} matrices in {network}")
+        return found
+
+    async def Probe(self, host: str) -> DiscoveredMatrix | None:
+        status = await self.__Post(host, REQ_GET_STATUS)
+        if status is None or "macaddress" not in status:
+            return None
+
+        network = await self.__Post(host, REQ_GET_NETWORK) or {}
+        tcpPort = network.get("tcpport", DISCOVERY_TCP_PORT)
+        model = status.get("model", network.get("model"))
+
+        return DiscoveredMatrix(host, model, status["macaddress"], status.get("version"), tcpPort,
+                                await self.__TcpReachable(host, tcpPort))
+
+    async def __Post(self, host: str, cmd: dict) -> dict | None:
+        url = f"http://{host}/cgi-bin/instr" if self.__httpPort == 80 else f"http://{host}:{self.__httpPort}/cgi-bin/instr"
+        timeout = aiohttp.ClientTimeout(total=self.__httpTimeout)
+
+        try:
+            async with self.__session.post(url, json=cmd, headers={"Accept": "application/json"}, timeout=timeout) as response:
+                if response.status != 200:
+                    return None
+                # Served as text/plain, see OreiMatrixAPI.__web_cmd
+                data = json.loads(await response.text(encoding="utf-8"))
+                return data if isinstance(data, dict) else None
+        except (aiohttp.ClientError, asyncio.TimeoutError, OSError, ValueError):
+            # Nothing there, or something that isn't a matrix
+            return None
+
+    async def __TcpReachable(self, host: str, port: int) -> bool:
+        try:
+            _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), self.__tcpTimeout)
+        except (asyncio.TimeoutError, OSError):
+            return False
+
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+        return True
@@ -0,0 +1,159 @@
+import asyncio
+import collections
+import logging
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+DISPATCH_QUEUE_SIZE     = 256
+DISPATCH_SLOW_THRESHOLD = 0.05  # seconds one delivery may take before it counts as slow
+
+
+class Subscriber:
+    # Delivers notifications to one callback from its own bounded queue, on a later
+    # turn of the event loop rather than inside the TCP reader. A callback that
+    # raises or runs long only hurts itself: the reader never waits for it and
+    # every other subscriber is drained independently.
+    __callback: callable
+    __isCoroutine: bool
+    __coalesce: bool
+    __maxQueue: int
+    __slowThreshold: float
+    __queue: collections.deque
+    __queued: set
+    __scheduled: bool
+    __closed: bool
+    __task: asyncio.Task
+    __counters: collections.Counter
+    __maxLatency: float
+
+    def __init__(self, callback, coalesce: bool = True, maxQueue: int = DISPATCH_QUEUE_SIZE,
+                 slowThreshold: float = DISPATCH_SLOW_THRESHOLD) -> None:
+        self.__callback = callback
+        self.__isCoroutine = asyncio.iscoroutinefunction(callback)
+        # State subscribers only care that something changed, so a notification
+        # identical to one still queued is folded into it. Line subscribers need
+        # every line and don't coalesce.
+        self.__coalesce = coalesce
+        self.__maxQueue = maxQueue
+        self.__slowThreshold = slowThreshold
+        self.__queue = collections.deque()
+        self.__queued = set()
+        self.__scheduled = False
+        self.__closed = False
+        self.__task = None
+        self.__counters = collections.Counter()
+        self.__maxLatency = 0
+
+    @property
+    def callback(self):
+        return self.__callback
+
+    def Deliver(self, *args) -> None:
+        if self.__closed:
+            return
+
+        if self.__coalesce:
+            if args in self.__queued:
+                self.__counters["coalesced"] += 1
+                return
+            self.__queued.add(args)
+
+        if len(self.__queue) >= self.__maxQueue:
+            dropped = self.__queue.popleft()
+            self.__queued.discard(dropped)
+            self.__counters["dropped"] += 1
+
+        self.__queue.append(args)
+
+        if not self.__scheduled:
+            self.__scheduled = True
+            if self.__isCoroutine:
+                self.__task = asyncio.create_task(self.__DrainAsync())
+            else:
+                asyncio.get_running_loop().call_soon(self.__Drain)
+
+    def __Drain(self) -> None:
+        self.__scheduled = False
+
+        # Only what was queued when we started, anything delivered meanwhile gets
+        # its own turn so a busy subscriber can't hold the loop
+        for _ in range(len(self.__queue)):
+            if self.__closed:
+                return
+            args = self.__Pop()
+            start = time.perf_counter()
+            try:
+                self.__callback(*args)
+            except Exception as e:
+                self.__Failed(e)
+            self.__Delivered(start)
+
+    async def __DrainAsync(self) -> None:
+        try:
+            while self.__queue and not self.__closed:
+                args = self.__Pop()
+                start = time.perf_counter()
+                try:
+                    await self.__callback(*args)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    self.__Failed(e)
+                self.__Delivered(start)
+        finally:
+            self.__scheduled = False
+            self.__task = None
+
+    def __Pop(self) -> tuple:
+        args = self.__queue.popleft()
+        self.__queued.discard(args)
+        return args
+
+    def __Failed(self, e: Exception) -> None:
+        self.__counters["errors"] += 1
+        _LOGGER.error(f"Subscriber {self.__callback!r} failed: {e!r}", exc_info=True)
+
+    def __Delivered(self, start: float) -> None:
+        elapsed = time.perf_counter() - start
+        self.__counters["delivered"] += 1
+        if elapsed > self.__maxLatency:
+            self.__maxLatency = elapsed
+        if elapsed > self.__slowThreshold:
+            self.__counters["slow"] += 1
+            if self.__counters["slow"] == 1:
+                _LOGGER.warning(f"Subscriber {self.__callback!r} took {elapsed*1000:.0f}ms, slow deliveries are counted in subscriberStats")
+
+    def Stats(self) -> dict:
+        return {
+            "callback": repr(self.__callback),
+            "queued": len(self.__queue),
+            "delivered": self.__counters["delivered"],
+            "coalesced": self.__counters["coalesced"],
+            "dropped": self.__counters["dropped"],
+            "errors": self.__counters["errors"],
+            "slow": self.__counters["slow"],
+            "maxLatency": self.__maxLatency,
+        }
+
+    def Close(self) -> None:
+        self.__closed = True
+        self.__queue.clear()
+        self.__queued.clear()
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
+
+    def __repr__(self):
+        return f"Subscriber({self.__callback!r} queued={len(self.__queue)})"
+
+
+def RemoveSubscriber(subscribers: list[Subscriber], callback) -> None:
+    # Like list.remove() for the callback a Subscriber wraps, raises ValueError if absent
+    for index, subscriber in enumerate(subscribers):
+        if subscriber.callback == callback:
+            subscriber.Close()
+            del subscribers[index]
+            return
+
+    raise ValueError(f"{callback!r} is not subscribed")
@@ -7,6 +7,20 @@ class TcpConnectedState(IntEnum):
     Connecting = 3,
     Connected = 4
 
+class RefreshMode(IntEnum):
+    Http = 0,
+    Tcp = 1
+
+class QueueOverflowPolicy(IntEnum):
+    DropOldest = 0,
+    Reject = 1,
+    Collapse = 2
+
+class PowerOffPolicy(IntEnum):
+    AutoPowerOn = 0,
+    Defer = 1,
+    FailFast = 2
+
 class DescriptiveIntEnum(IntEnum):
     def __new__(cls, value, description=None):
         member = int.__new__(cls, value)
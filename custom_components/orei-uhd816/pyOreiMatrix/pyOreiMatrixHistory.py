@@ -0,0 +1,177 @@
+import bisect
+import mmap
+import os
+import struct
+import time
+
+HISTORY_CAPACITY    = 16384     # records, about 210 KB
+HISTORY_FILE_MAGIC  = b"OMH1"
+
+# What a record describes. id is an output for routes and links, an input for
+# signals and 0 for power and demands; value is the input id for routes and 0/1
+# otherwise. A demand is a user wanting an idle matrix, see PowerPredictor.
+HISTORY_ROUTE       = 1
+HISTORY_LINK        = 2
+HISTORY_SIGNAL      = 3
+HISTORY_POWER       = 4
+HISTORY_DEMAND      = 5
+
+HISTORY_KIND_NAMES  = {HISTORY_ROUTE: "route", HISTORY_LINK: "link", HISTORY_SIGNAL: "signal", HISTORY_POWER: "power",
+                       HISTORY_DEMAND: "demand"}
+
+# time, kind, id, value
+_RECORD = struct.Struct("<dBHH")
+# magic, capacity, total records ever written
+_HEADER = struct.Struct("<4sIQ")
+
+
+class HistoryRecord:
+    __slots__ = ("time", "kind", "id", "value")
+
+    def __init__(self, time: float, kind: int, id: int, value: int) -> None:
+        self.time = time
+        self.kind = kind
+        self.id = id
+        self.value = value
+
+    @property
+    def kindName(self) -> str:
+        return HISTORY_KIND_NAMES.get(self.kind, str(self.kind))
+
+    def __repr__(self):
+        return f"HistoryRecord(time={self.time:.3f} kind={self.kindName} id={self.id} value={self.value})"
+
+
+class _Timestamps:
+    # Lets bisect search the ring's timestamps without materialising them
+    __slots__ = ("history",)
+
+    def __init__(self, history: 'RoutingHistory') -> None:
+        self.history = history
+
+    def __len__(self) -> int:
+        return len(self.history)
+
+    def __getitem__(self, index: int) -> float:
+        return self.history._TimeAt(index)
+
+
+class RoutingHistory:
+    # An append-only ring of fixed width records of route, link, signal and power
+    # transitions. Timestamps never go backwards so both queries binary search for
+    # their starting point instead of scanning. The ring can be mirrored into a
+    # memory mapped file so history survives a restart; flushing is a single copy.
+    __capacity: int
+    __buffer: bytearray
+    __written: int
+    __lastTime: float
+    __file = None
+    __map: mmap.mmap
+    __dirty: bool
+
+    def __init__(self, capacity: int = HISTORY_CAPACITY) -> None:
+        self.__capacity = capacity
+        self.__buffer = bytearray(capacity * _RECORD.size)
+        self.__written = 0
+        self.__lastTime = 0
+        self.__file = None
+        self.__map = None
+        self.__dirty = False
+
+    @property
+    def capacity(self) -> int:
+        return self.__capacity
+
+    def __len__(self) -> int:
+        return min(self.__written, self.__capacity)
+
+    def Record(self, kind: int, id: int, value: int, when: float = None) -> None:
+        when = time.time() if when is None else when
+        # A clock step backwards must not break the ordering the searches rely on
+        if when < self.__lastTime:
+            when = self.__lastTime
+        self.__lastTime = when
+
+        _RECORD.pack_into(self.__buffer, (self.__written % self.__capacity) * _RECORD.size, when, kind, id, int(value))
+        self.__written += 1
+        self.__dirty = True
+
+    def __Offset(self, index: int) -> int:
+        # index 0 is the oldest record still held
+        first = self.__written - len(self)
+        return ((first + index) % self.__capacity) * _RECORD.size
+
+    def _TimeAt(self, index: int) -> float:
+        return _RECORD.unpack_from(self.__buffer, self.__Offset(index))[0]
+
+    def __At(self, index: int) -> HistoryRecord:
+        return HistoryRecord(*_RECORD.unpack_from(self.__buffer, self.__Offset(index)))
+
+    def Transitions(self, start: float, end: float, kind: int = None, id: int = None) -> list[HistoryRecord]:
+        # Records with start <= time <= end, oldest first, optionally of one kind and id
+        timestamps = _Timestamps(self)
+        first = bisect.bisect_left(timestamps, start)
+        last = bisect.bisect_right(timestamps, end)
+
+        records = []
+        for index in range(first, last):
+            record = self.__At(index)
+            if (kind is None or record.kind == kind) and (id is None or record.id == id):
+                records.append(record)
+        return records
+
+    def StateAt(self, when: float, kind: int, id: int) -> int | None:
+        # The value the last transition at or before `when` set, None if it's older
+        # than anything we still hold
+        index = bisect.bisect_right(_Timestamps(self), when) - 1
+        while index >= 0:
+            record = self.__At(index)
+            if record.kind == kind and record.id == id:
+                return record.value
+            index -= 1
+        return None
+
+    def Clear(self) -> None:
+        self.__written = 0
+        self.__lastTime = 0
+        self.__dirty = True
+
+    # Blocking file IO, Home Assistant runs Open and Close in an executor
+    def Open(self, path: str) -> None:
+        size = _HEADER.size + len(self.__buffer)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        self.__file = os.fdopen(fd, "r+b")
+
+        if os.fstat(fd).st_size != size:
+            self.__file.truncate(size)
+        self.__map = mmap.mmap(fd, size)
+
+        magic, capacity, written = _HEADER.unpack_from(self.__map, 0)
+        if magic == HISTORY_FILE_MAGIC and capacity == self.__capacity and self.__written == 0:
+            # Pick up where the last run left off
+            self.__buffer[:] = self.__map[_HEADER.size:]
+            self.__written = written
+            if written:
+                self.__lastTime = self._TimeAt(len(self) - 1)
+        self.__dirty = True
+        self.Flush()
+
+    def Flush(self) -> None:
+        # A memory copy, the OS writes the dirty pages back in its own time
+        if self.__map is None or not self.__dirty:
+            return
+
+        self.__map[_HEADER.size:] = self.__buffer
+        _HEADER.pack_into(self.__map, 0, HISTORY_FILE_MAGIC, self.__capacity, self.__written)
+        self.__dirty = False
+
+    def Close(self) -> None:
+        if self.__map is None:
+            return
+
+        self.Flush()
+        self.__map.flush()
+        self.__map.close()
+        self.__file.close()
+        self.__map = None
+        self.__file = None
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import random
+import time
+
+_LOGGER = logging.getLogger(__name__)
+
+TIMER_WHEEL_TICK        = 0.1
+TIMER_WHEEL_SLOTS       = 512
+
+MAX_CONCURRENT_STARTUPS = 2
+RECONNECT_BASE_DELAY    = 5
+RECONNECT_SPACING       = 1.0
+RECONNECT_JITTER        = 1.0
+
+
+class TimerHandle:
+    __slots__ = ("callback", "args", "rounds", "cancelled")
+
+    def __init__(self, callback, args, rounds: int):
+        self.callback = callback
+        self.args = args
+        self.rounds = rounds
+        self.cancelled = False
+
+    def Cancel(self) -> None:
+        self.cancelled = True
+
+
+class TimerWheel:
+    # A hashed timer wheel shared by every matrix connection. Rather than waking
+    # every tick it sleeps until the next slot holding a timer, so a connected
+    # matrix costs a wakeup per heartbeat and an idle site none at all. Timers
+    # due now skip the wheel and run on the next pass of the event loop, a
+    # command waits for its sender, not for a tick.
+    __tick: float
+    __slots: list[list[TimerHandle]]
+    __cursor: int
+    __cursorTime: float
+    __pending: int
+    __soon: set
+    __wake: asyncio.TimerHandle
+    __wakeTime: float
+
+    def __init__(self, tick: float = TIMER_WHEEL_TICK, slots: int = TIMER_WHEEL_SLOTS) -> None:
+        self.__tick = tick
+        self.__slots = [[] for _ in range(slots)]
+        self.__cursor = 0
+        self.__cursorTime = 0
+        self.__pending = 0
+        self.__soon = set()
+        self.__wake = None
+        self.__wakeTime = 0
+
+    @property
+    def tick(self) -> float:
+        return self.__tick
+
+    @property
+    def pending(self) -> int:
+        return self.__pending
+
+    def CallLater(self, delay: float, callback, *args) -> TimerHandle:
+        loop = asyncio.get_running_loop()
+
+        if delay <= 0:
+            handle = TimerHandle(callback, args, 0)
+            self.__soon.add(handle)
+            loop.call_soon(self.__FireSoon, handle)
+            return handle
+
+        now = loop.time()
+        if self.__pending == 0:
+            # Nothing was waiting, the cursor starts from now
+            self.__cursorTime = now
+
+        # Counted from the cursor, which lags now while the slots in between are empty
+        ticks = max(1, int((now - self.__cursorTime + delay) / self.__tick + 0.999))
+        slotCount = len(self.__slots)
+        rounds, offset = divmod(ticks, slotCount)
+        if offset == 0:
+            rounds -= 1
+
+        handle = TimerHandle(callback, args, rounds)
+        self.__slots[(self.__cursor + ticks) % slotCount].append(handle)
+        self.__pending += 1
+
+        # Its slot is first visited this many ticks from the cursor
+        first = ticks - rounds * slotCount
+        if self.__wake is None or self.__cursorTime + first * self.__tick < self.__wakeTime:
+            self.__Schedule(loop)
+
+        return handle
+
+    def __Schedule(self, loop: asyncio.AbstractEventLoop) -> None:
+        # Sleep until the next slot with a timer in it, a timer rounds away still
+        # needs its slot visited to count down
+        if self.__wake is not None:
+            self.__wake.cancel()
+            self.__wake = None
+        if self.__pending == 0:
+            return
+
+        slotCount = len(self.__slots)
+        for ticks in range(1, slotCount+1):
+            if self.__slots[(self.__cursor + ticks) % slotCount]:
+                break
+        self.__wakeTime = self.__cursorTime + ticks * self.__tick
+        self.__wake = loop.call_at(self.__wakeTime, self.__Wake)
+
+    def __Wake(self) -> None:
+        loop = asyncio.get_running_loop()
+        self.__wake = None
+
+        # Everything up to the slot we woke for, more if the loop was busy
+        until = max(loop.time(), self.__wakeTime)
+        while self.__pending > 0 and self.__cursorTime + self.__tick <= until:
+            self.__cursorTime += self.__tick
+            self.__Advance()
+
+        self.__Schedule(loop)
+
+    def __Advance(self) -> None:
+        self.__cursor = (self.__cursor + 1) % len(self.__slots)
+        slot = self.__slots[self.__cursor]
+        if not slot:
+            return
+
+        due = []
+        keep = []
+        for handle in slot:
+            if handle.cancelled:
+                self.__pending -= 1
+            elif handle.rounds > 0:
+                handle.rounds -= 1
+                keep.append(handle)
+            else:
+                self.__pending -= 1
+                due.append(handle)
+
+        self.__slots[self.__cursor] = keep
+
+        for handle in due:
+            self.__Fire(handle)
+
+    def __FireSoon(self, handle: TimerHandle) -> None:
+        self.__soon.discard(handle)
+        self.__Fire(handle)
+
+    @staticmethod
+    def __Fire(handle: TimerHandle) -> None:
+        if handle.cancelled:
+            return
+        try:
+            handle.callback(*handle.args)
+        except Exception as e:
+            _LOGGER.error(f"Timer callback {handle.callback!r} failed: {e!r}", exc_info=True)
+
+    def Clear(self) -> None:
+        for slot in self.__slots:
+            for handle in slot:
+                handle.cancelled = True
+            slot.clear()
+        self.__pending = 0
+        for handle in self.__soon:
+            handle.cancelled = True
+        self.__soon.clear()
+
+        if self.__wake is not None:
+            self.__wake.cancel()
+            self.__wake = None
+
+
+class OreiMatrixManager:
+    # Owns every matrix connection in a process: one HTTP client session, one timer
+    # wheel for heartbeats and holdbacks, bounded startup concurrency and staggered
+    # reconnects so a site-wide network blip doesn't reconnect everything at once.
+    __session = None
+    __ownsSession: bool
+    __wheel: TimerWheel
+    __startupSemaphore: asyncio.Semaphore
+    __reconnectSpacing: float
+    __reconnectJitter: float
+    __nextReconnectSlot: float
+    __matrices: dict
+
+    def __init__(self, session=None, maxConcurrentStartups: int = MAX_CONCURRENT_STARTUPS,
+                 reconnectSpacing: float = RECONNECT_SPACING, reconnectJitter: float = RECONNECT_JITTER) -> None:
+        self.__session = session
+        self.__ownsSession = session is None
+        self.__wheel = TimerWheel()
+        self.__startupSemaphore = asyncio.Semaphore(maxConcurrentStartups)
+        self.__reconnectSpacing = reconnectSpacing
+        self.__reconnectJitter = reconnectJitter
+        self.__nextReconnectSlot = 0
+        self.__matrices = {}
+
+    @property
+    def wheel(self) -> TimerWheel:
+        return self.__wheel
+
+    @property
+    def Matrices(self) -> dict:
+        return self.__matrices
+
+    def GetSession(self):
+        if self.__session is None or self.__session.closed:
+            # Only a standalone manager makes its own, Home Assistant hands us its
+            # session, so aiohttp isn't imported until then
+            import aiohttp
+
+            self.__session = aiohttp.ClientSession()
+            self.__ownsSession = True
+
+        return self.__session
+
+    def NextReconnectDelay(self, baseDelay: float = RECONNECT_BASE_DELAY) -> float:
+        # Hand out reconnect slots at least __reconnectSpacing apart, plus jitter
+        now = time.time()
+        slot = max(now + baseDelay, self.__nextReconnectSlot + self.__reconnectSpacing)
+        self.__nextReconnectSlot = slot
+        return slot - now + random.uniform(0, self.__reconnectJitter)
+
+    def AddMatrix(self, key: str, host: str, httpPort: int = 80) -> 'OreiMatrixAPI':
+        from .pyOreiMatrix import OreiMatrixAPI
+
+        if key in self.__matrices:
+            raise KeyError(f"Matrix '{key}' is already managed.")
+
+        api = OreiMatrixAPI(host, manager=self, httpPort=httpPort)
+        self.__matrices[key] = api
+        return api
+
+    def GetMatrix(self, key: str) -> 'OreiMatrixAPI':
+        return self.__matrices.get(key)
+
+    async def Discover(self, network: str, **kwargs) -> list:
+        # Scan a CIDR range for matrices using the shared session, see OreiMatrixDiscovery
+        from .pyOreiMatrixDiscovery import OreiMatrixDiscovery
+
+        return await OreiMatrixDiscovery(self.GetSession(), **kwargs).Scan(network)
+
+    async def StartMatrix(self, key: str) -> bool:
+        api = self.__matrices[key]
+
+        async with self.__startupSemaphore:
+            if not await api.Validate():
+                return False
+            # Over HTTP even when TCP is already up, a preloaded matrix's names
+            # are only as fresh as its description
+            await api.RefreshHttp()
+
+        return True
+
+    async def RemoveMatrix(self, key: str) -> None:
+        api = self.__matrices.pop(key, None)
+        if api is not None:
+            await api.Shutdown()
+
+    async def Shutdown(self) -> None:
+        for key in list(self.__matrices):
+            await self.RemoveMatrix(key)
+
+        self.__wheel.Clear()
+
+        if self.__ownsSession and self.__session is not None:
+            await self.__session.close()
+        self.__session = None
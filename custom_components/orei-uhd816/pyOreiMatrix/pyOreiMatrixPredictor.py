@@ -0,0 +1,343 @@
+import collections
+import time
+
+from .pyOreiMatrixHistory import HISTORY_DEMAND, HISTORY_POWER, RoutingHistory
+
+PREDICTOR_CHECK_INTERVAL = 60       # seconds between Check calls the settings assume
+PREDICTOR_RELEARN_INTERVAL = 3600   # seconds a learned table is used before it's rebuilt
+PREDICTOR_SCHEDULE = "schedule"     # reason for a power on that came from the time of day
+
+DAY = 86400
+WEEK = 7 * DAY
+
+
+class PredictorSettings:
+    # lead:        how far ahead of a predicted use the matrix is powered on, at
+    #              least the time it takes to initialise
+    # keepWarm:    how long a predicted power on waits for a use before the matrix
+    #              is powered off again
+    # slotMinutes: the time of day is learned in slots this long
+    # threshold:   share of past days, or of past same weekdays, with a use in a
+    #              slot for the slot to be predicted; also the share of a trigger's
+    #              firings that must be followed by a use for it to be trusted
+    # minSamples:  uses a slot needs, and firings a trigger gets the benefit of the
+    #              doubt for, before either is judged
+    # days, weeks: how far back the daily and the weekly pattern look
+    # watts:       what the matrix draws while on, for the energy report
+    __slots__ = ("lead", "keepWarm", "slotMinutes", "threshold", "minSamples", "days", "weeks", "watts")
+
+    def __init__(self, lead: float = 60, keepWarm: float = 900, slotMinutes: int = 15, threshold: float = 0.5,
+                 minSamples: int = 2, days: int = 14, weeks: int = 4, watts: float = 30) -> None:
+        self.lead = lead
+        self.keepWarm = keepWarm
+        self.slotMinutes = slotMinutes
+        self.threshold = threshold
+        self.minSamples = minSamples
+        self.days = days
+        self.weeks = weeks
+        self.watts = watts
+
+    def __repr__(self):
+        return (f"PredictorSettings(lead={self.lead}, keepWarm={self.keepWarm}, slotMinutes={self.slotMinutes}, "
+                f"threshold={self.threshold}, minSamples={self.minSamples}, days={self.days}, weeks={self.weeks}, watts={self.watts})")
+
+
+class PowerPredictor:
+    # Powers the matrix on ahead of the times it's usually wanted, so a source
+    # change doesn't sit behind its 20 second initialisation. It learns from the
+    # demands the API records in its RoutingHistory: the first command or power on
+    # a user sends while the matrix is off, or while it's being kept warm. Entities
+    # outside the library, e.g. a TV turning on, can trigger a power on too, and
+    # each trigger is judged by how often a demand follows it.
+    #
+    # It keeps no timers of its own, its owner calls Check about once a minute.
+    __history: RoutingHistory
+    __settings: PredictorSettings
+    __isPowered: callable
+    __powerOn: callable
+    __powerOff: callable
+    __initTime: float
+    __localtime: callable
+
+    def __init__(self, history: RoutingHistory, settings: PredictorSettings, isPowered, powerOn, powerOff,
+                 initTime: float = 20, localtime=time.localtime) -> None:
+        # isPowered() -> bool, powerOn() -> bool if it could be sent, powerOff()
+        self.__history = history
+        self.__settings = settings
+        self.__isPowered = isPowered
+        self.__powerOn = powerOn
+        self.__powerOff = powerOff
+        self.__initTime = initTime
+        self.__localtime = localtime
+
+        self.__warmSince = None         # when a predicted power on went out, until a demand or it expires
+        self.__warmReason = None
+        self.__cooling = False          # kept warm for nothing, being powered off
+        self.__inSession = False        # a user has wanted the matrix since it last went off
+        self.__lastOff = 0
+        self.__lastSlot = None          # a slot is predicted at most once
+        self.__triggers = {}            # name -> when it last fired, until a demand or keepWarm passes
+        self.__daily = None
+        self.__weekly = None
+        self.__learned = 0
+        self.__learnedDays = 0
+        self.__learnedWeeks = 0
+        self.__counters = collections.Counter()
+        self.__triggerCounters = {}     # name -> Counter of fired, followed
+
+    @property
+    def settings(self) -> PredictorSettings:
+        return self.__settings
+
+    @property
+    def IsWarm(self) -> bool:
+        return self.__warmSince is not None
+
+    def __Slot(self, when: float) -> tuple[int, int]:
+        # (weekday, slot of the day) in local time
+        local = self.__localtime(when)
+        return local.tm_wday, (local.tm_hour * 60 + local.tm_min) // self.__settings.slotMinutes
+
+    def __Demands(self, start: float, end: float) -> list[float]:
+        demands = [record.time for record in self.__history.Transitions(start, end, kind=HISTORY_DEMAND)]
+        # Power ons from before the API recorded demands were all somebody's
+        first = demands[0] if demands else end
+        demands[:0] = [record.time for record in self.__history.Transitions(start, first, kind=HISTORY_POWER)
+                       if record.value == 1 and record.time < first]
+        return demands
+
+    def __Learn(self, now: float) -> None:
+        # Per slot, the number of distinct days and of distinct weeks with a demand
+        # in it. Rebuilt from the history every so often rather than kept up to
+        # date, the history is the only copy that survives a restart.
+        settings = self.__settings
+        demands = self.__Demands(now - max(settings.days * DAY, settings.weeks * WEEK), now)
+
+        daily = collections.defaultdict(set)
+        weekly = collections.defaultdict(set)
+        for when in demands:
+            weekday, slot = self.__Slot(when)
+            age = now - when
+            if age <= settings.days * DAY:
+                daily[slot].add(int(age // DAY))
+            if age <= settings.weeks * WEEK:
+                weekly[(weekday, slot)].add(int(age // WEEK))
+
+        self.__daily = {slot: len(days) for slot, days in daily.items()}
+        self.__weekly = {slot: len(weeks) for slot, weeks in weekly.items()}
+        # A new install has seen fewer days than the settings look back over
+        span = now - demands[0] if demands else 0
+        self.__learnedDays = min(settings.days, int(span // DAY) + 1)
+        self.__learnedWeeks = min(settings.weeks, int(span // WEEK) + 1)
+        self.__learned = now
+
+    def Relearn(self) -> None:
+        self.__learned = 0
+
+    def Probability(self, when: float, now: float = None) -> float:
+        # The larger of the share of past days and of past same weekdays with a
+        # demand in the slot `when` falls in, 0 until the slot has minSamples
+        now = time.time() if now is None else now
+        if self.__daily is None or now - self.__learned >= PREDICTOR_RELEARN_INTERVAL:
+            self.__Learn(now)
+
+        weekday, slot = self.__Slot(when)
+        days = self.__daily.get(slot, 0)
+        weeks = self.__weekly.get((weekday, slot), 0)
+        if max(days, weeks) < self.__settings.minSamples:
+            return 0.0
+        return max(days / self.__learnedDays, weeks / self.__learnedWeeks)
+
+    def __Trusted(self, name: str) -> bool:
+        counters = self.__triggerCounters.get(name)
+        if counters is None or counters["fired"] < self.__settings.minSamples:
+            return True
+        return counters["followed"] / counters["fired"] >= self.__settings.threshold
+
+    def __CanWarm(self, now: float) -> bool:
+        # Not while in use, already warming, or soon after somebody powered it off
+        return (not self.__inSession and self.__warmSince is None and not self.__isPowered()
+                and now - self.__lastOff >= self.__settings.keepWarm)
+
+    def __Warm(self, now: float, reason: str) -> bool:
+        if not self.__powerOn():
+            return False
+        self.__warmSince = now
+        self.__warmReason = reason
+        self.__cooling = False
+        self.__counters["predictions"] += 1
+        self.__counters[f"predictions_{PREDICTOR_SCHEDULE if reason == PREDICTOR_SCHEDULE else 'trigger'}"] += 1
+        return True
+
+    def Check(self, now: float = None) -> None:
+        now = time.time() if now is None else now
+        settings = self.__settings
+
+        # A warm matrix nobody used goes off again. It's only a false alarm once
+        # it is off, a demand until then still makes it a hit.
+        if self.__warmSince is not None:
+            if not self.__cooling and now - self.__warmSince >= settings.keepWarm:
+                self.__cooling = True
+                self.__powerOff()
+            elif self.__cooling and not self.__isPowered():
+                self.OnPowerOff(now)
+
+        for name, fired in list(self.__triggers.items()):
+            if now - fired >= settings.keepWarm:
+                del self.__triggers[name]
+
+        slot = self.__Slot(now + settings.lead)
+        if slot != self.__lastSlot and self.__CanWarm(now) and self.Probability(now + settings.lead, now) >= settings.threshold:
+            # A power on that couldn't be sent, e.g. while disconnected, is tried
+            # again on the next Check rather than giving up on the slot
+            if self.__Warm(now, PREDICTOR_SCHEDULE):
+                self.__lastSlot = slot
+
+    def OnTrigger(self, name: str, now: float = None) -> bool:
+        # Something that usually comes before a use happened, e.g. a TV turned on.
+        # True if the matrix is being powered on because of it.
+        now = time.time() if now is None else now
+        if not self.__CanWarm(now):
+            # It can't have helped, so it isn't judged either
+            return False
+
+        counters = self.__triggerCounters.setdefault(name, collections.Counter())
+        counters["fired"] += 1
+        self.__triggers[name] = now
+        return self.__Trusted(name) and self.__Warm(now, name)
+
+    def OnDemand(self, now: float = None) -> None:
+        # A user wants the matrix, only the first demand of a session counts
+        now = time.time() if now is None else now
+        if self.__inSession:
+            return
+        if self.__warmSince is None and self.__isPowered():
+            # On without us or a recorded demand, e.g. from the front panel
+            return
+
+        self.__inSession = True
+        self.__history.Record(HISTORY_DEMAND, 0, 1, now)
+        self.__lastSlot = self.__Slot(now)
+        self.__learned = 0
+
+        if self.__warmSince is not None:
+            waited = now - self.__warmSince
+            self.__counters["hits"] += 1
+            self.__counters["warm_seconds"] += waited
+            self.__counters["hidden_seconds"] += min(waited, self.__initTime)
+            self.__warmSince = None
+            self.__cooling = False
+        else:
+            self.__counters["cold_starts"] += 1
+
+        for name, fired in self.__triggers.items():
+            self.__triggerCounters[name]["followed"] += 1
+        self.__triggers.clear()
+
+    def OnPowerOff(self, now: float = None) -> None:
+        now = time.time() if now is None else now
+        self.__inSession = False
+        self.__lastOff = now
+        if self.__warmSince is not None:
+            # By us once keeping it warm expired, or by somebody else before then
+            self.__counters["false_alarms"] += 1
+            self.__counters["warm_seconds"] += now - self.__warmSince
+            self.__warmSince = None
+            self.__cooling = False
+
+    def Report(self) -> dict:
+        # How often a power on was predicted right, and what keeping it warm cost
+        counters = self.__counters
+        predictions = counters["predictions"]
+        hits = counters["hits"]
+        demands = hits + counters["cold_starts"]
+        return {
+            "predictions": predictions,
+            "predictions_schedule": counters["predictions_schedule"],
+            "predictions_trigger": counters["predictions_trigger"],
+            "hits": hits,
+            "false_alarms": counters["false_alarms"],
+            "cold_starts": counters["cold_starts"],
+            "precision": round(hits / predictions, 3) if predictions else None,
+            "recall": round(hits / demands, 3) if demands else None,
+            "hidden_seconds": round(counters["hidden_seconds"], 1),
+            "warm_seconds": round(counters["warm_seconds"], 1),
+            "warm_wh": round(counters["warm_seconds"] * self.__settings.watts / 3600, 2),
+            "warm": self.__warmReason if self.__warmSince is not None else None,
+            "triggers": {
+                name: {"fired": counts["fired"], "followed": counts["followed"], "trusted": self.__Trusted(name)}
+                for name, counts in sorted(self.__triggerCounters.items())
+            },
+        }
+
+    def State(self) -> dict:
+        # What Restore needs to carry the report and trigger judgements over a restart
+        return {
+            "counters": dict(self.__counters),
+            "triggers": {name: dict(counts) for name, counts in self.__triggerCounters.items()},
+        }
+
+    def Restore(self, state: dict) -> None:
+        self.__counters = collections.Counter(state.get("counters", {}))
+        self.__triggerCounters = {name: collections.Counter(counts) for name, counts in state.get("triggers", {}).items()}
+
+    def ResetReport(self) -> None:
+        self.__counters.clear()
+        self.__triggerCounters.clear()
+
+
+def ReplayPredictor(demands: list[float], settings: PredictorSettings, start: float, end: float,
+                    session: float = 3600, initTime: float = 20, triggers: dict[str, list[float]] = None,
+                    localtime=time.localtime) -> dict:
+    # Runs a predictor over recorded or made up demands on a simulated clock and
+    # returns its report, to tune the settings without waiting weeks. Each demand
+    # starts a session that keeps the matrix on for `session` seconds. Demands
+    # before `start` are only learned from.
+    history = RoutingHistory(capacity=max(1024, 2 * len(demands)))
+    for when in demands:
+        if when < start:
+            history.Record(HISTORY_DEMAND, 0, 1, when)
+
+    power = {"on": False}
+    predictor = PowerPredictor(
+        history, settings,
+        isPowered=lambda: power["on"],
+        powerOn=lambda: power.update(on=True) or True,
+        powerOff=lambda: power.update(on=False, off=True),
+        initTime=initTime, localtime=localtime,
+    )
+
+    events = [(when, 1, "demand") for when in demands if start <= when < end]
+    for name, times in (triggers or {}).items():
+        events += [(when, 0, name) for when in times if start <= when < end]
+    events.sort()
+
+    now = start
+    off = None
+    index = 0
+    while now < end:
+        step = min(now + PREDICTOR_CHECK_INTERVAL, end)
+        while index < len(events) and events[index][0] < step:
+            when, _, name = events[index]
+            index += 1
+            if off is not None and when >= off:
+                power["on"] = False
+                predictor.OnPowerOff(off)
+                off = None
+            if name == "demand":
+                predictor.OnDemand(when)
+                power["on"] = True
+                off = max(off or 0, when + session)
+            else:
+                predictor.OnTrigger(name, when)
+        if off is not None and step >= off:
+            power["on"] = False
+            predictor.OnPowerOff(off)
+            off = None
+        now = step
+        predictor.Check(now)
+        if power.pop("off", False):
+            # As the API reports the predictor's own power off
+            predictor.OnPowerOff(now)
+
+    return predictor.Report()
@@ -0,0 +1,332 @@
+import re
+
+from .pyOreiMatrixEnums import EDID
+
+# How each named template parameter looks on the wire and what it becomes once
+# parsed. Anything not listed is a single token kept as a string; `{name*}`
+# takes the rest of the line and `{name:regex}` overrides the pattern.
+STATE_VALUES = {
+    "on": 1, "off": 0,
+    "connect": 1, "disconnect": 0,
+    "enable": 1, "disable": 0,
+    "lock": 1, "unlock": 0,
+}
+
+PARAM_TYPES = {
+    "input":  (r"\d+", int),
+    "output": (r"\d+", int),
+    "edid":   (r"\d+", int),
+    "on":     (r"[01]", int),
+    "cable":  (r"hdmi|cat", str.lower),
+    "state":  ("|".join(STATE_VALUES), lambda v: STATE_VALUES[v.lower()]),
+}
+DEFAULT_PARAM_TYPE  = (r"\S+", str)
+REST_PARAM_TYPE     = (r".+", str)
+
+_PLACEHOLDER    = re.compile(r"\{(\w+)(\*|:[^}]*)?\}")
+_LEADING_WORD   = re.compile(r"[A-Za-z]*")
+
+
+def DispatchKey(text: str) -> str:
+    # Lines are bucketed on their leading letters so each one is only tried
+    # against the handful of patterns that could possibly match it
+    return _LEADING_WORD.match(text).group().lower()
+
+
+class Template:
+    # One line of the protocol, e.g. "input {input} -> output {output}", compiled
+    # once into a regex for parsing while keeping the original for formatting.
+    __slots__ = ("text", "pattern", "converters", "key")
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self.converters = {}
+
+        regex = []
+        position = 0
+        for match in _PLACEHOLDER.finditer(text):
+            name, modifier = match.group(1), match.group(2)
+            if modifier == "*":
+                pattern, convert = REST_PARAM_TYPE
+            else:
+                pattern, convert = PARAM_TYPES.get(name, DEFAULT_PARAM_TYPE)
+                if modifier:
+                    pattern = modifier[1:]
+
+            regex.append(re.escape(text[position:match.start()]))
+            regex.append(f"(?P<{name}>{pattern})")
+            self.converters[name] = convert
+            position = match.end()
+        regex.append(re.escape(text[position:]))
+
+        self.pattern = re.compile("^" + "".join(regex) + "$", re.IGNORECASE)
+        # None when the line starts with a parameter, those are tried for every line
+        self.key = DispatchKey(text) if not text.startswith("{") else None
+
+    def Match(self, line: str) -> dict | None:
+        match = self.pattern.match(line)
+        if match is None:
+            return None
+        return {name: self.converters[name](value) for name, value in match.groupdict().items()}
+
+    def Format(self, params: dict) -> str:
+        return _PLACEHOLDER.sub(lambda match: str(params[match.group(1)]), self.text)
+
+    def __repr__(self):
+        return f"Template({self.text!r})"
+
+
+class Confirmation:
+    # The response that proves a command was acted on: an event plus the values its
+    # fields must have, e.g. ("route", (("input", 3), ("output", 2)))
+    __slots__ = ("event", "expected")
+
+    def __init__(self, event: str, expected: tuple) -> None:
+        self.event = event
+        self.expected = expected
+
+    def Matches(self, event: str, values: dict) -> bool:
+        if event != self.event:
+            return False
+        for name, value in self.expected:
+            if values.get(name) != value:
+                return False
+        return True
+
+    def __repr__(self):
+        return f"Confirmation({self.event!r}, {self.expected!r})"
+
+
+class CommandSpec:
+    # template: what is sent, e.g. "s in {input} av out {output}"
+    # confirm:  (event, {field: param}), a str value names a command parameter and
+    #           anything else is a literal, e.g. ("route", {"output": "output"})
+    # collapse: parameters that identify the state the command sets, commands with
+    #           equal values replace each other in the queue. None only collapses
+    #           identical commands.
+    # read:     changes nothing so the matrix answers it even while it's off
+    __slots__ = ("name", "template", "confirm", "collapse", "read")
+
+    def __init__(self, name: str, template: str, confirm: tuple = None, collapse: tuple = None, read: bool = False) -> None:
+        self.name = name
+        self.template = Template(template)
+        self.confirm = confirm
+        self.collapse = collapse
+        self.read = read
+
+
+class MatrixCommand:
+    __slots__ = ("name", "text", "key", "confirm", "isRead")
+
+    def __init__(self, name: str | None, text: str, key, confirm: Confirmation | None, isRead: bool) -> None:
+        self.name = name
+        self.text = text
+        self.key = key
+        self.confirm = confirm
+        self.isRead = isRead
+
+    def __repr__(self):
+        return f"MatrixCommand({self.text!r})"
+
+
+class ModelProfile:
+    # Everything that differs between matrix models: port counts, the command and
+    # response vocabulary, the EDID table and the device's timing. The parser and
+    # command builder are generated from it so every model runs on the same engine.
+    __models: tuple[str, ...]
+    __inputCount: int
+    __outputCount: int
+    __edid: type
+    __commands: dict[str, CommandSpec]
+    __responses: tuple
+    __dispatch: dict[str, tuple]
+    __wildcards: tuple
+    __edidsByDescription: dict
+    __edidsByName: dict
+
+    def __init__(self, models: tuple[str, ...], inputs: int, outputs: int, edid: type,
+                 commands: list[CommandSpec], responses: list[tuple[str, str]],
+                 commandDelimiter: str = "!\r\n", lineDelimiter: str = "\r\n", readPrefix: str = "r ",
+                 connectHoldback: float = 2, powerOnHoldback: float = 5, initHoldback: float = 20,
+                 heartbeatIdle: float = 10, confirmTimeout: float = 3.0,
+                 sendRate: float = 5.0, sendBurst: float = 2) -> None:
+        self.__models = tuple(models)
+        self.__inputCount = inputs
+        self.__outputCount = outputs
+        self.__edid = edid
+        self.__commands = {spec.name: spec for spec in commands}
+        self.__responses = tuple((event, Template(text)) for event, text in responses)
+
+        self.commandDelimiter = commandDelimiter
+        self.lineDelimiter = lineDelimiter
+        self.readPrefix = readPrefix
+        self.connectHoldback = connectHoldback
+        self.powerOnHoldback = powerOnHoldback
+        self.initHoldback = initHoldback
+        self.heartbeatIdle = heartbeatIdle
+        self.confirmTimeout = confirmTimeout
+        # Commands per second, and how many may go back to back, until the model
+        # or firmware has been calibrated, see pyOreiMatrixCalibrate
+        self.sendRate = sendRate
+        self.sendBurst = sendBurst
+
+        self.__wildcards = tuple(response for response in self.__responses if response[1].key is None)
+        buckets = {}
+        for response in self.__responses:
+            if response[1].key is not None:
+                buckets.setdefault(response[1].key, []).append(response)
+        self.__dispatch = {key: tuple(bucket) + self.__wildcards for key, bucket in buckets.items()}
+
+        self.__edidsByDescription = {edid.describe: edid for edid in self.__edid}
+        self.__edidsByName = {edid.name: edid for edid in self.__edid}
+
+    @property
+    def models(self) -> tuple[str, ...]:
+        return self.__models
+
+    @property
+    def inputCount(self) -> int:
+        return self.__inputCount
+
+    @property
+    def outputCount(self) -> int:
+        return self.__outputCount
+
+    @property
+    def edid(self) -> type:
+        return self.__edid
+
+    def EdidFromDescription(self, description: str):
+        return self.__edidsByDescription.get(description)
+
+    def EdidFromText(self, text: str):
+        # An EDID by member name, description or table number, as a user might
+        # give it, None if it's none of those
+        text = str(text).strip()
+        # Not `or`, the first EDID is a falsy 0
+        edid = self.__edidsByName.get(text)
+        if edid is None:
+            edid = self.__edidsByDescription.get(text)
+        if edid is None and text.isdigit():
+            try:
+                edid = self.__edid(int(text))
+            except ValueError:
+                pass
+        return edid
+
+    def Build(self, name: str, **params) -> MatrixCommand:
+        spec = self.__commands[name]
+        params = {key: int(value) if isinstance(value, bool) else value for key, value in params.items()}
+        text = spec.template.Format(params)
+
+        if spec.collapse is None:
+            key = text
+        else:
+            key = (name,) + tuple(params[param] for param in spec.collapse)
+
+        confirm = None
+        if spec.confirm is not None:
+            event, fields = spec.confirm
+            expected = {field: params[value] if isinstance(value, str) else value for field, value in fields.items()}
+            # Port 0 means every output or input and the matrix echoes each in turn,
+            # the last echo is the one that says it has finished
+            if expected.get("output") == 0:
+                expected["output"] = self.__outputCount
+            if expected.get("input") == 0:
+                expected["input"] = self.__inputCount
+            confirm = Confirmation(event, tuple(expected.items()))
+
+        return MatrixCommand(name, text, key, confirm, spec.read)
+
+    def ParseCommand(self, text: str) -> MatrixCommand:
+        # Turn raw text, e.g. from a proxy client, back into a command so it is
+        # confirmed and collapsed like one we built ourselves
+        for spec in self.__commands.values():
+            params = spec.template.Match(text)
+            if params is not None:
+                return self.Build(spec.name, **params)
+
+        return MatrixCommand(None, text, text, None, text.startswith(self.readPrefix))
+
+    def ParseResponse(self, line: str) -> tuple[str | None, dict | None]:
+        # (event, values) for a line from the matrix, (None, None) if it's unknown
+        for event, template in self.__dispatch.get(DispatchKey(line), self.__wildcards):
+            values = template.Match(line)
+            if values is not None:
+                return event, values
+
+        return None, None
+
+    def __repr__(self):
+        return f"ModelProfile(models={self.__models!r} inputs={self.__inputCount} outputs={self.__outputCount})"
+
+
+def OreiProfile(models: tuple[str, ...], inputs: int, outputs: int, edid: type = EDID, **timings) -> ModelProfile:
+    # The command set shared by the OREI UHD matrices, only the size, EDID table
+    # and timing differ between models
+    return ModelProfile(
+        models, inputs, outputs, edid,
+        commands=[
+            # Reads
+            CommandSpec("status",       "r status",             confirm=("firmware", {}), read=True),
+            CommandSpec("heartbeat",    "r power",              confirm=("power", {}), read=True),
+            CommandSpec("read_streams", "r {cable} 0 stream",   confirm=("stream", {"cable": "cable", "output": outputs}), read=True),
+            CommandSpec("read_edids",   "r edid in 0",          confirm=("edid", {"input": inputs}), read=True),
+            CommandSpec("read_edid",    "r edid in {input}",    confirm=("edid", {"input": "input"}), read=True),
+            # Writes
+            CommandSpec("power_on",     "s power 1"),
+            CommandSpec("power_off",    "s power 0"),
+            CommandSpec("beep",         "s beep {on}",          confirm=("beep", {"state": "on"}), collapse=()),
+            CommandSpec("lock",         "s lock {on}",          confirm=("panel_lock", {"state": "on"}), collapse=()),
+            CommandSpec("route",        "s in {input} av out {output}",
+                        confirm=("route", {"input": "input", "output": "output"}), collapse=("output",)),
+            CommandSpec("stream",       "s {cable} {output} stream {on}",
+                        confirm=("stream", {"cable": "cable", "output": "output", "state": "on"}), collapse=("cable", "output")),
+            CommandSpec("edid",         "s edid in {input} from {edid}",
+                        confirm=("edid", {"input": "input"}), collapse=("input",)),
+        ],
+        responses=[
+            ("power",           "power {state:on|off}"),
+            ("beep",            "beep {state:on|off}"),
+            ("panel_lock",      "Panel {state:lock|unlock}"),
+            ("panel_lock",      "panel button lock {state:on|off}"),
+            ("route",           "input {input} -> output {output}"),
+            ("edid",            "input {input} edid: {value*}"),
+            ("input_link",      "hdmi input {input}: {state:connect|disconnect}"),
+            ("output_link",     "{cable} output {output}: {state:connect|disconnect}"),
+            ("stream",          "{state:enable|disable} {cable} output {output} stream"),
+            ("ip_address",      "IP:{value}"),
+            ("ip_mode",         "IP Mode: {value}"),
+            ("ip_gateway",      "Gateway:{value}"),
+            ("subnet_mask",     "Subnet Mask:{value}"),
+            ("firmware",        "FW version {value*}"),
+            ("initializing",    "System Initializing..."),
+            ("initialized",     "Initialization Finished!"),
+            # Safe to ignore
+            ("ignore",          "Get the unit all status:"),
+            ("ignore",          "TCP/IP port={value}"),
+            ("ignore",          "Telnet port={value}"),
+            ("ignore",          "Mac address:{value*}"),
+            ("ignore",          "E00"),
+        ],
+        **timings)
+
+
+_PROFILES: dict[str, ModelProfile] = {}
+
+
+def RegisterProfile(profile: ModelProfile) -> None:
+    for model in profile.models:
+        _PROFILES[model] = profile
+
+
+def GetProfile(model: str) -> ModelProfile | None:
+    return _PROFILES.get(model)
+
+
+def SupportedModels() -> tuple[str, ...]:
+    return tuple(_PROFILES)
+
+
+DEFAULT_PROFILE = OreiProfile(("HDP-MXB88D70M",), inputs=8, outputs=8)
+RegisterProfile(DEFAULT_PROFILE)
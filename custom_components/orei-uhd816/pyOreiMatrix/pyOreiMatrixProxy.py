@@ -0,0 +1,194 @@
+import asyncio
+import logging
+
+from .pyOreiMatrix import OreiMatrixAPI
+from .pyOreiMatrixRateLimit import TokenBucket
+from .pyOreiMatrixSendQueue import MatrixPoweredOffError, SendQueueFullError
+
+_LOGGER = logging.getLogger(__name__)
+
+PROXY_DEFAULT_PORT          = 8000
+PROXY_MAX_CLIENTS           = 8
+PROXY_CLIENT_RATE           = 5.0   # commands per second, per client
+PROXY_CLIENT_BURST          = 10
+PROXY_CLIENT_MAX_BUFFER     = 64 * 1024
+PROXY_CLIENT_MAX_COMMAND    = 1024  # characters a client may send without a '!'
+PROXY_LINE_DELIMITER        = "\r\n"
+
+
+class ProxyClient:
+    __writer: asyncio.StreamWriter
+    __bucket: TokenBucket
+    __peer: str
+    __commands: int
+    __rateLimited: int
+
+    def __init__(self, writer: asyncio.StreamWriter, rate: float, burst: float) -> None:
+        self.__writer = writer
+        self.__bucket = TokenBucket(rate, burst)
+        self.__peer = f"{writer.get_extra_info('peername')!r}"
+        self.__commands = 0
+        self.__rateLimited = 0
+
+    @property
+    def peer(self) -> str:
+        return self.__peer
+
+    @property
+    def writer(self) -> asyncio.StreamWriter:
+        return self.__writer
+
+    @property
+    def commands(self) -> int:
+        return self.__commands
+
+    @property
+    def rateLimited(self) -> int:
+        return self.__rateLimited
+
+    def Reply(self, line: str) -> None:
+        # To this client only, unlike what the matrix says
+        self.__writer.write(f"{line}{PROXY_LINE_DELIMITER}".encode())
+
+    def Admit(self) -> bool:
+        if self.__bucket.TryTake():
+            self.__commands += 1
+            return True
+
+        self.__rateLimited += 1
+        return False
+
+    def __repr__(self):
+        return f"ProxyClient(peer={self.__peer} commands={self.__commands} rateLimited={self.__rateLimited})"
+
+
+class OreiMatrixProxy:
+    # Shares the single upstream connection owned by an OreiMatrixAPI with any number
+    # of local controllers. Everything the matrix says is broadcast to every client
+    # and their commands are fed through the API's send queue, rate limited per client.
+    __api: OreiMatrixAPI
+    __host: str
+    __port: int
+    __maxClients: int
+    __clientRate: float
+    __clientBurst: float
+    __server: asyncio.AbstractServer
+    __clients: list[ProxyClient]
+
+    def __init__(self, api: OreiMatrixAPI, host: str = "0.0.0.0", port: int = PROXY_DEFAULT_PORT,
+                 maxClients: int = PROXY_MAX_CLIENTS, clientRate: float = PROXY_CLIENT_RATE,
+                 clientBurst: float = PROXY_CLIENT_BURST) -> None:
+        self.__api = api
+        self.__host = host
+        self.__port = port
+        self.__maxClients = maxClients
+        self.__clientRate = clientRate
+        self.__clientBurst = clientBurst
+        self.__server = None
+        self.__clients = []
+
+    @property
+    def port(self) -> int:
+        return self.__port
+
+    @property
+    def clients(self) -> list[ProxyClient]:
+        return list(self.__clients)
+
+    async def Start(self) -> None:
+        if self.__server is not None:
+            return
+
+        self.__server = await asyncio.start_server(self.__HandleClient, self.__host, self.__port)
+        # Port 0 asks the OS for a free port, report the one we actually got
+        self.__port = self.__server.sockets[0].getsockname()[1]
+        self.__api.SubscribeToLines(self.__Broadcast)
+        _LOGGER.info(f"PROXY:Listening on {self.__host}:{self.__port} for {self.__api.host}")
+
+    async def Stop(self) -> None:
+        if self.__server is None:
+            return
+
+        self.__api.UnsubscribeFromLines(self.__Broadcast)
+        self.__server.close()
+
+        for client in list(self.__clients):
+            client.writer.close()
+
+        await self.__server.wait_closed()
+        self.__server = None
+        _LOGGER.info(f"PROXY:Stopped on port {self.__port}")
+
+    def __Broadcast(self, line: str) -> None:
+        data = f"{line}{PROXY_LINE_DELIMITER}".encode()
+
+        for client in list(self.__clients):
+            transport = client.writer.transport
+            # A client that can't keep up is dropped rather than buffering without bound
+            if transport.get_write_buffer_size() > PROXY_CLIENT_MAX_BUFFER:
+                _LOGGER.warning(f"PROXY:Dropping slow client {client.peer}")
+                client.writer.close()
+                continue
+
+            client.writer.write(data)
+
+    def __Forward(self, client: ProxyClient, command: str) -> None:
+        if not client.Admit():
+            # Told like any other refusal, so a throttled command isn't taken for a lost one
+            _LOGGER.debug(f"PROXY:Rate limited {client.peer} {command!r}")
+            client.Reply("error: Rate limited, slow down")
+            return
+
+        try:
+            parsed = self.__api.profile.ParseCommand(command)
+            # Power is owned by the API so that it can manage the initialization holdback
+            if parsed.name == "power_on":
+                self.__api.CmdPowerOn()
+            elif parsed.name == "power_off":
+                self.__api.CmdPowerOff()
+            else:
+                self.__api.CmdSend(parsed)
+        except (BrokenPipeError, MatrixPoweredOffError, SendQueueFullError) as error:
+            # Not connected, or refused by the power off or overflow policy
+            reason = str(error) or "Matrix not connected"
+            _LOGGER.warning(f"PROXY:Dropped {command!r} from {client.peer}: {reason}")
+            client.Reply(f"error: {reason}")
+
+    async def __HandleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        if len(self.__clients) >= self.__maxClients:
+            _LOGGER.warning(f"PROXY:Refusing {writer.get_extra_info('peername')!r}, {self.__maxClients} clients connected")
+            writer.close()
+            return
+
+        client = ProxyClient(writer, self.__clientRate, self.__clientBurst)
+        self.__clients.append(client)
+        _LOGGER.info(f"PROXY:Client connected {client.peer}")
+
+        buffer = ""
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+
+                # Commands are terminated by '!', any CR/LF around them is noise
+                buffer += data.decode(errors="ignore")
+                *commands, buffer = buffer.split("!")
+
+                for command in commands:
+                    command = command.strip()
+                    if command:
+                        self.__Forward(client, command)
+
+                # No command is this long, whatever is sending it isn't a controller
+                if len(buffer) > PROXY_CLIENT_MAX_COMMAND:
+                    _LOGGER.warning(f"PROXY:Dropping client {client.peer}, {len(buffer)} characters without a '!'")
+                    break
+
+        except (ConnectionError, BrokenPipeError) as e:
+            _LOGGER.debug(f"PROXY:Client {client.peer} error {e!r}")
+
+        finally:
+            self.__clients.remove(client)
+            writer.close()
+            _LOGGER.info(f"PROXY:Client disconnected {client!r}")
@@ -0,0 +1,76 @@
+import time
+
+
+class TokenBucket:
+    # Classic token bucket: `rate` tokens per second refill up to `burst` tokens.
+    __rate: float
+    __burst: float
+    __tokens: float
+    __updated: float
+
+    def __init__(self, rate: float, burst: float) -> None:
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = burst
+        self.__updated = time.monotonic()
+
+    @property
+    def rate(self) -> float:
+        return self.__rate
+
+    @property
+    def burst(self) -> float:
+        return self.__burst
+
+    @property
+    def tokens(self) -> float:
+        self.__Refill(time.monotonic())
+        return self.__tokens
+
+    def Configure(self, rate: float, burst: float) -> None:
+        self.__Refill(time.monotonic())
+        self.__rate = rate
+        self.__burst = burst
+        self.__tokens = min(self.__tokens, burst)
+
+    def __Refill(self, now: float) -> None:
+        elapsed = now - self.__updated
+        if elapsed > 0:
+            self.__tokens = min(self.__burst, self.__tokens + elapsed * self.__rate)
+            self.__updated = now
+
+    def TryTake(self, count: float = 1) -> bool:
+        self.__Refill(time.monotonic())
+
+        if self.__tokens >= count:
+            self.__tokens -= count
+            return True
+
+        return False
+
+    def TimeUntilAvailable(self, count: float = 1) -> float:
+        self.__Refill(time.monotonic())
+
+        if self.__tokens >= count:
+            return 0
+        if self.__rate <= 0:
+            return float("inf")
+
+        return (count - self.__tokens) / self.__rate
+
+
+# Calibrated send rates, (rate, burst) by (model, firmware). A firmware of None
+# stands for every firmware of that model.
+_RATE_LIMITS: dict[tuple[str, str | None], tuple[float, float]] = {}
+
+
+def RegisterRateLimit(model: str, firmware: str | None, rate: float, burst: float) -> None:
+    _RATE_LIMITS[(model, firmware)] = (rate, burst)
+
+
+def GetRateLimit(model: str, firmware: str | None) -> tuple[float, float] | None:
+    # The firmware's own limit, else the model's, else None for the profile default
+    limit = _RATE_LIMITS.get((model, firmware))
+    if limit is None:
+        limit = _RATE_LIMITS.get((model, None))
+    return limit
@@ -0,0 +1,295 @@
+import asyncio
+import collections
+import time
+
+from .pyOreiMatrixEnums import QueueOverflowPolicy
+from .pyOreiMatrixProfiles import MatrixCommand
+
+SEND_QUEUE_MAX_SIZE     = 64
+SEND_QUEUE_TTL          = 30.0
+
+DROP_EXPIRED            = "expired"
+DROP_OVERFLOW           = "overflow"
+DROP_REJECTED           = "rejected"
+DROP_COLLAPSED          = "collapsed"
+DROP_POWERED_OFF        = "powered_off"
+DROP_DISCONNECTED       = "disconnected"
+DROP_NOT_CONFIRMED      = "failed"
+
+
+class SendQueueFullError(Exception):
+    pass
+
+
+class MatrixPoweredOffError(Exception):
+    pass
+
+
+class PendingCommand:
+    __slots__ = ("text", "key", "isRead", "enqueued", "ttl", "expires", "deferred", "dead", "confirm", "attempts", "sent",
+                 "deadline", "futures")
+
+    def __init__(self, command: MatrixCommand, enqueued: float, ttl: float, expires: float, deferred: bool = False) -> None:
+        self.text = command.text
+        self.key = command.key
+        self.isRead = command.isRead
+        self.enqueued = enqueued
+        self.ttl = ttl
+        self.expires = expires
+        self.deferred = deferred
+        self.dead = False
+        self.confirm = command.confirm
+        self.attempts = 0
+        self.sent = 0
+        self.deadline = 0
+        self.futures = []
+
+    def Resolve(self, result: bool) -> None:
+        # Futures learn whether the matrix acted on the command, they never raise
+        for future in self.futures:
+            if not future.done():
+                future.set_result(result)
+        self.futures.clear()
+
+    def __repr__(self):
+        return f"PendingCommand({self.text!r} expires={self.expires:.1f} attempts={self.attempts})"
+
+
+class SendQueue:
+    # A bounded FIFO of commands waiting for the matrix. Every entry has a time to
+    # live so nothing stale gets replayed, and a full queue is handled by policy
+    # rather than growing without bound. Dropped commands are counted by reason.
+    #
+    # The overflow policy only applies once maxSize is reached. Collapse then
+    # folds the new command into a queued one for the same state, e.g. the same
+    # output's route, and drops the oldest if there is none. supersede does that
+    # folding on every Put, for callers that only care about the latest state.
+    #
+    # A command put while the matrix can't take it yet, e.g. while it powers on,
+    # is deferred: its time to live only starts once Ready is called, it is given
+    # the `wait` it was put with to get there.
+    __maxSize: int
+    __ttl: float
+    __overflowPolicy: QueueOverflowPolicy
+    __supersede: bool
+    __entries: collections.deque
+    __byKey: dict
+    __live: int
+    __deferred: int
+    __counters: dict
+
+    def __init__(self, maxSize: int = SEND_QUEUE_MAX_SIZE, ttl: float = SEND_QUEUE_TTL,
+                 overflowPolicy: QueueOverflowPolicy = QueueOverflowPolicy.Collapse, supersede: bool = False) -> None:
+        self.__maxSize = maxSize
+        self.__ttl = ttl
+        self.__overflowPolicy = overflowPolicy
+        self.__supersede = supersede
+        self.__entries = collections.deque()
+        self.__byKey = {}
+        self.__live = 0
+        self.__deferred = 0
+        self.__counters = collections.Counter()
+
+    def Configure(self, maxSize: int = None, ttl: float = None, overflowPolicy: QueueOverflowPolicy = None,
+                  supersede: bool = None) -> None:
+        if maxSize is not None:
+            self.__maxSize = maxSize
+        if ttl is not None:
+            self.__ttl = ttl
+        if overflowPolicy is not None:
+            self.__overflowPolicy = overflowPolicy
+        if supersede is not None:
+            self.__supersede = supersede
+
+    @property
+    def maxSize(self) -> int:
+        return self.__maxSize
+
+    @property
+    def ttl(self) -> float:
+        return self.__ttl
+
+    @property
+    def overflowPolicy(self) -> QueueOverflowPolicy:
+        return self.__overflowPolicy
+
+    @property
+    def supersede(self) -> bool:
+        return self.__supersede
+
+    @property
+    def counters(self) -> dict:
+        return dict(self.__counters)
+
+    def Count(self, reason: str, n: int = 1) -> None:
+        self.__counters[reason] += n
+
+    def __len__(self) -> int:
+        return self.__live
+
+    def Put(self, command: MatrixCommand, ttl: float = None, future: asyncio.Future = None,
+            wait: float = None) -> PendingCommand:
+        # wait: defer the command, see Ready, for at most this long
+        now = time.time()
+        key = command.key
+        ttl = self.__ttl if ttl is None else ttl
+        deferred = wait is not None
+        expires = now + ttl + (wait if deferred else 0)
+
+        if self.__supersede:
+            existing = self.__Supersede(command, ttl, expires, deferred, future)
+            if existing is not None:
+                return existing
+
+        if self.__live >= self.__maxSize:
+            self.__Purge(now)
+
+        if self.__live >= self.__maxSize:
+            if self.__overflowPolicy == QueueOverflowPolicy.Reject:
+                self.__counters[DROP_REJECTED] += 1
+                if future is not None:
+                    future.set_result(False)
+                raise SendQueueFullError(f"Send queue full ({self.__maxSize}), rejected {command.text!r}")
+            if self.__overflowPolicy == QueueOverflowPolicy.Collapse:
+                existing = self.__Supersede(command, ttl, expires, deferred, future)
+                if existing is not None:
+                    return existing
+            self.__Kill(self.__PopOldest(), DROP_OVERFLOW)
+
+        entry = PendingCommand(command, now, ttl, expires, deferred)
+        if future is not None:
+            entry.futures.append(future)
+        self.__entries.append(entry)
+        self.__byKey[key] = entry
+        self.__live += 1
+        self.__deferred += deferred
+        self.__counters["enqueued"] += 1
+        return entry
+
+    def __Supersede(self, command: MatrixCommand, ttl: float, expires: float, deferred: bool,
+                    future: asyncio.Future) -> PendingCommand | None:
+        existing = self.__byKey.get(command.key)
+        if existing is None or existing.dead:
+            return None
+
+        # Keep the older entry's place in line but send the newer command,
+        # whoever waited on the older one now waits on the newer one
+        existing.text = command.text
+        existing.ttl = ttl
+        existing.expires = expires
+        self.__deferred += deferred - existing.deferred
+        existing.deferred = deferred
+        existing.confirm = command.confirm
+        if future is not None:
+            existing.futures.append(future)
+        self.__counters[DROP_COLLAPSED] += 1
+        return existing
+
+    def Get(self, readsOnly: bool = False) -> PendingCommand | None:
+        now = time.time()
+
+        if readsOnly:
+            # Reads can overtake the writes waiting for the matrix to power on
+            for entry in self.__entries:
+                if entry.dead:
+                    continue
+                if entry.expires < now:
+                    self.__Kill(entry, DROP_EXPIRED)
+                elif entry.isRead:
+                    self.__Kill(entry, None)
+                    self.__counters["sent"] += 1
+                    return entry
+            return None
+
+        while self.__live > 0:
+            entry = self.__PopOldest()
+            if entry.expires < now:
+                self.__Kill(entry, DROP_EXPIRED)
+                continue
+
+            self.__Kill(entry, None)
+            self.__counters["sent"] += 1
+            return entry
+
+        return None
+
+    def PushFront(self, entry: PendingCommand) -> None:
+        # Put a command that was already taken back at the head of the line,
+        # unless a newer command for the same state has superseded it since
+        if self.__supersede:
+            newer = self.__byKey.get(entry.key)
+            if newer is not None:
+                newer.futures.extend(entry.futures)
+                entry.futures.clear()
+                self.__counters[DROP_COLLAPSED] += 1
+                return
+
+        if self.__live >= self.__maxSize:
+            self.__Purge(time.time())
+
+        if self.__live >= self.__maxSize:
+            # Everything queued is newer, so the command coming back is the oldest
+            self.__counters[DROP_OVERFLOW] += 1
+            entry.Resolve(False)
+            return
+
+        entry.dead = False
+        self.__entries.appendleft(entry)
+        self.__byKey[entry.key] = entry
+        self.__live += 1
+
+    def Ready(self) -> None:
+        # The matrix takes commands now, deferred ones get their whole time to
+        # live from here rather than having spent it waiting
+        if self.__deferred == 0:
+            return
+        now = time.time()
+        for entry in self.__entries:
+            if entry.deferred and not entry.dead:
+                entry.expires = now + entry.ttl
+                entry.deferred = False
+        self.__deferred = 0
+
+    @property
+    def nextExpiry(self) -> float | None:
+        # When the first live entry runs out of time, None while there are none
+        return min((entry.expires for entry in self.__entries if not entry.dead), default=None)
+
+    def Expire(self) -> None:
+        # Drop what has outlived its time to live even while nothing is taken,
+        # e.g. while disconnected or deferring for power, so its waiters hear
+        self.__Purge(time.time())
+
+    def Clear(self, reason: str) -> None:
+        while self.__live > 0:
+            self.__Kill(self.__PopOldest(), reason)
+        self.__entries.clear()
+        self.__byKey.clear()
+
+    def __PopOldest(self) -> PendingCommand:
+        entry = self.__entries.popleft()
+        while entry.dead:
+            entry = self.__entries.popleft()
+        return entry
+
+    def __Purge(self, now: float) -> None:
+        # Expire what's stale, then let go of every dead entry rather than waiting
+        # for them to reach the front
+        for entry in self.__entries:
+            if not entry.dead and entry.expires < now:
+                self.__Kill(entry, DROP_EXPIRED)
+        if len(self.__entries) > self.__live:
+            self.__entries = collections.deque(entry for entry in self.__entries if not entry.dead)
+
+    def __Kill(self, entry: PendingCommand, reason: str | None) -> None:
+        # Dead entries stay in the deque until they reach the front or are purged
+        entry.dead = True
+        self.__live -= 1
+        if entry.deferred:
+            entry.deferred = False
+            self.__deferred -= 1
+        if self.__byKey.get(entry.key) is entry:
+            del self.__byKey[entry.key]
+        if reason is not None:
+            self.__counters[reason] += 1
+            entry.Resolve(False)
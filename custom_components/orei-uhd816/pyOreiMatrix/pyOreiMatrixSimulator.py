@@ -0,0 +1,373 @@
+import asyncio
+import json
+import logging
+import os
+
+from .pyOreiMatrixEnums import EDID
+from .pyOreiMatrixRateLimit import TokenBucket
+from .pyOreiMatrixTransport import DO, IAC, TelnetFilter, WILL
+
+_LOGGER = logging.getLogger(__name__)
+
+SIM_MODEL           = "HDP-MXB88D70M"
+SIM_FIRMWARE        = "1.08.16"
+SIM_MAC_ADDRESS     = "6C:DF:FB:00:00:01"
+SIM_INIT_TIME       = 2.0
+SIM_LINE_DELIMITER  = "\r\n"
+SIM_COMMAND_BURST   = 4
+
+# What the simulator's Telnet port offers a new client: to echo and to suppress go ahead
+SIM_TELNET_GREETING = bytes((IAC, WILL, 1, IAC, WILL, 3, IAC, DO, 3))
+
+
+class OreiMatrixSimulator:
+    # A local stand-in for an OREI matrix's TCP control port and, when given an
+    # httpPort, the web server's /cgi-bin/instr. With a telnetPort it also serves
+    # the Telnet port, and OpenPty gives it a serial port. It understands the
+    # commands the library sends and answers the way the real device does, which
+    # is enough to exercise the library, the proxy, discovery and the integration
+    # without hardware.
+    __inputCount: int
+    __outputCount: int
+    __host: str
+    __tcpPort: int
+    __httpPort: int
+    __telnetPort: int
+    __maxClients: int
+    __initTime: float
+    __server: asyncio.AbstractServer
+    __telnetServer: asyncio.AbstractServer
+    __ptys: list[tuple[int, asyncio.BaseTransport]]
+    __httpRunner = None
+    __writers: list[asyncio.StreamWriter]
+    __handlers: set[asyncio.Task]
+
+    def __init__(self, inputs: int = 8, outputs: int = 8, host: str = "127.0.0.1", tcpPort: int = 0,
+                 maxClients: int = 4, initTime: float = SIM_INIT_TIME, httpPort: int = None,
+                 model: str = SIM_MODEL, macAddress: str = SIM_MAC_ADDRESS, commandRate: float = None,
+                 telnetPort: int = None) -> None:
+        self.__inputCount = inputs
+        self.__outputCount = outputs
+        self.__host = host
+        self.__tcpPort = tcpPort
+        self.__httpPort = httpPort
+        self.__telnetPort = telnetPort
+        self.__maxClients = maxClients
+        self.__initTime = initTime
+        self.__server = None
+        self.__telnetServer = None
+        self.__ptys = []
+        self.__httpRunner = None
+        self.__writers = []
+        self.__handlers = set()
+
+        self.model = model
+        self.macAddress = macAddress
+        self.firmware = SIM_FIRMWARE
+        self.inputNames = [f"Input{i}" for i in range(1, inputs+1)]
+        self.outputNames = [f"hdmioutput{o}" for o in range(1, outputs+1)]
+
+        self.power = True
+        self.beep = False
+        self.lock = False
+        self.routes = {o: 1 for o in range(1, outputs+1)}
+        self.inputActive = {i: True for i in range(1, inputs+1)}
+        self.edids = {i: EDID.EDID_4K2K60_444_HD_AUDIO_7_1_HDR for i in range(1, inputs+1)}
+        self.linkHDMI = {o: True for o in range(1, outputs+1)}
+        self.linkCat = {o: False for o in range(1, outputs+1)}
+        self.streamHDMI = {o: True for o in range(1, outputs+1)}
+        self.streamCat = {o: True for o in range(1, outputs+1)}
+        self.received = []
+        # The real device sometimes ignores commands while busy, this many of the
+        # next commands are silently dropped
+        self.ignoreCommands = 0
+        # Like a real device's command buffer, commands arriving faster than
+        # commandRate per second are silently dropped once a short burst is used up
+        self.capacity = TokenBucket(commandRate, SIM_COMMAND_BURST) if commandRate else None
+        self.overruns = 0
+
+    @property
+    def host(self) -> str:
+        return self.__host
+
+    @property
+    def tcpPort(self) -> int:
+        return self.__tcpPort
+
+    @property
+    def httpPort(self) -> int:
+        return self.__httpPort
+
+    @property
+    def telnetPort(self) -> int:
+        return self.__telnetPort
+
+    @property
+    def clientCount(self) -> int:
+        return len(self.__writers)
+
+    async def Start(self) -> None:
+        self.__server = await asyncio.start_server(self.__HandleClient, self.__host, self.__tcpPort)
+        self.__tcpPort = self.__server.sockets[0].getsockname()[1]
+        _LOGGER.info(f"SIM:Listening on {self.__host}:{self.__tcpPort}")
+
+        if self.__httpPort is not None:
+            await self.__StartHttp()
+
+        if self.__telnetPort is not None:
+            self.__telnetServer = await asyncio.start_server(self.__HandleTelnetClient, self.__host, self.__telnetPort)
+            self.__telnetPort = self.__telnetServer.sockets[0].getsockname()[1]
+            _LOGGER.info(f"SIM:Telnet listening on {self.__host}:{self.__telnetPort}")
+
+    async def OpenPty(self) -> str:
+        # A serial port stand-in: returns the path of a pty, opened like an RS-232
+        # adapter by SerialTransport, whose other end is served like a TCP client
+        import tty
+
+        master, slave = os.openpty()
+        # Raw, so line endings pass through untouched. Keeping our own copy of the
+        # slave open means a client closing it isn't an error on the master.
+        tty.setraw(slave)
+        path = os.ttyname(slave)
+
+        loop = asyncio.get_running_loop()
+        reader = asyncio.StreamReader()
+        readTransport, _ = await loop.connect_read_pipe(
+            lambda: asyncio.StreamReaderProtocol(reader), os.fdopen(master, "rb", buffering=0))
+        writeTransport, writeProtocol = await loop.connect_write_pipe(
+            asyncio.streams.FlowControlMixin, os.fdopen(os.dup(master), "wb", buffering=0))
+        writer = asyncio.StreamWriter(writeTransport, writeProtocol, reader, loop)
+
+        self.__ptys.append((slave, readTransport))
+        asyncio.create_task(self.__HandleClient(reader, writer))
+        _LOGGER.info(f"SIM:Serial on {path}")
+        return path
+
+    async def Stop(self) -> None:
+        if self.__httpRunner is not None:
+            await self.__httpRunner.cleanup()
+            self.__httpRunner = None
+
+        if self.__server is None:
+            return
+
+        self.__server.close()
+        if self.__telnetServer is not None:
+            self.__telnetServer.close()
+        for writer in list(self.__writers):
+            writer.close()
+        for slave, readTransport in self.__ptys:
+            readTransport.close()
+        # Let the client handlers see the close and finish rather than be
+        # cancelled mid read when the loop shuts down
+        await asyncio.gather(*self.__handlers, return_exceptions=True)
+        await self.__server.wait_closed()
+        self.__server = None
+        if self.__telnetServer is not None:
+            await self.__telnetServer.wait_closed()
+            self.__telnetServer = None
+        for slave, readTransport in self.__ptys:
+            os.close(slave)
+        self.__ptys = []
+
+    async def __StartHttp(self) -> None:
+        # Only the simulator needs a web server, don't make every import pay for it
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_post("/cgi-bin/instr", self.__HandleHttp)
+        self.__httpRunner = web.AppRunner(app)
+        await self.__httpRunner.setup()
+        await web.TCPSite(self.__httpRunner, self.__host, self.__httpPort).start()
+        self.__httpPort = self.__httpRunner.addresses[0][1]
+        _LOGGER.info(f"SIM:HTTP listening on {self.__host}:{self.__httpPort}")
+
+    async def __HandleHttp(self, request):
+        from aiohttp import web
+
+        try:
+            comhead = json.loads(await request.text()).get("comhead")
+        except ValueError:
+            return web.Response(status=400)
+
+        data = self.__HttpResponse(comhead)
+        if data is None:
+            return web.Response(status=404)
+        # Like the real device, JSON served as text/plain
+        return web.Response(text=json.dumps(data), content_type="text/plain")
+
+    def __HttpResponse(self, comhead: str) -> dict | None:
+        power = 1 if self.power else 0
+        inputs = range(1, self.__inputCount+1)
+        outputs = range(1, self.__outputCount+1)
+
+        if comhead == "get status":
+            return {"comhead": comhead, "power": power, "model": self.model,
+                    "macaddress": self.macAddress, "version": self.firmware}
+        if comhead == "get network":
+            return {"comhead": comhead, "power": power, "model": self.model, "ipaddress": self.__host,
+                    "tcpport": self.__tcpPort, "macaddress": self.macAddress}
+        if comhead == "get input status":
+            return {"comhead": comhead, "power": power, "inname": list(self.inputNames),
+                    "inactive": [1 if self.inputActive[i] else 0 for i in inputs],
+                    "edid": [int(self.edids[i]) for i in inputs]}
+        if comhead == "get output status":
+            return {"comhead": comhead, "power": power, "name": list(self.outputNames),
+                    "allsource": [self.routes[o] for o in outputs],
+                    "allconnect": [1 if self.linkHDMI[o] else 0 for o in outputs],
+                    "allhdbtconnect": [1 if self.linkCat[o] else 0 for o in outputs],
+                    "allout": [1 if self.streamHDMI[o] else 0 for o in outputs],
+                    "allhdbtout": [1 if self.streamCat[o] else 0 for o in outputs]}
+        if comhead == "get system status":
+            return {"comhead": comhead, "power": power, "lock": 1 if self.lock else 0, "beep": 1 if self.beep else 0}
+
+        return None
+
+    def DropClients(self) -> None:
+        # Simulate a network blip
+        for writer in list(self.__writers):
+            writer.close()
+
+    def Emit(self, *lines: str) -> None:
+        # Unsolicited output goes to every connected client, like the real device
+        data = "".join(f"{line}{SIM_LINE_DELIMITER}" for line in lines).encode()
+        for writer in list(self.__writers):
+            writer.write(data)
+
+    def HotPlugOutput(self, outputId: int, connected: bool, cable: str = "hdmi") -> None:
+        (self.linkHDMI if cable == "hdmi" else self.linkCat)[outputId] = connected
+        self.Emit(f"{cable} output {outputId}: {'connect' if connected else 'disconnect'}")
+
+    def HotPlugInput(self, inputId: int, connected: bool) -> None:
+        self.inputActive[inputId] = connected
+        self.Emit(f"hdmi input {inputId}: {'connect' if connected else 'disconnect'}")
+
+    async def __HandleTelnetClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        writer.write(SIM_TELNET_GREETING)
+        await self.__HandleClient(reader, writer, TelnetFilter())
+
+    async def __HandleClient(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                             telnet: TelnetFilter = None) -> None:
+        if len(self.__writers) >= self.__maxClients:
+            writer.close()
+            return
+
+        self.__writers.append(writer)
+        self.__handlers.add(asyncio.current_task())
+        buffer = ""
+
+        try:
+            while True:
+                data = await reader.read(1024)
+                if not data:
+                    break
+                if telnet is not None:
+                    # The client's answers to the greeting aren't commands
+                    data = telnet.Process(data)
+
+                buffer += data.decode(errors="ignore")
+                *commands, buffer = buffer.split("!")
+
+                for command in commands:
+                    command = command.strip()
+                    if command:
+                        self.received.append(command)
+                        if self.ignoreCommands > 0:
+                            self.ignoreCommands -= 1
+                            continue
+                        if self.capacity is not None and not self.capacity.TryTake():
+                            self.overruns += 1
+                            continue
+                        self.__Reply(writer, self.__Execute(command))
+
+        except OSError:
+            # A dropped connection, or a pty whose client went away, which reads as EIO
+            pass
+
+        finally:
+            if writer in self.__writers:
+                self.__writers.remove(writer)
+            self.__handlers.discard(asyncio.current_task())
+            writer.close()
+
+    def __Reply(self, writer: asyncio.StreamWriter, lines: list[str]) -> None:
+        if lines:
+            writer.write("".join(f"{line}{SIM_LINE_DELIMITER}" for line in lines).encode())
+
+    def __StatusLines(self) -> list[str]:
+        lines = ["Get the unit all status:", "power on" if self.power else "power off"]
+        lines.append(f"beep {'on' if self.beep else 'off'}")
+        lines.append(f"panel button lock {'on' if self.lock else 'off'}")
+        lines += [f"input {i} -> output {o}" for o, i in self.routes.items()]
+        lines += [f"hdmi input {i}: {'connect' if a else 'disconnect'}" for i, a in self.inputActive.items()]
+        lines += [f"hdmi output {o}: {'connect' if a else 'disconnect'}" for o, a in self.linkHDMI.items()]
+        lines += [f"cat output {o}: {'connect' if a else 'disconnect'}" for o, a in self.linkCat.items()]
+        lines += ["IP Mode: DHCP", f"IP:{self.__host}", "Subnet Mask:255.255.255.0", "Gateway:192.168.0.1",
+                  f"TCP/IP port={self.__tcpPort}", f"Telnet port={self.__telnetPort or 23}", f"Mac address:{self.macAddress}",
+                  f"FW version {self.firmware}"]
+        return lines
+
+    def __StreamLines(self, cable: str) -> list[str]:
+        streams = self.streamHDMI if cable == "hdmi" else self.streamCat
+        return [f"{'Enable' if on else 'Disable'} {cable} output {o} stream" for o, on in streams.items()]
+
+    async def __FinishInit(self) -> None:
+        await asyncio.sleep(self.__initTime)
+        self.power = True
+        self.Emit("Initialization Finished!")
+
+    def __Execute(self, command: str) -> list[str]:
+        splits = command.split()
+
+        if command == "r status":
+            return self.__StatusLines()
+        if command == "r power":
+            return ["power on" if self.power else "power off"]
+        if command in ("r cat 0 stream", "r hdmi 0 stream"):
+            return self.__StreamLines(splits[1])
+        # r edid in 0
+        if len(splits) == 4 and splits[:3] == ["r", "edid", "in"]:
+            inputId = int(splits[3])
+            inputs = range(1, self.__inputCount+1) if inputId == 0 else [inputId]
+            return [f"input {i} edid: {self.edids[i].describe}" for i in inputs]
+        if command == "s power 1":
+            if self.power:
+                return ["power on"]
+            asyncio.create_task(self.__FinishInit())
+            return ["System Initializing..."]
+        if command == "s power 0":
+            self.power = False
+            return ["power off"]
+        if command in ("s beep 1", "s beep 0"):
+            self.beep = splits[2] == "1"
+            return [f"beep {'on' if self.beep else 'off'}"]
+        if command in ("s lock 1", "s lock 0"):
+            self.lock = splits[2] == "1"
+            return ["Panel Lock" if self.lock else "Panel Unlock"]
+
+        # s in 3 av out 2
+        if len(splits) == 6 and splits[:2] == ["s", "in"] and splits[3:5] == ["av", "out"]:
+            inputId, outputId = int(splits[2]), int(splits[5])
+            outputs = range(1, self.__outputCount+1) if outputId == 0 else [outputId]
+            for o in outputs:
+                self.routes[o] = inputId
+            return [f"input {inputId} -> output {o}" for o in outputs]
+
+        # s edid in 3 from 13
+        if len(splits) == 6 and splits[:3] == ["s", "edid", "in"] and splits[4] == "from":
+            inputId, edid = int(splits[3]), EDID(int(splits[5]))
+            inputs = range(1, self.__inputCount+1) if inputId == 0 else [inputId]
+            for i in inputs:
+                self.edids[i] = edid
+            return [f"input {i} edid: {edid.describe}" for i in inputs]
+
+        # s cat 2 stream 1
+        if len(splits) == 5 and splits[0] == "s" and splits[1] in ("cat", "hdmi") and splits[3] == "stream":
+            outputId, on = int(splits[2]), splits[4] == "1"
+            streams = self.streamHDMI if splits[1] == "hdmi" else self.streamCat
+            outputs = range(1, self.__outputCount+1) if outputId == 0 else [outputId]
+            for o in outputs:
+                streams[o] = on
+            return [f"{'Enable' if on else 'Disable'} {splits[1]} output {o} stream" for o in outputs]
+
+        return ["E00"]
@@ -0,0 +1,56 @@
+import time
+from typing import NamedTuple
+
+
+class MatrixSnapshot(NamedTuple):
+    # The settable state of a whole matrix at one moment. Tuples all the way down,
+    # so a snapshot can't change after it's taken and copying one is free.
+    # Per-output tuples are indexed by output id - 1.
+    taken: float
+    power: bool
+    beep: bool
+    lock: bool
+    routes: tuple[int, ...]
+    streamHDMI: tuple[bool, ...]
+    streamHDBT: tuple[bool, ...]
+
+    @classmethod
+    def Take(cls, api) -> 'MatrixSnapshot':
+        outputs = [api.GetOutput(id) for id in range(1, api.outputCount+1)]
+        return cls(
+            taken=time.time(),
+            power=api.power,
+            beep=api.beep,
+            lock=api.panel_lock,
+            routes=tuple(output.InputId for output in outputs),
+            streamHDMI=tuple(output.StreamEnabledHDMI for output in outputs),
+            streamHDBT=tuple(output.StreamEnabledHDBT for output in outputs),
+        )
+
+    def ToDict(self) -> dict:
+        return {field: list(value) if isinstance(value, tuple) else value for field, value in self._asdict().items()}
+
+    @classmethod
+    def FromDict(cls, data: dict) -> 'MatrixSnapshot':
+        # From ToDict or anyone else's hands, so checked rather than trusted:
+        # KeyError for a missing field, ValueError for one that's the wrong shape
+        snapshot = cls(**{field: tuple(data[field]) if isinstance(data[field], list) else data[field] for field in cls._fields})
+
+        if isinstance(snapshot.taken, bool) or not isinstance(snapshot.taken, (int, float)):
+            raise ValueError(f"taken must be a time, not {snapshot.taken!r}")
+        for field in ("power", "beep", "lock"):
+            if not isinstance(getattr(snapshot, field), bool):
+                raise ValueError(f"{field} must be true or false, not {getattr(snapshot, field)!r}")
+        for field in ("routes", "streamHDMI", "streamHDBT"):
+            if not isinstance(getattr(snapshot, field), tuple):
+                raise ValueError(f"{field} must be a list, not {getattr(snapshot, field)!r}")
+            if len(getattr(snapshot, field)) != len(snapshot.routes):
+                raise ValueError(f"{field} has {len(getattr(snapshot, field))} outputs, routes has {len(snapshot.routes)}")
+        for route in snapshot.routes:
+            if isinstance(route, bool) or not isinstance(route, int) or route < 1:
+                raise ValueError(f"routes must be input ids, not {route!r}")
+        for on in snapshot.streamHDMI + snapshot.streamHDBT:
+            if not isinstance(on, bool):
+                raise ValueError(f"streams must be true or false, not {on!r}")
+
+        return snapshot
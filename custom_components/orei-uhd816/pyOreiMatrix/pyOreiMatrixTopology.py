@@ -0,0 +1,266 @@
+import asyncio
+import logging
+
+from .pyOreiMatrixProfiles import MatrixCommand
+
+_LOGGER = logging.getLogger(__name__)
+
+TOPOLOGY_MAX_PATHS  = 16    # alternative paths kept per pair of matrices
+
+# Ports are (matrix key, id) tuples, the key being the one the matrix was given
+# in OreiMatrixManager.AddMatrix. A source is an input and a sink an output.
+# A link is (from key, output id, to key, input id): a cable from an output of
+# one matrix into an input of the next.
+
+
+class MatrixTopology:
+    # Cascaded matrices as a graph, so a source on one matrix can be routed to a
+    # display on another in one call. Which links lead from one matrix to another
+    # only changes when links do, so those paths are indexed once per pair of
+    # matrices and only the pairs a link change touches are dropped. What each
+    # display shows is traced through the live routes and cached per display;
+    # a route change only drops the traces that ran through that output.
+    __manager = None
+    __links: dict[tuple, tuple]
+    __feeds: dict[tuple, tuple]
+    __paths: dict[tuple, list[tuple]]
+    __pathsByLink: dict[tuple, set]
+    __sources: dict[tuple, tuple]
+    __tracesByHop: dict[tuple, set]
+    __callbacks: dict[str, callable]
+
+    def __init__(self, manager) -> None:
+        self.__manager = manager
+        self.__links = {}
+        self.__feeds = {}
+        self.__paths = {}
+        self.__pathsByLink = {}
+        self.__sources = {}
+        self.__tracesByHop = {}
+        self.__callbacks = {}
+
+    @property
+    def Links(self) -> list[tuple]:
+        return [fromPort + toPort for fromPort, toPort in self.__links.items()]
+
+    def __GetMatrix(self, key: str):
+        api = self.__manager.GetMatrix(key)
+        if api is None:
+            raise KeyError(f"Matrix '{key}' is not managed.")
+        return api
+
+    # LINKS - START
+    def AddLink(self, fromKey: str, outputId: int, toKey: str, inputId: int) -> None:
+        fromPort = (fromKey, outputId)
+        toPort = (toKey, inputId)
+        self.__GetMatrix(fromKey)
+        self.__GetMatrix(toKey)
+
+        if fromKey == toKey:
+            raise ValueError(f"Matrix '{fromKey}' can't be linked to itself.")
+        if fromPort in self.__links:
+            raise ValueError(f"Output {outputId} of '{fromKey}' is already linked to {self.__links[fromPort]}.")
+        if toPort in self.__feeds:
+            raise ValueError(f"Input {inputId} of '{toKey}' is already fed by {self.__feeds[toPort]}.")
+
+        self.__links[fromPort] = toPort
+        self.__feeds[toPort] = fromPort
+
+        # Only pairs from a matrix that reaches this link to one it leads to can
+        # gain a path through it
+        upstream = self.__Reachable(fromKey, reverse=True)
+        downstream = self.__Reachable(toKey)
+        for pair in [pair for pair in self.__paths if pair[0] in upstream and pair[1] in downstream]:
+            self.__DropPaths(pair)
+
+        self.__InvalidateTraces()
+
+    def RemoveLink(self, fromKey: str, outputId: int) -> None:
+        fromPort = (fromKey, outputId)
+        toPort = self.__links.pop(fromPort)
+        del self.__feeds[toPort]
+
+        # Only pairs with a path through this link lose anything
+        for pair in list(self.__pathsByLink.pop(fromPort + toPort, ())):
+            self.__DropPaths(pair)
+
+        self.__InvalidateTraces()
+
+    def __Reachable(self, key: str, reverse: bool = False) -> set[str]:
+        # Matrices that key leads to, or that lead to it, key included
+        edges = self.__feeds if reverse else self.__links
+        seen = {key}
+        pending = [key]
+        while pending:
+            current = pending.pop()
+            for fromPort, toPort in edges.items():
+                if fromPort[0] == current and toPort[0] not in seen:
+                    seen.add(toPort[0])
+                    pending.append(toPort[0])
+        return seen
+    # LINKS - END
+
+    # PATH INDEX - START
+    def Paths(self, fromKey: str, toKey: str) -> list[tuple]:
+        # Every loop free chain of links from one matrix to another, shortest
+        # first. The empty chain when both are the same matrix.
+        pair = (fromKey, toKey)
+        paths = self.__paths.get(pair)
+        if paths is None:
+            paths = self.__FindPaths(fromKey, toKey)
+            self.__paths[pair] = paths
+            for path in paths:
+                for link in path:
+                    self.__pathsByLink.setdefault(link, set()).add(pair)
+        return paths
+
+    def __FindPaths(self, fromKey: str, toKey: str) -> list[tuple]:
+        paths = []
+        # Breadth first, so paths come out shortest first and the cap keeps the short ones
+        pending = [(fromKey, (), {fromKey})]
+        while pending and len(paths) < TOPOLOGY_MAX_PATHS:
+            key, path, visited = pending.pop(0)
+            if key == toKey:
+                paths.append(path)
+                continue
+            for fromPort, toPort in sorted(self.__links.items()):
+                if fromPort[0] == key and toPort[0] not in visited:
+                    pending.append((toPort[0], path + (fromPort + toPort,), visited | {toPort[0]}))
+        return paths
+
+    def __DropPaths(self, pair: tuple) -> None:
+        for path in self.__paths.pop(pair, ()):
+            for link in path:
+                pairs = self.__pathsByLink.get(link)
+                if pairs is not None:
+                    pairs.discard(pair)
+                    if not pairs:
+                        del self.__pathsByLink[link]
+    # PATH INDEX - END
+
+    # TRACES - START
+    def SourceOf(self, sink: tuple) -> tuple | None:
+        # The source a display is showing through every matrix on the way,
+        # None while a route is unknown or runs round in a loop
+        if sink in self.__sources:
+            return self.__sources[sink]
+
+        hops = []
+        port = sink
+        source = None
+        while port not in hops:
+            hops.append(port)
+            api = self.__GetMatrix(port[0])
+            if not 0 < port[1] <= api.outputCount or api.GetOutput(port[1]).InputId is None:
+                break
+            output = api.GetOutput(port[1])
+            inputPort = (port[0], output.InputId)
+            if inputPort not in self.__feeds:
+                source = inputPort
+                break
+            port = self.__feeds[inputPort]
+
+        self.__sources[sink] = source
+        for hop in hops:
+            self.__tracesByHop.setdefault(hop, set()).add(sink)
+        return source
+
+    def Sinks(self) -> list[tuple]:
+        # Every output that isn't linked on to another matrix
+        return [
+            (key, id)
+            for key, api in self.__manager.Matrices.items()
+            for id in range(1, api.outputCount+1)
+            if (key, id) not in self.__links
+        ]
+
+    def __RouteChanged(self, key: str, outputId: int) -> None:
+        for sink in self.__tracesByHop.pop((key, outputId), ()):
+            self.__sources.pop(sink, None)
+
+    def __InvalidateTraces(self) -> None:
+        # Links change rarely, start the traces over
+        self.__sources.clear()
+        self.__tracesByHop.clear()
+
+    def Start(self) -> None:
+        # Follow route changes on every managed matrix. Call once the matrices
+        # have been validated, so their output counts are known.
+        for key, api in self.__manager.Matrices.items():
+            if key in self.__callbacks:
+                continue
+
+            def changed(output, field, key=key):
+                self.__RouteChanged(key, output.Id)
+
+            self.__callbacks[key] = changed
+            for id in range(1, api.outputCount+1):
+                api.SubscribeToField("output", id, "inputId", changed)
+
+    def Stop(self) -> None:
+        for key, changed in self.__callbacks.items():
+            api = self.__manager.GetMatrix(key)
+            if api is None:
+                continue
+            for id in range(1, api.outputCount+1):
+                api.UnsubscribeFromField("output", id, "inputId", changed)
+        self.__callbacks.clear()
+        self.__InvalidateTraces()
+    # TRACES - END
+
+    # ROUTING - START
+    def RouteCommands(self, source: tuple, sink: tuple) -> dict[str, list[MatrixCommand]]:
+        # The route commands, per matrix, that bring source to sink. The path that
+        # takes the fewest other displays away from what they're showing wins,
+        # then the one needing the fewest commands, then the shortest.
+        if source in self.__feeds:
+            raise ValueError(f"Input {source[1]} of '{source[0]}' is fed by {self.__feeds[source]}, not a source.")
+        self.__GetMatrix(source[0])
+        self.__GetMatrix(sink[0])
+
+        best = None
+        for path in self.Paths(source[0], sink[0]):
+            # Each matrix on the way routes the port it's entered by to the one it's left by
+            entries = [source] + [link[2:] for link in path]
+            exits = [link[:2] for link in path] + [sink]
+
+            hops = []
+            disturbed = set()
+            for (key, inputId), (_, outputId) in zip(entries, exits):
+                if self.__GetMatrix(key).GetOutput(outputId).InputId != inputId:
+                    hops.append((key, inputId, outputId))
+                    disturbed |= self.__tracesByHop.get((key, outputId), set())
+            disturbed.discard(sink)
+
+            cost = (len(disturbed), len(hops), len(path))
+            if best is None or cost < best[0]:
+                best = (cost, hops)
+
+        if best is None:
+            raise ValueError(f"No path from {source} to {sink}.")
+
+        commands = {}
+        for key, inputId, outputId in best[1]:
+            api = self.__GetMatrix(key)
+            commands.setdefault(key, []).append(api.profile.Build("route", input=inputId, output=outputId))
+        return commands
+
+    async def Route(self, source: tuple, sink: tuple) -> bool:
+        # Route source to sink across however many matrices it takes. Each matrix
+        # gets its share as one batch through its own send queue, all at once.
+        # True once every matrix has confirmed its commands.
+        for display in self.Sinks():
+            # Knowing what every display shows is what lets RouteCommands
+            # avoid disturbing them
+            self.SourceOf(display)
+
+        commands = self.RouteCommands(source, sink)
+        if not commands:
+            return True
+
+        _LOGGER.debug(f"Routing {source} to {sink}: {commands}")
+        results = await asyncio.gather(*(
+            self.__GetMatrix(key).CmdSendBatch(batch) for key, batch in commands.items()
+        ))
+        return all(results)
+    # ROUTING - END
@@ -0,0 +1,69 @@
+import logging
+import time
+
+TRACE_SIZE          = 512
+
+TRACE_TX            = "tx"          # command written to the socket
+TRACE_RX            = "rx"          # line received, with the event it parsed to
+TRACE_STATE         = "state"       # a matrix property changed
+TRACE_HOLDBACK      = "holdback"    # sending paused or resumed
+TRACE_QUEUE         = "queue"       # retries and failures
+TRACE_CONNECTION    = "connection"  # connect, disconnect, heartbeat
+
+TRACE_CATEGORIES    = (TRACE_TX, TRACE_RX, TRACE_STATE, TRACE_HOLDBACK, TRACE_QUEUE, TRACE_CONNECTION)
+
+
+class TraceBuffer:
+    # A fixed size ring of (time, category, event, args) tuples. Recording costs a
+    # tuple and a list store, nothing is formatted until the ring is dumped, e.g. by
+    # Home Assistant diagnostics or after an error.
+    #
+    # Each category also has its own logger, "<module>.<category>", so verbosity can
+    # be raised per category from Home Assistant's logger configuration or with
+    # SetVerbosity(). Those are only called when their logger is enabled for DEBUG.
+    __ring: list
+    __size: int
+    __next: int
+    __loggers: dict[str, logging.Logger]
+
+    def __init__(self, size: int = TRACE_SIZE) -> None:
+        self.__ring = [None] * size
+        self.__size = size
+        self.__next = 0
+        self.__loggers = {category: logging.getLogger(f"{__name__}.{category}") for category in TRACE_CATEGORIES}
+
+    def Record(self, category: str, event: str, *args) -> None:
+        self.__ring[self.__next % self.__size] = (time.time(), category, event, args)
+        self.__next += 1
+
+        logger = self.__loggers[category]
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("%s %s", event, " ".join(repr(arg) for arg in args))
+
+    def SetVerbosity(self, category: str, level: int) -> None:
+        self.__loggers[category].setLevel(level)
+
+    def Entries(self, limit: int = None) -> list[tuple]:
+        # Oldest first
+        count = min(self.__next, self.__size)
+        if limit is not None:
+            count = min(count, limit)
+        return [self.__ring[index % self.__size] for index in range(self.__next - count, self.__next)]
+
+    def Dump(self, limit: int = None) -> list[str]:
+        return [self.Format(entry) for entry in self.Entries(limit)]
+
+    def LogRecent(self, logger: logging.Logger, level: int, limit: int = 20) -> None:
+        # Context for an error, the last few things that happened before it
+        if logger.isEnabledFor(level):
+            logger.log(level, "Recent activity:\n%s", "\n".join(self.Dump(limit)))
+
+    def Clear(self) -> None:
+        self.__ring = [None] * self.__size
+        self.__next = 0
+
+    @staticmethod
+    def Format(entry: tuple) -> str:
+        when, category, event, args = entry
+        stamp = time.strftime("%H:%M:%S", time.localtime(when)) + f".{int(when % 1 * 1000):03d}"
+        return f"{stamp} {category:<10} {event} {' '.join(repr(arg) for arg in args)}".rstrip()
@@ -0,0 +1,440 @@
+import abc
+import asyncio
+import logging
+import os
+
+_LOGGER = logging.getLogger(__name__)
+
+TRANSPORT_BUFFER_SIZE   = 4096    # bytes, grown only for a line longer than this
+TRANSPORT_MAX_LINE      = 65536   # a line that long is garbage, dropped rather than buffered
+TELNET_PORT             = 23      # what the matrix reports as "Telnet port=23"
+SERIAL_BAUDRATE         = 115200
+SERIAL_BAUDRATES        = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200, 230400)
+
+# Telnet (RFC 854) bytes the filter cares about
+IAC     = 255
+DONT    = 254
+DO      = 253
+WONT    = 252
+WILL    = 251
+SB      = 250
+SE      = 240
+
+
+class LineFramer:
+    # Splits a byte stream into lines inside one preallocated buffer. Transports
+    # read straight into Buffer() and report how much arrived with Filled(). Only
+    # the new bytes are searched for the delimiter, every complete line in them is
+    # decoded in one go straight out of the buffer and split, and the partial line
+    # left over is moved to the front for the next read. No bytes object is made
+    # per read and the partial line is never joined to the next one as a string.
+    # A filter, when given, may rewrite the new bytes in place before they're
+    # framed, see TelnetFilter.
+    __slots__ = ("__buffer", "__view", "__used", "__delimiter", "__textDelimiter", "__onLine", "__filter",
+                 "lines", "reads")
+
+    def __init__(self, delimiter: str, onLine, filter=None, size: int = TRANSPORT_BUFFER_SIZE) -> None:
+        self.__buffer = bytearray(size)
+        self.__view = memoryview(self.__buffer)
+        self.__used = 0
+        self.__delimiter = delimiter.encode()
+        self.__textDelimiter = delimiter
+        self.__onLine = onLine
+        self.__filter = filter
+        self.lines = 0
+        self.reads = 0
+
+    def Buffer(self, sizeHint: int = -1) -> memoryview:
+        if self.__used == len(self.__buffer):
+            self.__Grow()
+        return self.__view[self.__used:]
+
+    def __Grow(self) -> None:
+        if len(self.__buffer) >= TRANSPORT_MAX_LINE:
+            _LOGGER.warning(f"Dropping {self.__used} bytes without a line delimiter.")
+            self.__used = 0
+            return
+        # A bytearray can't be resized while a view of it exists, and the last
+        # Buffer() handed out may still be about, so move to a bigger one
+        buffer = bytearray(len(self.__buffer) * 2)
+        buffer[:self.__used] = self.__buffer[:self.__used]
+        self.__buffer = buffer
+        self.__view = memoryview(buffer)
+
+    def Filled(self, nbytes: int) -> None:
+        self.reads += 1
+        buffer = self.__buffer
+        used = self.__used
+        end = used + nbytes
+        if self.__filter is not None:
+            end = self.__filter(buffer, used, end)
+
+        delimiter = self.__delimiter
+        # The delimiter may straddle the old and the new bytes
+        index = buffer.rfind(delimiter, max(0, used - len(delimiter) + 1), end)
+        if index < 0:
+            self.__used = end
+            return
+
+        # A delimiter is never part of a multi-byte character, so splitting the
+        # decoded text is the same as splitting the bytes
+        onLine = self.__onLine
+        for line in str(self.__view[:index], "utf-8", "replace").split(self.__textDelimiter):
+            if line:
+                self.lines += 1
+                onLine(line)
+
+        start = index + len(delimiter)
+        buffer[:end-start] = buffer[start:end]
+        self.__used = end - start
+
+    def Feed(self, data: bytes) -> None:
+        # For callers that were handed bytes rather than reading into Buffer()
+        while data:
+            view = self.Buffer()
+            count = min(len(view), len(data))
+            view[:count] = data[:count]
+            data = data[count:]
+            self.Filled(count)
+
+
+class TelnetFilter:
+    # Removes Telnet commands from a stream and refuses every option the other
+    # end offers or asks for, leaving a plain network virtual terminal. Keeps
+    # a command split across two reads until the rest of it arrives.
+    __slots__ = ("__reply", "__pending")
+
+    def __init__(self, reply=None) -> None:
+        self.__reply = reply
+        self.__pending = b""
+
+    def __call__(self, buffer: bytearray, start: int, end: int) -> int:
+        # In place for LineFramer, returning the new end of the data
+        if not self.__pending and buffer.find(IAC, start, end) < 0:
+            return end
+        data = self.Process(bytes(buffer[start:end]))
+        # Never longer than what came in, commands are only ever taken out
+        buffer[start:start+len(data)] = data
+        return start + len(data)
+
+    def Process(self, data: bytes) -> bytes:
+        data = self.__pending + data
+        self.__pending = b""
+        out = bytearray()
+        replies = bytearray()
+        index = 0
+        while index < len(data):
+            found = data.find(IAC, index)
+            if found < 0:
+                out += data[index:]
+                break
+            out += data[index:found]
+
+            if found + 1 >= len(data):
+                self.__pending = data[found:]
+                break
+            command = data[found+1]
+            if command == IAC:
+                # An escaped 255 data byte
+                out.append(IAC)
+                index = found + 2
+            elif command in (WILL, WONT, DO, DONT):
+                if found + 2 >= len(data):
+                    self.__pending = data[found:]
+                    break
+                option = data[found+2]
+                if command == WILL:
+                    replies += bytes((IAC, DONT, option))
+                elif command == DO:
+                    replies += bytes((IAC, WONT, option))
+                index = found + 3
+            elif command == SB:
+                close = data.find(bytes((IAC, SE)), found + 2)
+                if close < 0:
+                    self.__pending = data[found:]
+                    break
+                index = close + 2
+            else:
+                # NOP, GA and the other two byte commands
+                index = found + 2
+
+        if replies and self.__reply is not None:
+            self.__reply(bytes(replies))
+        return bytes(out)
+
+
+class MatrixTransport(abc.ABC):
+    # One connection to a matrix's command port. Open connects, after which every
+    # complete line received goes to onLine until the connection is lost and
+    # WaitClosed returns, raising whatever broke it. OreiMatrixAPI makes a new one
+    # for every connection, see OreiMatrixAPI.ConfigureTransport.
+    __closed: asyncio.Future = None
+
+    @property
+    def peer(self):
+        return None
+
+    @property
+    def framer(self) -> LineFramer:
+        return None
+
+    @abc.abstractmethod
+    async def Open(self, delimiter: str, onLine) -> None:
+        ...
+
+    @abc.abstractmethod
+    def Write(self, data: bytes) -> None:
+        ...
+
+    @abc.abstractmethod
+    def Close(self) -> None:
+        ...
+
+    async def WaitClosed(self) -> None:
+        await self._ClosedFuture()
+
+    def _ClosedFuture(self) -> asyncio.Future:
+        if self.__closed is None:
+            self.__closed = asyncio.get_running_loop().create_future()
+        return self.__closed
+
+    def _Lost(self, exc: Exception | None) -> None:
+        closed = self._ClosedFuture()
+        if closed.done():
+            return
+        if exc is None:
+            closed.set_result(None)
+        else:
+            closed.set_exception(exc)
+
+
+class _FramedProtocol(asyncio.BufferedProtocol):
+    # The event loop reads straight into the framer's buffer, no bytes object per read
+    def __init__(self, framer: LineFramer, lost) -> None:
+        self.__framer = framer
+        self.__lost = lost
+        self.__transport = None
+
+    def connection_made(self, transport) -> None:
+        self.__transport = transport
+
+    def get_buffer(self, sizehint: int) -> memoryview:
+        return self.__framer.Buffer(sizehint)
+
+    def buffer_updated(self, nbytes: int) -> None:
+        try:
+            self.__framer.Filled(nbytes)
+        except Exception as e:
+            # What the line handler raised ends the connection, like a read error
+            self.__lost(e)
+            self.__transport.close()
+
+    def eof_received(self) -> bool:
+        return False
+
+    def connection_lost(self, exc: Exception | None) -> None:
+        self.__lost(exc)
+
+
+class TcpTransport(MatrixTransport):
+    # The matrix's TCP control port, or a serial to Ethernet gateway in raw mode
+    __host: str
+    __port: int
+    __transport: asyncio.Transport
+    __framer: LineFramer
+
+    def __init__(self, host: str, port: int) -> None:
+        self.__host = host
+        self.__port = port
+        self.__transport = None
+        self.__framer = None
+
+    @property
+    def peer(self):
+        return None if self.__transport is None else self.__transport.get_extra_info("peername")
+
+    @property
+    def framer(self) -> LineFramer:
+        return self.__framer
+
+    def _Filter(self):
+        return None
+
+    async def Open(self, delimiter: str, onLine) -> None:
+        self._ClosedFuture()
+        self.__framer = LineFramer(delimiter, onLine, self._Filter())
+        loop = asyncio.get_running_loop()
+        self.__transport, _ = await loop.create_connection(
+            lambda: _FramedProtocol(self.__framer, self._Lost), self.__host, self.__port)
+
+    def Write(self, data: bytes) -> None:
+        # Commands are tiny so we let the transport buffer them rather than drain
+        if self.__transport is not None and not self.__transport.is_closing():
+            self.__transport.write(data)
+
+    def Close(self) -> None:
+        if self.__transport is not None:
+            self.__transport.close()
+
+
+class TelnetTransport(TcpTransport):
+    # The matrix's Telnet port: the same commands, with Telnet's option
+    # negotiation filtered out of what's received
+    def __init__(self, host: str, port: int = TELNET_PORT) -> None:
+        super().__init__(host, port)
+
+    def _Filter(self):
+        return TelnetFilter(self.Write)
+
+    def Write(self, data: bytes) -> None:
+        if IAC in data:
+            data = data.replace(bytes((IAC,)), bytes((IAC, IAC)))
+        super().Write(data)
+
+
+class SerialTransport(MatrixTransport):
+    # An RS-232 port, a USB adapter or a pty from a serial gateway's driver,
+    # opened raw at baudrate. The event loop watches the file descriptor and
+    # reads go straight into the framer's buffer.
+    __path: str
+    __baudrate: int
+    __fd: int
+    __framer: LineFramer
+    __writeBuffer: bytearray
+    __loop: asyncio.AbstractEventLoop
+
+    def __init__(self, path: str, baudrate: int = SERIAL_BAUDRATE) -> None:
+        CheckBaudrate(baudrate)
+        self.__path = path
+        self.__baudrate = baudrate
+        self.__fd = None
+        self.__framer = None
+        self.__writeBuffer = bytearray()
+        self.__loop = None
+
+    @property
+    def peer(self):
+        return self.__path
+
+    @property
+    def framer(self) -> LineFramer:
+        return self.__framer
+
+    async def Open(self, delimiter: str, onLine) -> None:
+        # Only serial users need termios, and it doesn't exist on Windows
+        import termios
+        import tty
+
+        self._ClosedFuture()
+        self.__loop = asyncio.get_running_loop()
+        speed = getattr(termios, f"B{self.__baudrate}", None)
+        if speed is None:
+            # One of SERIAL_BAUDRATES this platform's termios doesn't have
+            raise ValueError(f"Unsupported baud rate {self.__baudrate}")
+
+        fd = os.open(self.__path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            attrs[2] |= termios.CLOCAL | termios.CREAD
+            attrs[4] = attrs[5] = speed
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+        except (OSError, termios.error) as e:
+            os.close(fd)
+            raise OSError(f"Can't configure {self.__path}: {e}") from e
+
+        self.__fd = fd
+        self.__framer = LineFramer(delimiter, onLine)
+        self.__loop.add_reader(fd, self.__ReadReady)
+
+    def __ReadReady(self) -> None:
+        try:
+            nbytes = os.readv(self.__fd, [self.__framer.Buffer()])
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.__Shut(e)
+            return
+
+        if nbytes == 0:
+            self.__Shut(None)
+            return
+        try:
+            self.__framer.Filled(nbytes)
+        except Exception as e:
+            self.__Shut(e)
+
+    def Write(self, data: bytes) -> None:
+        if self.__fd is None:
+            return
+        if not self.__writeBuffer:
+            try:
+                data = data[os.write(self.__fd, data):]
+            except BlockingIOError:
+                pass
+            except OSError as e:
+                self.__Shut(e)
+                return
+            if not data:
+                return
+            self.__loop.add_writer(self.__fd, self.__WriteReady)
+        self.__writeBuffer += data
+
+    def __WriteReady(self) -> None:
+        try:
+            written = os.write(self.__fd, self.__writeBuffer)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            self.__Shut(e)
+            return
+        del self.__writeBuffer[:written]
+        if not self.__writeBuffer:
+            self.__loop.remove_writer(self.__fd)
+
+    def Close(self) -> None:
+        self.__Shut(None)
+
+    def __Shut(self, exc: Exception | None) -> None:
+        fd, self.__fd = self.__fd, None
+        if fd is None:
+            return
+        self.__loop.remove_reader(fd)
+        self.__loop.remove_writer(fd)
+        self.__writeBuffer.clear()
+        os.close(fd)
+        self._Lost(exc)
+
+
+def CheckBaudrate(baudrate: int) -> None:
+    # Raises ValueError for a rate the matrix and a serial port won't both do
+    if baudrate not in SERIAL_BAUDRATES:
+        raise ValueError(f"Unsupported baud rate {baudrate}, expected one of {', '.join(map(str, SERIAL_BAUDRATES))}")
+
+
+def TransportFactory(spec: str):
+    # A transport factory for OreiMatrixAPI.ConfigureTransport from a short
+    # description: "tcp" (the default, the port found by Validate), "tcp:PORT",
+    # "telnet", "telnet:PORT" or "serial:PATH", "serial:PATH@BAUD"
+    kind, _, argument = spec.partition(":")
+
+    if kind == "tcp":
+        if argument:
+            port = int(argument)
+            return lambda host, tcpPort: TcpTransport(host, port)
+        return lambda host, tcpPort: TcpTransport(host, tcpPort)
+
+    if kind == "telnet":
+        port = int(argument) if argument else TELNET_PORT
+        return lambda host, tcpPort: TelnetTransport(host, port)
+
+    if kind == "serial":
+        if not argument:
+            raise ValueError("A serial transport needs a device, e.g. serial:/dev/ttyUSB0")
+        path, _, baudrate = argument.partition("@")
+        baudrate = int(baudrate) if baudrate else SERIAL_BAUDRATE
+        # Now, rather than on every connection attempt
+        CheckBaudrate(baudrate)
+        return lambda host, tcpPort: SerialTransport(path, baudrate)
+
+    raise ValueError(f"Unknown transport {spec!r}, expected tcp, telnet or serial.")
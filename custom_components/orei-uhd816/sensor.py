@@ -0,0 +1,61 @@
+"""Platform for sensor integration."""
+import logging
+
+from homeassistant.components.sensor import SensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .entity import OreiMatrixFieldEntity
+from .pyOreiMatrix import OreiMatrixAPI, MatrixInput, MatrixOutput
+from .const import DOMAIN
+
+LOGGER = logging.getLogger(__package__)
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, async_add_entities):
+    """Add sensors for passed config_entry in HA."""
+    LOGGER.debug("Adding sensor entities.")
+
+    client: OreiMatrixAPI = hass.data[DOMAIN][entry.entry_id]
+
+    new_devices = []
+
+    for input in await client.Inputs:
+        if input.IsVisible:
+            new_devices.append( HassInputEdidSensor(entry, client, input) )
+
+    for output in await client.Outputs:
+        if output.IsVisible:
+            new_devices.append( HassOutputCableSensor(entry, client, output) )
+
+    if new_devices:
+        async_add_entities(new_devices)
+
+
+class HassInputEdidSensor(OreiMatrixFieldEntity, SensorEntity):
+    """The EDID a matrix input presents to its source."""
+
+    _attr_icon = "mdi:monitor-eye"
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, input: MatrixInput):
+        super().__init__(entry, controller, MatrixInput.KIND, input.Id, "edid", "edid")
+        self._attr_name = f"{input.Name} EDID"
+
+    @property
+    def native_value(self) -> str | None:
+        edid = self.matrix_object.Edid
+        return edid.describe if edid is not None else None
+
+
+class HassOutputCableSensor(OreiMatrixFieldEntity, SensorEntity):
+    """The cable type (HDMI or HDBT) a matrix output is linked over."""
+
+    _attr_icon = "mdi:cable-data"
+
+    def __init__(self, entry: ConfigEntry, controller: OreiMatrixAPI, output: MatrixOutput):
+        super().__init__(entry, controller, MatrixOutput.KIND, output.Id, "cable", "cable")
+        self._attr_name = f"{output.Name} Cable"
+
+    @property
+    def native_value(self) -> str | None:
+        return self.matrix_object.Cable or None
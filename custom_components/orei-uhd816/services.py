@@ -0,0 +1,328 @@
+"""Services for the OREI matrix switch integration."""
+from __future__ import annotations
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ATTR_CONFIG_ENTRY,
+    ATTR_EDID,
+    ATTR_END,
+    ATTR_INPUTS,
+    ATTR_NAME,
+    ATTR_OUTPUT,
+    ATTR_RESET,
+    ATTR_SNAPSHOT,
+    ATTR_START,
+    DATA_SNAPSHOTS,
+    DEFAULT_SNAPSHOT_NAME,
+    DOMAIN,
+    SERVICE_CALIBRATE,
+    SERVICE_HISTORY,
+    SERVICE_PREDICTOR_REPORT,
+    SERVICE_RESTORE,
+    SERVICE_SET_EDID,
+    SERVICE_SNAPSHOT,
+)
+from .calibration import async_save_calibration
+from .pyOreiMatrix import Calibrate, MatrixPoweredOffError, MatrixSnapshot, OreiMatrixAPI, SendQueueFullError
+from .pyOreiMatrix.pyOreiMatrixCalibrate import ApplyCalibration
+from .pyOreiMatrix.pyOreiMatrixHistory import HISTORY_LINK, HISTORY_POWER, HISTORY_ROUTE, HISTORY_SIGNAL
+
+# What sending to the matrix raises: not connected, or refused by the power off
+# or send queue overflow policy
+SEND_ERRORS = (BrokenPipeError, MatrixPoweredOffError, SendQueueFullError)
+
+HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+        vol.Required(ATTR_START): cv.datetime,
+        vol.Optional(ATTR_END): cv.datetime,
+        vol.Optional(ATTR_OUTPUT): vol.All(vol.Coerce(int), vol.Range(min=1)),
+    }
+)
+
+SNAPSHOT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+        vol.Optional(ATTR_NAME, default=DEFAULT_SNAPSHOT_NAME): cv.string,
+    }
+)
+
+RESTORE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+        vol.Exclusive(ATTR_NAME, "source"): cv.string,
+        vol.Exclusive(ATTR_SNAPSHOT, "source"): dict,
+    }
+)
+
+SET_EDID_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+        vol.Required(ATTR_EDID): vol.Any(cv.string, vol.Coerce(int)),
+        vol.Optional(ATTR_INPUTS): vol.All(cv.ensure_list, [vol.All(vol.Coerce(int), vol.Range(min=1))]),
+    }
+)
+
+CALIBRATE_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+    }
+)
+
+PREDICTOR_REPORT_SCHEMA = vol.Schema(
+    {
+        vol.Optional(ATTR_CONFIG_ENTRY): cv.string,
+        vol.Optional(ATTR_RESET, default=False): cv.boolean,
+    }
+)
+
+
+def async_get_client(hass: HomeAssistant, call: ServiceCall) -> OreiMatrixAPI:
+    """Return the matrix a service call is for, the only one if none is given."""
+    clients = {
+        key: client
+        for key, client in hass.data.get(DOMAIN, {}).items()
+        if isinstance(client, OreiMatrixAPI)
+    }
+
+    entry_id = call.data.get(ATTR_CONFIG_ENTRY)
+    if entry_id is not None:
+        if entry_id not in clients:
+            raise ServiceValidationError(f"No OREI matrix with config entry {entry_id}")
+        return clients[entry_id]
+
+    if len(clients) != 1:
+        raise ServiceValidationError(f"{len(clients)} OREI matrices are configured, pick one with {ATTR_CONFIG_ENTRY}")
+    return next(iter(clients.values()))
+
+
+def send_error(error: Exception) -> HomeAssistantError:
+    """Return the service error for one of SEND_ERRORS."""
+    return HomeAssistantError(f"Could not send to the matrix: {str(error) or 'not connected'}")
+
+
+async def async_history(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Return route, link, signal and power transitions in a time range."""
+    client = async_get_client(hass, call)
+
+    # Times picked in the UI come without a time zone and are meant in Home
+    # Assistant's, not the process's
+    start = dt_util.as_utc(call.data[ATTR_START]).timestamp()
+    end = dt_util.as_utc(call.data.get(ATTR_END, dt_util.utcnow())).timestamp()
+    output = call.data.get(ATTR_OUTPUT)
+
+    records = client.history.Transitions(start, end)
+    if output is not None:
+        records = _output_records(records, output, client.history.StateAt(start, HISTORY_ROUTE, output))
+
+    response: dict = {
+        "transitions": [
+            {
+                "time": dt_util.utc_from_timestamp(record.time).isoformat(),
+                "kind": record.kindName,
+                "id": record.id,
+                "value": record.value,
+            }
+            for record in records
+        ],
+    }
+
+    if output is not None:
+        response["input_at_start"] = client.history.StateAt(start, HISTORY_ROUTE, output)
+        response["link_at_start"] = client.history.StateAt(start, HISTORY_LINK, output)
+
+    return response
+
+
+def _output_records(records: list, output: int, input_id: int | None) -> list:
+    """Return an output's own routes and links, the signal of whatever it showed and power."""
+    kept = []
+    for record in records:
+        if record.kind in (HISTORY_ROUTE, HISTORY_LINK):
+            if record.id != output:
+                continue
+            if record.kind == HISTORY_ROUTE:
+                input_id = record.value
+        elif record.kind == HISTORY_SIGNAL:
+            if record.id != input_id:
+                continue
+        elif record.kind != HISTORY_POWER:
+            continue
+        kept.append(record)
+    return kept
+
+
+def async_get_snapshots(hass: HomeAssistant, client: OreiMatrixAPI) -> dict[str, MatrixSnapshot]:
+    """Return the named snapshots saved for a matrix."""
+    return hass.data[DOMAIN].setdefault(DATA_SNAPSHOTS, {}).setdefault(client.macAddress, {})
+
+
+async def async_snapshot(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Save the matrix's routes, streams, lock, beep and power under a name."""
+    client = async_get_client(hass, call)
+    snapshot = client.Snapshot()
+    async_get_snapshots(hass, client)[call.data[ATTR_NAME]] = snapshot
+
+    # Also returned, for automations that would rather keep it themselves
+    return snapshot.ToDict()
+
+
+async def async_restore(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Put the matrix back the way a snapshot found it, sending only what differs."""
+    client = async_get_client(hass, call)
+
+    if ATTR_SNAPSHOT in call.data:
+        try:
+            snapshot = MatrixSnapshot.FromDict(call.data[ATTR_SNAPSHOT])
+        except (KeyError, TypeError, ValueError) as error:
+            raise ServiceValidationError(f"Not a matrix snapshot: {error}") from error
+    else:
+        name = call.data.get(ATTR_NAME, DEFAULT_SNAPSHOT_NAME)
+        snapshot = async_get_snapshots(hass, client).get(name)
+        if snapshot is None:
+            raise ServiceValidationError(f"No snapshot named {name!r}")
+
+    if len(snapshot.routes) != client.outputCount:
+        raise ServiceValidationError(f"The snapshot has {len(snapshot.routes)} outputs, the matrix has {client.outputCount}")
+    unknown = [input_id for input_id in snapshot.routes if input_id > client.inputCount]
+    if unknown:
+        raise ServiceValidationError(f"The matrix has no input {unknown[0]}, it has {client.inputCount}")
+
+    commands = len(client.RestoreCommands(snapshot))
+    try:
+        restored = await client.Restore(snapshot)
+    except SEND_ERRORS as error:
+        raise send_error(error) from error
+    if not restored:
+        raise HomeAssistantError(f"The matrix did not confirm all {commands} restore commands")
+
+    return {"commands": commands}
+
+
+async def async_set_edid(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Set the EDID of many inputs in one confirmed batch."""
+    client = async_get_client(hass, call)
+
+    edid = client.profile.EdidFromText(call.data[ATTR_EDID])
+    if edid is None:
+        raise ServiceValidationError(f"Unknown EDID {call.data[ATTR_EDID]!r}")
+
+    inputs = call.data.get(ATTR_INPUTS) or range(1, client.inputCount + 1)
+    unknown = [input_id for input_id in inputs if not 1 <= input_id <= client.inputCount]
+    if unknown:
+        raise ServiceValidationError(f"The matrix has no input {unknown[0]}, it has {client.inputCount}")
+
+    edids = {input_id: edid for input_id in inputs}
+    commands = len(client.EdidCommands(edids))
+    try:
+        confirmed = await client.SetEdids(edids)
+    except SEND_ERRORS as error:
+        raise send_error(error) from error
+    if not confirmed:
+        raise HomeAssistantError(f"The matrix did not confirm all {commands} EDID commands")
+
+    return {"edid": edid.name, "commands": commands}
+
+
+async def async_calibrate(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Measure how fast the matrix takes commands and send at that rate from now on."""
+    client = async_get_client(hass, call)
+    if not client.IsConnected or not client.power:
+        raise ServiceValidationError("The matrix must be connected and powered on to calibrate")
+
+    try:
+        calibration = await Calibrate(client)
+    except ValueError as error:
+        raise ServiceValidationError(str(error)) from error
+    except SEND_ERRORS as error:
+        # E.g. the connection dropped during the sweep, the rate limit is already back
+        raise send_error(error) from error
+    ApplyCalibration(client, calibration)
+    await async_save_calibration(hass, calibration)
+
+    return calibration.ToDict()
+
+
+async def async_predictor_report(hass: HomeAssistant, call: ServiceCall) -> ServiceResponse:
+    """Return how well predictive power on did and what keeping warm cost."""
+    client = async_get_client(hass, call)
+    if client.predictor is None:
+        raise ServiceValidationError("Predictive power on is not enabled in the matrix's options")
+
+    report = client.predictor.Report()
+    if call.data[ATTR_RESET]:
+        client.predictor.ResetReport()
+    return report
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the integration's services, once for every matrix."""
+    if hass.services.has_service(DOMAIN, SERVICE_HISTORY):
+        return
+
+    async def handle_history(call: ServiceCall) -> ServiceResponse:
+        return await async_history(hass, call)
+
+    async def handle_snapshot(call: ServiceCall) -> ServiceResponse:
+        return await async_snapshot(hass, call)
+
+    async def handle_restore(call: ServiceCall) -> ServiceResponse:
+        return await async_restore(hass, call)
+
+    async def handle_set_edid(call: ServiceCall) -> ServiceResponse:
+        return await async_set_edid(hass, call)
+
+    async def handle_calibrate(call: ServiceCall) -> ServiceResponse:
+        return await async_calibrate(hass, call)
+
+    async def handle_predictor_report(call: ServiceCall) -> ServiceResponse:
+        return await async_predictor_report(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_HISTORY,
+        handle_history,
+        schema=HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SNAPSHOT,
+        handle_snapshot,
+        schema=SNAPSHOT_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_RESTORE,
+        handle_restore,
+        schema=RESTORE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_SET_EDID,
+        handle_set_edid,
+        schema=SET_EDID_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_CALIBRATE,
+        handle_calibrate,
+        schema=CALIBRATE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_PREDICTOR_REPORT,
+        handle_predictor_report,
+        schema=PREDICTOR_REPORT_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
@@ -0,0 +1,123 @@
+"""Replays matrix usage through the pyOreiMatrix power predictor to tune its settings.
+
+Predictive power on learns when a matrix is wanted from the demands kept in its
+routing history. Waiting weeks to see whether a keep warm time or a confidence
+threshold pays off is no way to tune it, so this runs the predictor over usage on a
+simulated clock instead, for every combination of the settings given, and prints
+its report for each:
+
+- precision: predicted power ons that were used, recall: uses that found it warm
+- hidden: initialisation seconds users didn't wait through
+- warm Wh: energy spent keeping the matrix on before use, or for nothing
+
+The usage is either a history file Home Assistant keeps, <config>/orei-uhd816/<entry>.history,
+or a made up household: weekday evenings, weekend middays and the odd random use.
+The first half of the time range is only learned from. Doesn't need Home Assistant, e.g.
+
+    python tools/predictor_replay.py --history config/orei-uhd816/0123.history --keep-warm 5 15 30
+    python tools/predictor_replay.py --weeks 8 --threshold 0.3 0.5 0.7 --json predictor.json
+"""
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, "custom_components", "orei-uhd816"))
+
+from pyOreiMatrix.pyOreiMatrixHistory import HISTORY_DEMAND, HISTORY_POWER, RoutingHistory  # noqa: E402
+from pyOreiMatrix.pyOreiMatrixPredictor import DAY, PredictorSettings, ReplayPredictor  # noqa: E402
+
+
+def history_demands(path: str) -> list[float]:
+    """Demands in a history file, power ons where it has none. Read from a copy."""
+    with tempfile.TemporaryDirectory(prefix="orei-replay-") as directory:
+        copy = os.path.join(directory, "replay.history")
+        shutil.copyfile(path, copy)
+        history = RoutingHistory()
+        history.Open(copy)
+        try:
+            records = history.Transitions(0, time.time())
+        finally:
+            history.Close()
+
+    demands = [record.time for record in records if record.kind == HISTORY_DEMAND]
+    if not demands:
+        demands = [record.time for record in records if record.kind == HISTORY_POWER and record.value == 1]
+    return demands
+
+
+def synthetic_demands(weeks: int, seed: int) -> tuple[list[float], float]:
+    """A household's demands over whole weeks from a Monday, and that Monday."""
+    rng = random.Random(seed)
+    local = time.localtime()
+    monday = time.mktime((local.tm_year, local.tm_mon, local.tm_mday - local.tm_wday - 7 * weeks, 0, 0, 0, 0, 0, -1))
+
+    demands = []
+    for day in range(7 * weeks):
+        midnight = monday + day * DAY
+        if day % 7 < 5 and rng.random() < 0.85:
+            demands.append(midnight + 19 * 3600 + rng.uniform(0, 600))
+        if day % 7 >= 5 and rng.random() < 0.8:
+            demands.append(midnight + 12 * 3600 + rng.uniform(-300, 300))
+        if rng.random() < 0.2:
+            demands.append(midnight + rng.uniform(8, 22) * 3600)
+    return sorted(demands), monday
+
+
+def main(args: argparse.Namespace) -> int:
+    if args.history:
+        demands = history_demands(args.history)
+        if len(demands) < 2:
+            print(f"{args.history} holds {len(demands)} demands, too few to replay", file=sys.stderr)
+            return 1
+        first, end = demands[0], demands[-1] + 1
+    else:
+        demands, first = synthetic_demands(args.weeks, args.seed)
+        end = first + 7 * args.weeks * DAY
+    start = first + (end - first) / 2
+
+    results = []
+    print(f"{len(demands)} demands, replaying {(end - start) / DAY:.1f} days after learning from {(start - first) / DAY:.1f}")
+    print(f"{'keep warm':>9} {'threshold':>9} {'predicted':>9} {'hits':>5} {'false':>5} {'cold':>5} "
+          f"{'precision':>9} {'recall':>6} {'hidden s':>8} {'warm Wh':>8}")
+    for keepWarm, threshold in itertools.product(args.keep_warm, args.threshold):
+        settings = PredictorSettings(lead=args.lead, keepWarm=keepWarm * 60, threshold=threshold,
+                                     slotMinutes=args.slot_minutes, watts=args.watts)
+        report = ReplayPredictor(demands, settings, start, end, session=args.session * 60, initTime=args.init_time)
+        results.append({"keep_warm": keepWarm, "threshold": threshold, **report})
+        print(f"{keepWarm:>9} {threshold:>9} {report['predictions']:>9} {report['hits']:>5} {report['false_alarms']:>5} "
+              f"{report['cold_starts']:>5} {report['precision'] or 0:>9.2f} {report['recall'] or 0:>6.2f} "
+              f"{report['hidden_seconds']:>8} {report['warm_wh']:>8}")
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(results, output, indent=2)
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--history", help="a history file to replay instead of made up usage")
+    parser.add_argument("--weeks", type=int, default=8, help="weeks of made up usage")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--keep-warm", type=float, nargs="+", default=[5, 15, 30], help="minutes")
+    parser.add_argument("--threshold", type=float, nargs="+", default=[0.3, 0.5, 0.7], help="0 to 1")
+    parser.add_argument("--lead", type=float, default=60, help="seconds")
+    parser.add_argument("--slot-minutes", type=int, default=15)
+    parser.add_argument("--session", type=float, default=60, help="minutes a use keeps the matrix on")
+    parser.add_argument("--init-time", type=float, default=20, help="seconds the matrix takes to initialise")
+    parser.add_argument("--watts", type=float, default=30)
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    sys.exit(main(parse_args()))
@@ -0,0 +1,486 @@
+"""Soak and concurrency stress harness for the OREI matrix integration.
+
+Boots a throwaway Home Assistant core with this integration set up against a local
+OreiMatrixSimulator, then drives the media_player entities the way a busy set of
+automations would: concurrent select_source and volume_mute calls across every
+output, periodic power cycles, dropped TCP connections and hot-plug storms.
+
+For every command it measures the time from the service call to the entity state
+Home Assistant shows, and counts commands whose state never arrives as lost. CPU
+time and resident memory are sampled as it runs, so leaks and creeping load show
+up over long runs.
+
+Needs Home Assistant installed (the same version you run), e.g.
+
+    python tools/soak.py --duration 3600 --workers 16 --json soak.json
+
+Exits non-zero if any command was lost or failed, or memory grew more than
+--max-rss-growth MB.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import importlib
+import inspect
+import json
+import logging
+import os
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from types import MappingProxyType
+
+from homeassistant import bootstrap, config as conf_util, loader
+from homeassistant.config_entries import SOURCE_USER, ConfigEntries, ConfigEntry
+from homeassistant.const import CONF_HOST, CONF_NAME, CONF_PORT, EVENT_STATE_CHANGED, STATE_OFF, STATE_ON
+from homeassistant.core import Event, HomeAssistant, State
+from homeassistant.helpers import entity_registry as er
+from homeassistant.setup import async_setup_component
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DOMAIN = "orei-uhd816"
+
+LOGGER = logging.getLogger("soak")
+
+
+def percentiles(samples: list[float]) -> dict[str, float]:
+    """Return p50/p95/p99 of some latencies, in milliseconds."""
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0, "p99": 0.0, "max": 0.0}
+    if len(samples) == 1:
+        cuts = samples * 99
+    else:
+        cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {
+        "p50": round(cuts[49] * 1000, 1),
+        "p95": round(cuts[94] * 1000, 1),
+        "p99": round(cuts[98] * 1000, 1),
+        "max": round(max(samples) * 1000, 1),
+    }
+
+
+def resident_mb() -> float:
+    """Return the current resident set size, or the peak where /proc isn't available."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2**20 if sys.platform == "darwin" else peak / 2**10
+
+
+class StateWaiter:
+    """Resolves futures when an entity's state first satisfies a predicate."""
+
+    def __init__(self, hass: HomeAssistant) -> None:
+        self._waiting: dict[str, list] = defaultdict(list)
+        self._unsub = hass.bus.async_listen(EVENT_STATE_CHANGED, self._state_changed)
+
+    def expect(self, entity_id: str, predicate) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self._waiting[entity_id].append((predicate, future))
+        return future
+
+    def _state_changed(self, event: Event) -> None:
+        waiting = self._waiting.get(event.data["entity_id"])
+        new_state: State | None = event.data["new_state"]
+        if not waiting or new_state is None:
+            return
+
+        now = time.perf_counter()
+        for item in list(waiting):
+            predicate, future = item
+            if future.done():
+                waiting.remove(item)
+            elif predicate(new_state):
+                future.set_result(now)
+                waiting.remove(item)
+
+    def close(self) -> None:
+        self._unsub()
+
+
+class Stats:
+    """Latencies and failures per action, plus resource samples."""
+
+    def __init__(self) -> None:
+        self.latencies: dict[str, list[float]] = defaultdict(list)
+        self.lost: dict[str, int] = defaultdict(int)
+        self.errors: dict[str, int] = defaultdict(int)
+        self.disconnects = 0
+        self.hotplug_events = 0
+        self.samples: list[dict] = []
+        self._recent: list[float] = []
+
+    def record(self, action: str, latency: float) -> None:
+        self.latencies[action].append(latency)
+        self._recent.append(latency)
+
+    @property
+    def commands(self) -> int:
+        return sum(len(values) for values in self.latencies.values()) + sum(self.lost.values())
+
+    def interval(self) -> list[float]:
+        """Return every latency recorded since the last call."""
+        recent, self._recent = self._recent, []
+        return recent
+
+
+class Soak:
+    """One soak run against one simulated matrix."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.stats = Stats()
+        self.hass: HomeAssistant | None = None
+        self.sim = None
+        self.client = None
+        self.entry: ConfigEntry | None = None
+        self.entity_ids: list[str] = []
+        self.locks: dict[str, asyncio.Lock] = {}
+        self.running = asyncio.Event()
+        self.stopping = False
+        self.waiter: StateWaiter | None = None
+
+    async def setup(self, config_dir: str) -> None:
+        """Start Home Assistant and the simulator, then set up one config entry."""
+        await self.start_core(config_dir)
+        await self.start_simulator()
+
+        entry = self.entry = self._config_entry()
+        await self.hass.config_entries.async_add(entry)
+        await self.hass.async_block_till_done()
+        self.client = self.hass.data[DOMAIN][entry.entry_id]
+
+        registry = er.async_get(self.hass)
+        self.entity_ids = sorted(
+            item.entity_id
+            for item in er.async_entries_for_config_entry(registry, entry.entry_id)
+            if item.domain == "media_player"
+        )
+        if not self.entity_ids:
+            raise RuntimeError("The integration created no media_player entities")
+        self.locks = {entity_id: asyncio.Lock() for entity_id in self.entity_ids}
+        self.waiter = StateWaiter(self.hass)
+        LOGGER.warning("Soaking %d outputs for %ss with %d workers", len(self.entity_ids), self.args.duration, self.args.workers)
+
+    async def start_core(self, config_dir: str) -> None:
+        """Start a Home Assistant core that can load this integration."""
+        # Home Assistant loads custom integrations from <config>/custom_components
+        os.makedirs(os.path.join(config_dir, "custom_components"))
+        os.symlink(
+            os.path.join(REPO, "custom_components", DOMAIN),
+            os.path.join(config_dir, "custom_components", DOMAIN),
+        )
+
+        # Just the core, registries and config entries, the way Home Assistant's
+        # own tests start it, rather than a full bootstrap with the frontend
+        self.hass = HomeAssistant(config_dir)
+        self.hass.config.skip_pip = True
+        loader.async_setup(self.hass)
+        self.hass.config_entries = ConfigEntries(self.hass, {})
+        await bootstrap.async_load_base_functionality(self.hass)
+        await conf_util.async_process_ha_core_config(self.hass, {})
+        if not await async_setup_component(self.hass, "homeassistant", {}):
+            raise RuntimeError("Home Assistant did not start")
+        await self.hass.async_start()
+
+    async def start_simulator(self) -> None:
+        """Start the integration's own simulator, with named outputs."""
+        # The integration's own simulator, imported the way Home Assistant imports the integration
+        simulator = importlib.import_module(f"custom_components.{DOMAIN}.pyOreiMatrix.pyOreiMatrixSimulator")
+        self.sim = simulator.OreiMatrixSimulator(
+            inputs=self.args.inputs, outputs=self.args.outputs, httpPort=0, initTime=self.args.init_time
+        )
+        # Outputs keeping their factory names get no media_player
+        self.sim.outputNames = [f"Zone {output}" for output in range(1, self.args.outputs+1)]
+        await self.sim.Start()
+
+    def _config_entry(self) -> ConfigEntry:
+        # ConfigEntry's required arguments grow with Home Assistant releases, pass
+        # the ones this version knows about
+        arguments = {
+            "version": 1,
+            "minor_version": 1,
+            "domain": DOMAIN,
+            "title": self.sim.model,
+            "data": {CONF_HOST: self.sim.host, CONF_PORT: self.sim.httpPort, CONF_NAME: self.sim.model},
+            "options": {},
+            "source": SOURCE_USER,
+            "unique_id": self.sim.macAddress,
+            "discovery_keys": MappingProxyType({}),
+            "subentries_data": None,
+        }
+        accepted = inspect.signature(ConfigEntry).parameters
+        return ConfigEntry(**{name: value for name, value in arguments.items() if name in accepted})
+
+    async def teardown(self) -> None:
+        if self.waiter is not None:
+            self.waiter.close()
+        if self.hass is not None:
+            # Unloading closes the matrix connection before the simulator goes away
+            if self.entry is not None:
+                await self.hass.config_entries.async_unload(self.entry.entry_id)
+            await self.hass.async_stop()
+        if self.sim is not None:
+            await self.sim.Stop()
+
+    async def command(self, action: str, service: str, data: dict, expectations: dict) -> None:
+        """Call a media_player service and wait until every expected state shows."""
+        futures = [self.waiter.expect(entity_id, predicate) for entity_id, predicate in expectations.items()]
+        start = time.perf_counter()
+        try:
+            await self.hass.services.async_call("media_player", service, data, blocking=True)
+            _, pending = await asyncio.wait(futures, timeout=self.args.timeout)
+        except Exception as error:  # pylint: disable=broad-except
+            self.stats.errors[action] += 1
+            LOGGER.warning("%s %s failed: %r", action, data, error)
+        else:
+            if pending:
+                self.stats.lost[action] += 1
+                LOGGER.warning("Lost %s %s", action, data)
+            else:
+                self.stats.record(action, max(future.result() for future in futures) - start)
+        finally:
+            for future in futures:
+                future.cancel()
+
+    async def worker(self) -> None:
+        """Select sources and toggle mute on whichever output is free."""
+        while not self.stopping:
+            await self.running.wait()
+
+            free = [entity_id for entity_id in self.entity_ids if not self.locks[entity_id].locked()]
+            if not free:
+                await asyncio.sleep(0.01)
+                continue
+
+            entity_id = random.choice(free)
+            async with self.locks[entity_id]:
+                state = self.hass.states.get(entity_id)
+                if state is None or state.state != STATE_ON or not self.running.is_set():
+                    continue
+
+                if random.random() < self.args.mute_ratio:
+                    muted = not state.attributes.get("is_volume_muted", False)
+                    await self.command(
+                        "volume_mute",
+                        "volume_mute",
+                        {"entity_id": entity_id, "is_volume_muted": muted},
+                        {entity_id: lambda new, muted=muted: new.attributes.get("is_volume_muted") == muted},
+                    )
+                else:
+                    sources = [source for source in state.attributes.get("source_list", []) if source != state.attributes.get("source")]
+                    if not sources:
+                        continue
+                    source = random.choice(sources)
+                    await self.command(
+                        "select_source",
+                        "select_source",
+                        {"entity_id": entity_id, "source": source},
+                        {entity_id: lambda new, source=source: new.state == STATE_ON and new.attributes.get("source") == source},
+                    )
+
+            if self.args.pause:
+                await asyncio.sleep(random.uniform(0, self.args.pause))
+
+    async def power_cycles(self) -> None:
+        """Pause the workers and turn the whole matrix off and back on."""
+        while not self.stopping:
+            await asyncio.sleep(self.args.power_every)
+
+            self.running.clear()
+            # Let commands already under way finish
+            for lock in self.locks.values():
+                async with lock:
+                    pass
+
+            for action, target in (("turn_off", STATE_OFF), ("turn_on", STATE_ON)):
+                await self.command(
+                    action,
+                    action,
+                    {"entity_id": self.entity_ids[0]},
+                    {entity_id: lambda new, target=target: new.state == target for entity_id in self.entity_ids},
+                )
+            self.running.set()
+
+    async def disconnects(self) -> None:
+        """Drop the TCP connection now and then, the way a network blip would."""
+        while not self.stopping:
+            await asyncio.sleep(self.args.disconnect_every)
+            self.sim.DropClients()
+            self.stats.disconnects += 1
+
+    async def hotplug_storms(self) -> None:
+        """Flap random input signals and output links in bursts, then put them back."""
+        while not self.stopping:
+            await asyncio.sleep(self.args.hotplug_every)
+
+            inputs = dict(self.sim.inputActive)
+            links = dict(self.sim.linkHDMI)
+            for _ in range(self.args.hotplug_burst):
+                if random.random() < 0.5:
+                    port = random.randint(1, self.args.inputs)
+                    self.sim.HotPlugInput(port, not self.sim.inputActive[port])
+                else:
+                    port = random.randint(1, self.args.outputs)
+                    self.sim.HotPlugOutput(port, not self.sim.linkHDMI[port])
+                self.stats.hotplug_events += 1
+                await asyncio.sleep(0.002)
+
+            for port, active in inputs.items():
+                if self.sim.inputActive[port] != active:
+                    self.sim.HotPlugInput(port, active)
+            for port, connected in links.items():
+                if self.sim.linkHDMI[port] != connected:
+                    self.sim.HotPlugOutput(port, connected)
+
+    async def reporter(self) -> None:
+        """Log a line of interval latencies, CPU and memory every report period."""
+        started = time.monotonic()
+        cpu = time.process_time()
+        while not self.stopping:
+            await asyncio.sleep(self.args.report_every)
+
+            now, now_cpu = time.monotonic(), time.process_time()
+            sample = {
+                "elapsed": round(now - started, 1),
+                "commands": self.stats.commands,
+                "lost": sum(self.stats.lost.values()),
+                "errors": sum(self.stats.errors.values()),
+                "cpu_percent": round((now_cpu - cpu) / self.args.report_every * 100, 1),
+                "rss_mb": round(resident_mb(), 1),
+                **percentiles(self.stats.interval()),
+            }
+            cpu = now_cpu
+            self.stats.samples.append(sample)
+            LOGGER.warning(
+                "%(elapsed)7.1fs %(commands)7d cmds  p50 %(p50)6.1fms  p95 %(p95)6.1fms  p99 %(p99)6.1fms  "
+                "lost %(lost)d  errors %(errors)d  cpu %(cpu_percent)5.1f%%  rss %(rss_mb).1fMB",
+                sample,
+            )
+
+    async def run(self) -> dict:
+        """Soak for the configured duration and return the results."""
+        # Let the first refresh and any settling notifications pass before measuring
+        await asyncio.sleep(self.args.warmup)
+        baseline_rss = resident_mb()
+        baseline_cpu = time.process_time()
+        started = time.monotonic()
+
+        self.running.set()
+        tasks = [asyncio.create_task(self.worker()) for _ in range(self.args.workers)]
+        tasks.append(asyncio.create_task(self.reporter()))
+        if self.args.power_every:
+            tasks.append(asyncio.create_task(self.power_cycles()))
+        if self.args.disconnect_every:
+            tasks.append(asyncio.create_task(self.disconnects()))
+        if self.args.hotplug_every:
+            tasks.append(asyncio.create_task(self.hotplug_storms()))
+
+        await asyncio.sleep(self.args.duration)
+        self.stopping = True
+        self.running.set()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        elapsed = time.monotonic() - started
+        return {
+            "duration": round(elapsed, 1),
+            "outputs": len(self.entity_ids),
+            "workers": self.args.workers,
+            "commands": self.stats.commands,
+            "lost": sum(self.stats.lost.values()),
+            "errors": sum(self.stats.errors.values()),
+            "disconnects": self.stats.disconnects,
+            "hotplug_events": self.stats.hotplug_events,
+            "cpu_seconds": round(time.process_time() - baseline_cpu, 2),
+            "cpu_percent": round((time.process_time() - baseline_cpu) / elapsed * 100, 1),
+            "rss_start_mb": round(baseline_rss, 1),
+            "rss_end_mb": round(resident_mb(), 1),
+            "rss_growth_mb": round(resident_mb() - baseline_rss, 1),
+            "latency_ms": percentiles([value for values in self.stats.latencies.values() for value in values]),
+            "actions": {
+                action: {
+                    "count": len(self.stats.latencies[action]),
+                    "lost": self.stats.lost[action],
+                    "errors": self.stats.errors[action],
+                    **percentiles(self.stats.latencies[action]),
+                }
+                for action in sorted(set(self.stats.latencies) | set(self.stats.lost) | set(self.stats.errors))
+            },
+            "send_queue": self.client.sendQueueCounters,
+            "command_failures": [command for _, command in self.client.commandFailures],
+            "subscribers": self.client.subscriberStats,
+            "samples": self.stats.samples,
+        }
+
+
+def print_summary(result: dict) -> None:
+    print()
+    print(f"{result['commands']} commands over {result['duration']}s, {result['outputs']} outputs, {result['workers']} workers")
+    print(f"{'action':<14}{'count':>8}{'lost':>6}{'errors':>8}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    for action, values in result["actions"].items():
+        print(f"{action:<14}{values['count']:>8}{values['lost']:>6}{values['errors']:>8}"
+              f"{values['p50']:>9}{values['p95']:>9}{values['p99']:>9}{values['max']:>9}")
+    latency = result["latency_ms"]
+    print(f"{'all':<14}{result['commands']:>8}{result['lost']:>6}{result['errors']:>8}"
+          f"{latency['p50']:>9}{latency['p95']:>9}{latency['p99']:>9}{latency['max']:>9}")
+    print(f"disconnects {result['disconnects']}, hot-plug events {result['hotplug_events']}")
+    print(f"cpu {result['cpu_seconds']}s ({result['cpu_percent']}%), "
+          f"rss {result['rss_start_mb']} -> {result['rss_end_mb']}MB ({result['rss_growth_mb']:+}MB)")
+    print(f"send queue {result['send_queue']}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--duration", type=float, default=300, help="seconds to soak for")
+    parser.add_argument("--workers", type=int, default=8, help="concurrent automation-like callers")
+    parser.add_argument("--inputs", type=int, default=8)
+    parser.add_argument("--outputs", type=int, default=8)
+    parser.add_argument("--mute-ratio", type=float, default=0.3, help="share of commands that toggle mute")
+    parser.add_argument("--pause", type=float, default=0.0, help="max random think time between a worker's commands")
+    parser.add_argument("--power-every", type=float, default=120, help="seconds between power cycles, 0 to disable")
+    parser.add_argument("--disconnect-every", type=float, default=45, help="seconds between dropped connections, 0 to disable")
+    parser.add_argument("--hotplug-every", type=float, default=20, help="seconds between hot-plug storms, 0 to disable")
+    parser.add_argument("--hotplug-burst", type=int, default=50, help="signal and link flaps per storm")
+    parser.add_argument("--init-time", type=float, default=2.0, help="simulated power on initialisation time")
+    parser.add_argument("--timeout", type=float, default=30, help="seconds before a command counts as lost")
+    parser.add_argument("--warmup", type=float, default=5)
+    parser.add_argument("--report-every", type=float, default=10)
+    parser.add_argument("--max-rss-growth", type=float, default=None, help="fail if resident memory grows more, in MB")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> int:
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)-7s %(name)s %(message)s")
+
+    with tempfile.TemporaryDirectory(prefix="orei-soak-") as config_dir:
+        soak = Soak(args)
+        try:
+            await soak.setup(config_dir)
+            result = await soak.run()
+        finally:
+            await soak.teardown()
+
+    print_summary(result)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(result, output, indent=2)
+
+    failed = result["lost"] or result["errors"]
+    if args.max_rss_growth is not None and result["rss_growth_mb"] > args.max_rss_growth:
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
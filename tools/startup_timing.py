@@ -0,0 +1,197 @@
+"""Startup timing harness for the OREI matrix integration.
+
+Measures what a Home Assistant restart costs this integration, for the window in
+which rooms are uncontrollable:
+
+- import time, each in a fresh interpreter: the pyOreiMatrix library on its own,
+  and the integration and its platforms on top of the Home Assistant modules a
+  running core has already imported
+- time to first entity against a local OreiMatrixSimulator, from adding the config
+  entry to setup returning, the first entity state, the first available entity and
+  every entity available. Measured for a matrix never seen before (cold), one
+  seen before (warm) and one seen before that doesn't answer (absent).
+
+Uses the same throwaway core as tools/soak.py, so needs Home Assistant installed, e.g.
+
+    python tools/startup_timing.py --repeat 5 --json startup.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from homeassistant.const import EVENT_STATE_CHANGED, STATE_UNAVAILABLE
+from homeassistant.core import Event
+from homeassistant.helpers import entity_registry as er
+
+from soak import DOMAIN, REPO, Soak
+
+LOGGER = logging.getLogger("startup_timing")
+
+# Already imported by a running core before any custom integration loads
+HASS_MODULES = [
+    "homeassistant.components.binary_sensor",
+    "homeassistant.components.media_player",
+    "homeassistant.components.sensor",
+    "homeassistant.components.websocket_api",
+    "homeassistant.config_entries",
+    "homeassistant.helpers.aiohttp_client",
+    "homeassistant.helpers.config_validation",
+    "homeassistant.helpers.event",
+    "homeassistant.helpers.storage",
+]
+
+# Name -> (sys.path entry, modules imported first, modules timed). The library
+# is imported the way the CLI does, not through the integration package.
+IMPORTS = {
+    "library": (os.path.join(REPO, "custom_components", DOMAIN), [], ["pyOreiMatrix.pyOreiMatrix"]),
+    "integration": (REPO, HASS_MODULES, [f"custom_components.{DOMAIN}"] + [
+        f"custom_components.{DOMAIN}.{platform}" for platform in ("binary_sensor", "media_player", "sensor")
+    ]),
+}
+
+IMPORT_SCRIPT = """
+import importlib, json, sys, time
+sys.path.insert(0, {path!r})
+for module in {preload!r}:
+    importlib.import_module(module)
+before = set(sys.modules)
+start = time.perf_counter()
+for module in {modules!r}:
+    importlib.import_module(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "modules": len(set(sys.modules) - before)}}))
+"""
+
+
+def import_time(path: str, preload: list[str], modules: list[str], repeat: int) -> dict:
+    """Import modules in fresh interpreters, return the median seconds and modules loaded."""
+    runs = []
+    for _ in range(repeat):
+        script = IMPORT_SCRIPT.format(path=path, preload=preload, modules=modules)
+        output = subprocess.run([sys.executable, "-c", script], check=True, capture_output=True, text=True).stdout
+        runs.append(json.loads(output))
+    return {
+        "seconds": round(statistics.median(run["seconds"] for run in runs), 4),
+        "modules": runs[-1]["modules"],
+    }
+
+
+class StartupTiming(Soak):
+    """Adds and reloads one config entry, timing how soon its entities show up."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        super().__init__(args)
+        self.start = 0.0
+        self.marks: dict[str, float] = {}
+
+    def _state_changed(self, event: Event) -> None:
+        if self.entry is None or "setup" in self.marks and "all_available" in self.marks:
+            return
+        registry = er.async_get(self.hass)
+        item = registry.async_get(event.data["entity_id"])
+        if item is None or item.config_entry_id != self.entry.entry_id:
+            return
+
+        now = time.perf_counter() - self.start
+        self.marks.setdefault("first_entity", now)
+        new_state = event.data["new_state"]
+        if new_state is None or new_state.state == STATE_UNAVAILABLE:
+            return
+        self.marks.setdefault("first_available", now)
+
+        entity_ids = [item.entity_id for item in er.async_entries_for_config_entry(registry, self.entry.entry_id)]
+        states = [self.hass.states.get(entity_id) for entity_id in entity_ids]
+        if all(state is not None and state.state != STATE_UNAVAILABLE for state in states):
+            self.marks.setdefault("all_available", now)
+
+    async def phase(self, name: str, setup, wait: float) -> dict:
+        """Run one setup, then wait up to wait seconds for every entity to be available."""
+        self.marks = {}
+        self.start = time.perf_counter()
+        await setup()
+        self.marks["setup"] = time.perf_counter() - self.start
+
+        deadline = time.perf_counter() + wait
+        while "all_available" not in self.marks and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+
+        result = {mark: round(seconds, 4) for mark, seconds in self.marks.items()}
+        LOGGER.info("%s: %s", name, result)
+        return result
+
+    async def run(self) -> dict:
+        unsubscribe = self.hass.bus.async_listen(EVENT_STATE_CHANGED, self._state_changed)
+        entries = self.hass.config_entries
+        try:
+            self.entry = self._config_entry()
+            result = {"cold": await self.phase("cold", lambda: entries.async_add(self.entry), self.args.wait)}
+
+            await entries.async_unload(self.entry.entry_id)
+            result["warm"] = await self.phase("warm", lambda: entries.async_setup(self.entry.entry_id), self.args.wait)
+
+            # Seen before, but gone: entities should still show up, unavailable
+            await entries.async_unload(self.entry.entry_id)
+            await self.sim.Stop()
+            self.sim = None
+            result["absent"] = await self.phase("absent", lambda: entries.async_setup(self.entry.entry_id), 0)
+        finally:
+            unsubscribe()
+        return result
+
+
+def print_summary(result: dict) -> None:
+    for name, timing in result["imports"].items():
+        print(f"import {name:<12} {timing['seconds']*1000:8.1f} ms  {timing['modules']} modules")
+    for phase in ("cold", "warm", "absent"):
+        marks = result["startup"][phase]
+        shown = "  ".join(
+            f"{mark} {marks[mark]*1000:.1f} ms" if mark in marks else f"{mark} -"
+            for mark in ("setup", "first_entity", "first_available", "all_available")
+        )
+        print(f"{phase:<7} {shown}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--inputs", type=int, default=8)
+    parser.add_argument("--outputs", type=int, default=8)
+    parser.add_argument("--init-time", type=float, default=2.0, help="simulated power on initialisation time")
+    parser.add_argument("--repeat", type=int, default=3, help="fresh interpreters per import measurement")
+    parser.add_argument("--wait", type=float, default=10, help="seconds to wait for every entity to be available")
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--log-level", default="warning")
+    return parser.parse_args()
+
+
+async def main(args: argparse.Namespace) -> int:
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(levelname)-7s %(name)s %(message)s")
+
+    result = {"imports": {name: import_time(*modules, args.repeat) for name, modules in IMPORTS.items()}}
+
+    with tempfile.TemporaryDirectory(prefix="orei-startup-") as config_dir:
+        timing = StartupTiming(args)
+        try:
+            await timing.start_core(config_dir)
+            await timing.start_simulator()
+            result["startup"] = await timing.run()
+        finally:
+            await timing.teardown()
+
+    print_summary(result)
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(result, output, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main(parse_args())))
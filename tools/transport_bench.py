@@ -0,0 +1,213 @@
+"""Throughput and allocation benchmark for the pyOreiMatrix transports.
+
+A local OreiMatrixSimulator runs in a child process, serving its TCP and Telnet
+ports and a pty standing in for a serial port. It floods each transport in turn
+with status lines. This process only receives, so what's measured is the
+receiving side alone:
+
+- seconds, lines and megabytes per second to frame every line
+- CPU seconds per megabyte, and the reads it took
+- peak traced memory while receiving, in a second pass under tracemalloc
+
+"streams" is the reader the library used before transports, asyncio streams
+reading 1024 bytes at a time and splitting decoded strings, for comparison.
+Doesn't need Home Assistant, e.g.
+
+    python tools/transport_bench.py --lines 200000 --json transports.json
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(REPO, "custom_components", "orei-uhd816"))
+
+from pyOreiMatrix.pyOreiMatrixSimulator import OreiMatrixSimulator  # noqa: E402
+from pyOreiMatrix.pyOreiMatrixTransport import MatrixTransport, TransportFactory  # noqa: E402
+
+LINE = "hdmi output 3: connect"
+DELIMITER = "\r\n"
+CHUNK = 1000    # lines per write from the stand-in
+WARMUP = 5000   # lines sent over each connection before timing starts
+
+
+class StreamsBaseline(MatrixTransport):
+    """The reader the library had before transports, for comparison."""
+
+    def __init__(self, host: str, port: int) -> None:
+        self.host = host
+        self.port = port
+        self.writer = None
+        self.task = None
+        self.reads = 0
+
+    async def Open(self, delimiter: str, onLine) -> None:
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.task = asyncio.create_task(self.read(reader, delimiter, onLine))
+
+    async def read(self, reader, delimiter: str, onLine) -> None:
+        pending = ""
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                break
+            self.reads += 1
+            message = pending + data.decode()
+            index = message.rfind(delimiter)
+            if index < 0:
+                pending = message
+                continue
+            pending = message[index+len(delimiter):]
+            for line in message[:index].split(delimiter):
+                if line:
+                    onLine(line)
+        self._Lost(None)
+
+    def Write(self, data: bytes) -> None:
+        self.writer.write(data)
+
+    def Close(self) -> None:
+        self.writer.close()
+
+
+async def serve(args: argparse.Namespace) -> None:
+    """The child: run the stand-in, flood whatever is connected when asked."""
+    sim = OreiMatrixSimulator(telnetPort=0, maxClients=8)
+    await sim.Start()
+    print(json.dumps({"host": sim.host, "tcp": sim.tcpPort, "telnet": sim.telnetPort}), flush=True)
+
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    while line := await reader.readline():
+        if line.strip() == b"pty":
+            print(await sim.OpenPty(), flush=True)
+            continue
+        count = int(line)
+        for start in range(0, count, CHUNK):
+            sim.Emit(*[LINE] * min(CHUNK, count - start))
+            await asyncio.sleep(0)
+    await sim.Stop()
+
+
+class Child:
+    """The stand-in's process."""
+
+    async def start(self) -> dict:
+        self.process = await asyncio.create_subprocess_exec(
+            sys.executable, os.path.abspath(__file__), "--serve",
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+        )
+        return json.loads(await self.process.stdout.readline())
+
+    async def pty(self) -> str:
+        self.process.stdin.write(b"pty\n")
+        return (await self.process.stdout.readline()).decode().strip()
+
+    def flood(self, count: int) -> None:
+        self.process.stdin.write(f"{count}\n".encode())
+
+    async def stop(self) -> None:
+        self.process.stdin.close()
+        await self.process.wait()
+
+
+async def receive(child: Child, transport: MatrixTransport, count: int, traced: bool) -> dict:
+    """Flood one transport with count lines and time how long framing them takes."""
+    loop = asyncio.get_running_loop()
+    done = loop.create_future()
+    expected = WARMUP
+    received = 0
+
+    def on_line(line: str) -> None:
+        nonlocal received
+        received += 1
+        if received == expected and not done.done():
+            done.set_result(None)
+
+    await transport.Open(DELIMITER, on_line)
+    # Whatever the stand-in greets a new client with goes first, then both
+    # processes get going before anything is timed
+    await asyncio.sleep(0.2)
+    received = 0
+    child.flood(WARMUP)
+    await asyncio.wait_for(done, 120)
+    done = loop.create_future()
+    expected = count
+    received = 0
+
+    if traced:
+        tracemalloc.start()
+    cpu = time.process_time()
+    start = time.perf_counter()
+    child.flood(count)
+    await asyncio.wait_for(done, 120)
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu
+    peak = tracemalloc.get_traced_memory()[1] if traced else None
+    if traced:
+        tracemalloc.stop()
+
+    transport.Close()
+    framer = transport.framer
+    megabytes = count * (len(LINE) + len(DELIMITER)) / 1e6
+    return {
+        "seconds": round(elapsed, 4),
+        "lines_per_second": round(count / elapsed),
+        "mb_per_second": round(megabytes / elapsed, 2),
+        "cpu_seconds_per_mb": round(cpu / megabytes, 4),
+        "reads": framer.reads if framer is not None else transport.reads,
+        "peak_kb": None if peak is None else round(peak / 1024, 1),
+    }
+
+
+async def main(args: argparse.Namespace) -> int:
+    child = Child()
+    ports = await child.start()
+    factories = {
+        "streams": lambda: StreamsBaseline(ports["host"], ports["tcp"]),
+        "tcp": lambda: TransportFactory("tcp")(ports["host"], ports["tcp"]),
+        "telnet": lambda: TransportFactory(f"telnet:{ports['telnet']}")(ports["host"], None),
+        "serial": lambda: TransportFactory(f"serial:{ports['pty']}")(ports["host"], None),
+    }
+
+    result = {}
+    try:
+        for name in args.transports:
+            if name == "serial" and "pty" not in ports:
+                # Only now, a pty nobody reads would take every flood before it
+                ports["pty"] = await child.pty()
+            timing = await receive(child, factories[name](), args.lines, traced=False)
+            traced = await receive(child, factories[name](), args.lines, traced=True)
+            timing["peak_kb"] = traced["peak_kb"]
+            result[name] = timing
+            print(f"{name:<8} {timing['lines_per_second']:>9} lines/s {timing['mb_per_second']:>7} MB/s "
+                  f"{timing['cpu_seconds_per_mb']:>7} cpu s/MB {timing['reads']:>7} reads {timing['peak_kb']:>8} KB peak")
+    finally:
+        await child.stop()
+
+    if args.json:
+        with open(args.json, "w") as output:
+            json.dump(result, output, indent=2)
+    return 0
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100000, help="lines per transport and pass")
+    parser.add_argument("--transports", nargs="+", default=["streams", "tcp", "telnet", "serial"],
+                        choices=["streams", "tcp", "telnet", "serial"])
+    parser.add_argument("--json", help="also write the results to this file")
+    parser.add_argument("--serve", action="store_true", help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    sys.exit(asyncio.run(serve(arguments)) if arguments.serve else asyncio.run(main(arguments)))